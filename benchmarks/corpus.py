@@ -0,0 +1,240 @@
+"""
+Generates a deterministic synthetic corpus for the benchmarks.
+
+The corpus is a `library/` of nested topic folders holding text, Markdown,
+CSV, JSON and PDF files (the knowledge base), plus an `inbox/` of held-out
+files to organize. `corpus.json` records every file and, for each inbox file,
+the folder it belongs in. The same seed and sizes always produce the same
+bytes, so runs on different commits see identical inputs.
+
+Usage:
+    python -m benchmarks.corpus OUTPUT_DIR [--scale small|medium|large] [--files N] [--inbox N] [--seed 0]
+"""
+import os
+import json
+import random
+import argparse
+from typing import Dict, List
+
+# Number of library files and inbox files per scale.
+SCALES = {
+    "tiny": (40, 10),
+    "small": (300, 50),
+    "medium": (3000, 200),
+    "large": (30000, 1000),
+}
+
+# Every topic lives in its own folder and has its own vocabulary, so that
+# retrieval has a right answer.
+TOPICS = {
+    "finance/invoices": "invoice payment due amount vendor total tax billing net terms remittance account",
+    "finance/reports": "quarter revenue earnings growth margin forecast profit expenses guidance outlook fiscal",
+    "research/biology": "cell protein gene enzyme tissue sequencing organism mutation expression membrane",
+    "research/physics": "quantum particle energy momentum field relativity photon electron spin lattice",
+    "personal/recipes": "flour sugar butter oven bake simmer garlic onion stir tablespoon dough sauce",
+    "personal/travel": "flight hotel itinerary passport luggage museum beach train booking reservation",
+    "work/meetings": "agenda minutes action items attendees follow-up decision roadmap sprint standup",
+    "work/hr": "onboarding benefits payroll vacation policy review candidate interview offer handbook",
+    "code/python": "def import class return self list dict lambda yield exception module package",
+    "code/web": "html css javascript component render props state fetch endpoint request response",
+}
+
+COMMON_WORDS = (
+    "the of and to in is for on with as by at from this that it be are was an or which "
+    "were have has not will can more all their also one two new first used other"
+).split()
+
+# Share of each file type among generated files.
+FILE_TYPES = [(".txt", 35), (".md", 10), (".csv", 20), (".json", 15), (".pdf", 20)]
+
+# A fixed timestamp for every generated file, so metadata is reproducible too.
+FIXED_MTIME = 1700000000
+
+
+def _sentence(rng: random.Random, vocabulary: List[str]) -> str:
+    words = [
+        rng.choice(vocabulary) if rng.random() < 0.45 else rng.choice(COMMON_WORDS)
+        for _ in range(rng.randint(8, 20))
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraphs(rng: random.Random, vocabulary: List[str], count: int) -> List[str]:
+    return [" ".join(_sentence(rng, vocabulary) for _ in range(rng.randint(3, 7))) for _ in range(count)]
+
+
+def _size(rng: random.Random) -> int:
+    """Paragraph count: most files are small, a few are large."""
+    roll = rng.random()
+    if roll < 0.70:
+        return rng.randint(1, 6)
+    if roll < 0.95:
+        return rng.randint(7, 40)
+    return rng.randint(41, 200)
+
+
+def _write_text(path: str, rng: random.Random, vocabulary: List[str], markdown: bool):
+    paragraphs = _paragraphs(rng, vocabulary, _size(rng))
+    if markdown:
+        paragraphs = [f"# {rng.choice(vocabulary).title()} notes"] + [
+            f"## {rng.choice(vocabulary).title()}\n\n{p}" if i % 3 == 0 else p for i, p in enumerate(paragraphs)
+        ]
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n\n".join(paragraphs) + "\n")
+
+
+def _write_csv(path: str, rng: random.Random, vocabulary: List[str]):
+    columns = rng.sample(vocabulary, 4)
+    lines = ["id," + ",".join(columns)]
+    for row in range(rng.randint(5, 30) * _size(rng)):
+        values = [rng.choice(vocabulary) if i % 2 else f"{rng.uniform(0, 10000):.2f}" for i in range(len(columns))]
+        lines.append(f"{row}," + ",".join(values))
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _write_json(path: str, rng: random.Random, vocabulary: List[str]):
+    records = [
+        {
+            "id": i,
+            "title": " ".join(rng.sample(vocabulary, 3)),
+            "description": _sentence(rng, vocabulary),
+            "value": round(rng.uniform(0, 1000), 2),
+        }
+        for i in range(rng.randint(2, 8) * _size(rng))
+    ]
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        json.dump({"records": records}, f, indent=2, sort_keys=True)
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """
+    Writes a minimal, valid PDF with one page per list of text lines.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font_id = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        stream = "BT /F1 10 Tf 40 760 Td 12 TL " + " ".join(f"({_escape_pdf_text(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out.encode("latin-1")))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n"
+    xref = len(out.encode("latin-1"))
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "wb") as f:
+        f.write(out.encode("latin-1"))
+
+
+def _write_pdf(path: str, rng: random.Random, vocabulary: List[str]):
+    # Wrap the text into ~90 character lines, 55 lines per page.
+    words = " ".join(_paragraphs(rng, vocabulary, _size(rng))).split()
+    lines, line = [], ""
+    for word in words:
+        if len(line) + len(word) + 1 > 90:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    lines.append(line)
+    write_pdf(path, [lines[i:i + 55] for i in range(0, len(lines), 55)])
+
+
+def _write_file(path: str, ext: str, rng: random.Random, vocabulary: List[str]):
+    if ext in (".txt", ".md"):
+        _write_text(path, rng, vocabulary, markdown=ext == ".md")
+    elif ext == ".csv":
+        _write_csv(path, rng, vocabulary)
+    elif ext == ".json":
+        _write_json(path, rng, vocabulary)
+    else:
+        _write_pdf(path, rng, vocabulary)
+    os.utime(path, (FIXED_MTIME, FIXED_MTIME))
+
+
+def generate_corpus(root: str, files: int = 300, inbox: int = 50, seed: int = 0) -> Dict:
+    """
+    Writes the corpus under `root` and returns its description (also saved as `corpus.json`).
+
+    Library files are spread over the topic folders, with one extra level of
+    year subfolders; inbox files are drawn from the same topics.
+    """
+    rng = random.Random(seed)
+    extensions = [ext for ext, _ in FILE_TYPES]
+    weights = [weight for _, weight in FILE_TYPES]
+    topics = sorted(TOPICS)
+
+    description = {"seed": seed, "files": files, "inbox_files": inbox, "library": [], "inbox": {}}
+    for i in range(files):
+        topic = topics[i % len(topics)]
+        vocabulary = TOPICS[topic].split()
+        folder = os.path.join("library", *topic.split("/"), str(2020 + rng.randint(0, 4)))
+        ext = rng.choices(extensions, weights)[0]
+        relative = os.path.join(folder, f"{topic.split('/')[-1]}_{i:06d}{ext}")
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+        _write_file(os.path.join(root, relative), ext, rng, vocabulary)
+        description["library"].append(relative)
+
+    os.makedirs(os.path.join(root, "inbox"), exist_ok=True)
+    for i in range(inbox):
+        topic = rng.choice(topics)
+        ext = rng.choices(extensions, weights)[0]
+        relative = os.path.join("inbox", f"unsorted_{i:05d}{ext}")
+        _write_file(os.path.join(root, relative), ext, rng, TOPICS[topic].split())
+        # Any year folder of the topic is a correct destination.
+        description["inbox"][relative] = os.path.join("library", *topic.split("/"))
+
+    with open(os.path.join(root, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(description, f, indent=1, sort_keys=True)
+    return description
+
+
+def load_or_generate(root: str, files: int, inbox: int, seed: int) -> Dict:
+    """
+    Reuses a corpus already generated with the same parameters, or generates it.
+    """
+    path = os.path.join(root, "corpus.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            description = json.load(f)
+        if (description.get("seed"), description.get("files"), description.get("inbox_files")) == (seed, files, inbox):
+            return description
+    return generate_corpus(root, files=files, inbox=inbox, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic corpus.")
+    parser.add_argument("output", help="Directory to write the corpus to.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--files", type=int, help="Library files (overrides --scale).")
+    parser.add_argument("--inbox", type=int, help="Inbox files (overrides --scale).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files, inbox = SCALES[args.scale]
+    description = generate_corpus(
+        args.output,
+        files=args.files if args.files is not None else files,
+        inbox=args.inbox if args.inbox is not None else inbox,
+        seed=args.seed,
+    )
+    print(f"Wrote {len(description['library'])} library and {len(description['inbox'])} inbox files to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Measures embedding throughput (chunks per second) for combinations of worker
+processes and threads per worker, on the CPU only.
+
+The chunks of a synthetic benchmark corpus (see `benchmarks.corpus`) are
+embedded by an `EmbeddingEngine` for each (workers, threads) pair; workers=0
+embeds in the benchmark process itself. The worker pool is started and the
+model loaded before timing, so only steady-state embedding is measured. The
+embedding cache is not involved.
+
+Usage:
+    python -m benchmarks.embedding_throughput [--workers 0,2,4,8] [--threads 1,2,4] [--backend onnx]
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.corpus import SCALES, load_or_generate
+
+
+def corpus_chunks(workdir: str, scale: str, seed: int, limit: int) -> list:
+    """
+    Chunks the library of the corpus as at ingest and returns up to `limit` distinct chunks.
+    """
+    from benchmarks.run import configure, corpus_paths
+    files, inbox = SCALES[scale]
+    load_or_generate(os.path.join(workdir, "corpus"), files=files, inbox=inbox, seed=seed)
+    configure(workdir)
+    from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry
+
+    registry = EmbeddorRegistry()
+    corpus_root, description = corpus_paths(workdir)
+    chunks = []
+    for relative in sorted(description["library"]):
+        embeddor = registry.get_embeddor_for_file(os.path.join(corpus_root, relative))
+        if embeddor is not None:
+            chunks.extend(embeddor.prepare_for_embedding(os.path.join(corpus_root, relative))[0])
+    return list(dict.fromkeys(chunks))[:limit]
+
+
+def measure(engine, chunks: list, runs: int) -> float:
+    """
+    Embeds `chunks` `runs` times (after a warm-up) and returns the median chunks per second.
+    """
+    engine(chunks[:engine.batch_size * max(1, engine.workers)])
+    rates = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine(chunks)
+        rates.append(len(chunks) / (time.perf_counter() - start))
+    return round(statistics.median(rates), 1)
+
+
+def _int_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure embedding throughput against worker and thread counts.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="Corpus scale (default: small).")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--chunks", type=int, default=2000, help="Chunks embedded per run (default: 2000).")
+    parser.add_argument("--workers", type=_int_list, default=[0, 2, 4],
+                        help="Comma-separated worker counts; 0 embeds in-process (default: 0,2,4).")
+    parser.add_argument("--threads", type=_int_list, default=[1, 2, 4],
+                        help="Comma-separated threads per worker (default: 1,2,4).")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per batch (default: 64).")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per combination (default: 3).")
+    parser.add_argument("--workdir", help="Directory for the corpus (default: a temporary directory).")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    # CPU only: hide any GPU before PyTorch is imported (worker processes inherit this).
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="organizer_embed_")
+    results = []
+    try:
+        print(f"--- Chunking the '{args.scale}' corpus in {workdir} ---")
+        chunks = corpus_chunks(workdir, args.scale, args.seed, args.chunks)
+        print(f"{len(chunks)} chunks, {os.cpu_count()} CPUs, backend '{args.backend}'")
+        from file_organizer.embedding_engine import EmbeddingEngine
+
+        for workers in args.workers:
+            for threads in args.threads:
+                print(f"--- {workers} workers x {threads} threads ---")
+                engine = EmbeddingEngine(workers=workers, threads=threads, batch_size=args.batch_size,
+                                         backend=args.backend)
+                try:
+                    rate = measure(engine, chunks, args.runs)
+                finally:
+                    engine.close()
+                results.append({"workers": workers, "threads": threads, "chunks_per_second": rate})
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'workers':>8} {'threads':>8} {'chunks/s':>10}")
+    for row in results:
+        print(f"{row['workers']:>8} {row['threads']:>8} {row['chunks_per_second']:>10}")
+    if args.output:
+        report = {
+            "meta": {"chunks": len(chunks), "cpu_count": os.cpu_count(), "backend": args.backend,
+                     "batch_size": args.batch_size, "scale": args.scale},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
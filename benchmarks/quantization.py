@@ -0,0 +1,187 @@
+"""
+Measures the recall/size trade-off of the local vector store's embedding storage.
+
+The library of a synthetic benchmark corpus (see `benchmarks.corpus`) is
+chunked and embedded as at ingest, and the chunks of the inbox files are used
+as queries. The embeddings are loaded into a local store for each storage
+configuration (float32, and float16 and int8 with and without the float32
+re-rank copy), and each is searched for the `k` nearest chunks of every query.
+Recall@k is measured against an exact float32 search; sizes are the bytes per
+chunk that a search scans and that are kept on disk (metadata excluded).
+
+With `--synthetic N`, N clustered random unit vectors of `--dim` dimensions
+are used instead of the corpus, which shows the sizes at scale without
+running the embedding model.
+
+Usage:
+    python -m benchmarks.quantization [--scale small] [--k 10] [--output results.json]
+    python -m benchmarks.quantization --synthetic 1000000 --dim 384 --queries 200
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+from benchmarks.corpus import SCALES, load_or_generate
+
+# (name, storage dtype, keeps a float32 copy to re-rank with)
+CONFIGURATIONS = [
+    ("float32", "float32", False),
+    ("float16", "float16", False),
+    ("float16+rerank", "float16", True),
+    ("int8", "int8", False),
+    ("int8+rerank", "int8", True),
+]
+_ITEMSIZE = {"float32": 4, "float16": 2, "int8": 1}
+
+
+def corpus_embeddings(workdir: str, scale: str, seed: int) -> tuple:
+    """
+    Embeds the chunks of the corpus library and the query chunks of its inbox files.
+
+    Returns:
+        (chunk vectors, query vectors), as float32 matrices.
+    """
+    from benchmarks.run import configure, corpus_paths, inbox_files
+    files, inbox = SCALES[scale]
+    load_or_generate(os.path.join(workdir, "corpus"), files=files, inbox=inbox, seed=seed)
+    configure(workdir, VECTOR_BACKEND="local")
+    from file_organizer.rag_system import RAGSystem
+    from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry
+
+    rag = RAGSystem()
+    registry = EmbeddorRegistry()
+    corpus_root, description = corpus_paths(workdir)
+    documents = []
+    for relative in sorted(description["library"]):
+        path = os.path.join(corpus_root, relative)
+        embeddor = registry.get_embeddor_for_file(path)
+        if embeddor is not None:
+            documents.extend(embeddor.prepare_for_embedding(path)[0])
+    # Identical chunks are stored once at ingest; here they would only add ties.
+    documents = list(dict.fromkeys(documents))
+    queries = []
+    for path in inbox_files(workdir):
+        embeddor = registry.get_embeddor_for_file(path)
+        if embeddor is not None:
+            queries.extend(rag._query_chunks(embeddor.extract_preview(path)))
+    return np.asarray(rag.embed(documents), dtype=np.float32), np.asarray(rag.embed(queries), dtype=np.float32)
+
+
+def synthetic_embeddings(count: int, queries: int, dim: int, seed: int) -> tuple:
+    """
+    Draws unit vectors around 1000 random centres, like embeddings of documents on many topics.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(1000, dim)).astype(np.float32)
+
+    def draw(n: int) -> np.ndarray:
+        vectors = centres[rng.integers(0, len(centres), size=n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return np.concatenate([draw(min(100000, count - i)) for i in range(0, count, 100000)]), draw(queries)
+
+
+def load_store(directory: str, dtype: str, rerank: bool, vectors: np.ndarray, batch_size: int = 50000):
+    from file_organizer.vector_store.local_store import LocalVectorStore
+    shutil.rmtree(directory, ignore_errors=True)
+    store = LocalVectorStore(directory, dtype=dtype, index="flat", rerank=rerank)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        store.upsert(ids, batch, [""] * len(batch), [{} for _ in batch])
+    return store
+
+
+def measure(store, queries: np.ndarray, k: int, runs: int) -> tuple:
+    """
+    Searches all queries `runs` times (in batches of 16).
+
+    Returns:
+        (the result ids of the last run, median milliseconds per query).
+    """
+    timings = []
+    for _ in range(runs):
+        ids = []
+        start = time.perf_counter()
+        for i in range(0, len(queries), 16):
+            ids.extend(store.query(queries[i:i + 16], n_results=k, include=[])["ids"])
+        timings.append((time.perf_counter() - start) / len(queries))
+    return ids, round(statistics.median(timings) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall against size for the embedding storage dtypes.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="Corpus scale (default: small).")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Use N synthetic vectors instead of the corpus.")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors (default: 384).")
+    parser.add_argument("--queries", type=int, default=200, help="Number of synthetic queries (default: 200).")
+    parser.add_argument("--k", type=int, default=10, help="Results per query (default: 10).")
+    parser.add_argument("--rerank-candidates", type=int, default=4,
+                        help="Hits scanned per result before re-ranking (default: 4).")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per configuration (default: 3).")
+    parser.add_argument("--workdir", help="Directory for the corpus and stores (default: a temporary directory).")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="organizer_quant_")
+    try:
+        if args.synthetic:
+            print(f"--- Generating {args.synthetic} synthetic vectors ({args.dim} dimensions) ---")
+            vectors, queries = synthetic_embeddings(args.synthetic, args.queries, args.dim, args.seed)
+        else:
+            print(f"--- Embedding the '{args.scale}' corpus in {workdir} ---")
+            vectors, queries = corpus_embeddings(workdir, args.scale, args.seed)
+        from file_organizer import config
+        config.EMBEDDING_RERANK_CANDIDATES = args.rerank_candidates
+        dim = vectors.shape[1]
+        print(f"{len(vectors)} chunks, {len(queries)} queries, k={args.k}")
+
+        results, truth = [], None
+        for name, dtype, rerank in CONFIGURATIONS:
+            print(f"--- {name} ---")
+            store = load_store(os.path.join(workdir, "stores", name), dtype, rerank, vectors)
+            ids, ms_per_query = measure(store, queries, args.k, args.runs)
+            store.close()
+            if truth is None:
+                truth = ids
+            recall = np.mean([len(set(found) & set(expected)) / max(1, len(expected))
+                              for found, expected in zip(ids, truth)])
+            scanned = dim * _ITEMSIZE[dtype] + 4 + (4 if dtype == "int8" else 0)
+            results.append({
+                "storage": name,
+                "recall_at_k": round(float(recall), 4),
+                "scanned_bytes_per_chunk": scanned,
+                "disk_bytes_per_chunk": scanned + (dim * 4 if rerank else 0),
+                "scanned_mb": round(scanned * len(vectors) / 1024 ** 2, 1),
+                "ms_per_query": ms_per_query,
+            })
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'storage':<16} {'recall@' + str(args.k):>10} {'scanned B/chunk':>16} {'disk B/chunk':>13} "
+          f"{'scanned MB':>11} {'ms/query':>9}")
+    for row in results:
+        print(f"{row['storage']:<16} {row['recall_at_k']:>10.4f} {row['scanned_bytes_per_chunk']:>16} "
+              f"{row['disk_bytes_per_chunk']:>13} {row['scanned_mb']:>11} {row['ms_per_query']:>9}")
+    if args.output:
+        report = {
+            "meta": {"chunks": len(vectors), "queries": len(queries), "dim": dim, "k": args.k,
+                     "rerank_candidates": args.rerank_candidates,
+                     "source": f"synthetic:{args.synthetic}" if args.synthetic else f"corpus:{args.scale}"},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
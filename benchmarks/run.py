@@ -0,0 +1,419 @@
+"""
+Runs the benchmark scenarios against a synthetic corpus and writes the results as JSON.
+
+Scenarios (each runs in a fresh interpreter, so peak RSS and cold start are
+measured per scenario):
+  - ingest:      building the knowledge base from scratch (files/s, chunks/s),
+                 then an incremental no-op rebuild.
+  - retrieval:   `retrieve_context` latency percentiles and batched throughput,
+                 and the latency of each retrieval mode (two-stage and flat).
+  - organize:    end-to-end planning of the inbox against a stub Ollama server,
+                 with per-file latency, decision sources and accuracy.
+  - cold_start:  import, model load and first-query time in a fresh interpreter.
+
+All state (database, manifest, caches, indexes) lives in the work directory;
+the user's configuration is loaded and its data paths are redirected there.
+Runs with the same scale and seed see byte-identical corpora, so results can
+be compared across commits with `--baseline`.
+
+Usage:
+    python -m benchmarks.run [--scale small] [--scenarios ingest,retrieval] [--output results.json]
+                             [--baseline previous.json] [--workdir DIR] [--llm-delay 0.2] [--llm-token-delay 0.005]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+from benchmarks.corpus import SCALES, load_or_generate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Helpers used by the scenarios ---
+
+def percentiles(samples: list) -> dict:
+    """
+    Summarizes latency samples (seconds) in milliseconds.
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(q):
+        # Linear interpolation between closest ranks.
+        position = (len(ordered) - 1) * q
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(at(0.50) * 1000, 3),
+        "p90_ms": round(at(0.90) * 1000, 3),
+        "p99_ms": round(at(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns this process's peak resident set size in MB (None where unsupported).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def configure(workdir: str, **overrides):
+    """
+    Loads the user's configuration and redirects every data path into the work directory.
+    """
+    from file_organizer import config
+    data = os.path.join(workdir, "data")
+    config.CHROMA_PERSIST_DIRECTORY = os.path.join(data, "chromadb")
+    config.VECTOR_STORE_DIRECTORY = os.path.join(data, "vectors")
+    config.MANIFEST_PATH = os.path.join(data, "manifest.sqlite3")
+    config.GENERATIONS_DIRECTORY = os.path.join(data, "generations")
+    config.EMBEDDING_CACHE_DIRECTORY = os.path.join(data, "embedding_cache")
+    config.FOLDER_INDEX_PATH = os.path.join(data, "folder_index.npz")
+    config.DECISION_CACHE_PATH = os.path.join(data, "decision_cache.sqlite3")
+    config.MOVE_JOURNAL_DIRECTORY = os.path.join(data, "move_journals")
+    config.DAEMON_SOCKET_PATH = os.path.join(workdir, "daemon.sock")
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return config
+
+
+def corpus_paths(workdir: str) -> tuple:
+    corpus_root = os.path.join(workdir, "corpus")
+    with open(os.path.join(corpus_root, "corpus.json"), encoding="utf-8") as f:
+        description = json.load(f)
+    return corpus_root, description
+
+
+def inbox_files(workdir: str) -> list:
+    corpus_root, description = corpus_paths(workdir)
+    return [os.path.join(corpus_root, relative) for relative in sorted(description["inbox"])]
+
+
+# --- Scenarios (run inside a child interpreter) ---
+
+def scenario_ingest(workdir: str, args) -> dict:
+    configure(workdir)
+    from file_organizer.rag_system import RAGSystem
+    from file_organizer.manifest import FileManifest
+    from file_organizer.ingest_pipeline import IngestPipeline
+    from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry
+
+    shutil.rmtree(os.path.join(workdir, "data"), ignore_errors=True)
+    corpus_root, _ = corpus_paths(workdir)
+    library = os.path.join(corpus_root, "library")
+
+    rag = RAGSystem()
+    registry = EmbeddorRegistry()
+    results = {}
+    for phase in ("full", "noop"):
+        manifest = FileManifest()
+        pipeline = IngestPipeline(rag, registry, manifest, workers=args.workers)
+        start = time.perf_counter()
+        try:
+            stats = pipeline.run([library])
+        finally:
+            manifest.close()
+            rag.persist()
+        elapsed = time.perf_counter() - start
+        results[phase] = {"seconds": round(elapsed, 3), **stats, "scan": pipeline.scanner.stats.as_dict()}
+
+    files = results["full"]["added"] + results["full"]["updated"]
+    chunks = rag.store.count()
+    results["full"]["chunks"] = chunks
+    results["full"]["files_per_s"] = round(files / results["full"]["seconds"], 2)
+    results["full"]["chunks_per_s"] = round(chunks / results["full"]["seconds"], 2)
+    results["embedding_cache"] = rag.cache_stats()
+    return results
+
+
+def scenario_retrieval(workdir: str, args) -> dict:
+    configure(workdir)
+    from file_organizer.rag_system import RAGSystem
+    from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry
+    from file_organizer.rag_system import RETRIEVAL_MODES
+
+    rag = RAGSystem()
+    registry = EmbeddorRegistry()
+    # Extraction is not what is being measured, so prepare the queries up front.
+    queries = []
+    for path in inbox_files(workdir):
+        embeddor = registry.get_embeddor_for_file(path)
+        text = embeddor.extract_preview(path) if embeddor else ""
+        if text:
+            queries.append(text)
+    queries = (queries * (args.queries // max(1, len(queries)) + 1))[:args.queries]
+
+    for query in queries[:3]:
+        rag.retrieve_context(query)  # warm-up
+
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        rag.retrieve_context(query)
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    rag.retrieve_context_batch(queries)
+    batch_seconds = time.perf_counter() - start
+
+    # The same queries in each retrieval mode, to compare two-stage with flat search.
+    configured_mode = rag.retrieval_mode
+    by_mode = {}
+    for mode in RETRIEVAL_MODES:
+        rag.retrieval_mode = mode
+        mode_samples = []
+        for query in queries:
+            start = time.perf_counter()
+            rag.retrieve_context(query)
+            mode_samples.append(time.perf_counter() - start)
+        by_mode[mode] = percentiles(mode_samples)
+    rag.retrieval_mode = configured_mode
+    return {
+        "mode": configured_mode,
+        "files_indexed": rag.file_store.count(),
+        "by_mode": by_mode,
+        "single": percentiles(samples),
+        "batch": {
+            "queries": len(queries),
+            "seconds": round(batch_seconds, 3),
+            "queries_per_s": round(len(queries) / batch_seconds, 2) if batch_seconds else None,
+        },
+    }
+
+
+def scenario_organize(workdir: str, args) -> dict:
+    from benchmarks.stub_ollama import StubOllamaServer
+
+    with StubOllamaServer(delay=args.llm_delay, token_delay=args.llm_token_delay) as stub:
+        configure(workdir, OLLAMA_HOST=stub.url, OLLAMA_MODEL=stub.model)
+        # Every run starts without remembered decisions.
+        decision_cache = os.path.join(workdir, "data", "decision_cache.sqlite3")
+        if os.path.exists(decision_cache):
+            os.remove(decision_cache)
+        from file_organizer.organizer import FileOrganizer
+
+        corpus_root, description = corpus_paths(workdir)
+        files = inbox_files(workdir)
+        organizer = FileOrganizer()
+
+        decided_at = []
+        start = time.perf_counter()
+        plan = organizer.build_plan(files, on_entry=lambda entry: decided_at.append(time.perf_counter()))
+        elapsed = time.perf_counter() - start
+        stub_stats = stub.get_stats()
+
+    expected = {
+        os.path.join(corpus_root, relative): os.path.normcase(os.path.join(corpus_root, folder))
+        for relative, folder in description["inbox"].items()
+    }
+    correct = sum(
+        1 for entry in plan
+        if entry.get("suggested_folder")
+        and os.path.normcase(entry["suggested_folder"]).startswith(expected[entry["source"]])
+    )
+    decided_by = {}
+    for entry in plan:
+        source = entry.get("decided_by", "none")
+        decided_by[source] = decided_by.get(source, 0) + 1
+    return {
+        "files": len(files),
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(len(files) / elapsed, 2) if elapsed else None,
+        "mean_ms_per_file": round(elapsed / len(files) * 1000, 3) if files else None,
+        "time_to_first_decision_ms": round((decided_at[0] - start) * 1000, 3) if decided_at else None,
+        "moves_proposed": sum(1 for entry in plan if entry["action"] == "move"),
+        "accuracy": round(correct / len(files), 4) if files else None,
+        "decided_by": decided_by,
+        "llm_requests": stub_stats["requests"],
+        "llm_max_in_flight": stub_stats["max_in_flight"],
+        "llm_tokens_generated": stub_stats["tokens"],
+        # Estimated at four characters per token.
+        "llm_mean_prompt_tokens": round(stub_stats["prompt_chars"] / 4 / stub_stats["requests"], 1)
+        if stub_stats["requests"] else None,
+        "llm_delay_s": args.llm_delay,
+    }
+
+
+def scenario_cold_start(workdir: str, args) -> dict:
+    # The child interpreter started just before this; measure each phase from here.
+    phases = {}
+    start = time.perf_counter()
+    configure(workdir)
+    from file_organizer.rag_system import RAGSystem
+    phases["import_s"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    rag = RAGSystem()
+    phases["init_s"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    rag.retrieve_context(" ".join(["invoice payment"] * 50))
+    phases["first_query_s"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    rag.retrieve_context(" ".join(["quarter revenue"] * 50))
+    phases["second_query_s"] = time.perf_counter() - mark
+    phases["total_s"] = time.perf_counter() - start
+    return {name: round(value, 4) for name, value in phases.items()}
+
+
+SCENARIOS = {
+    "ingest": scenario_ingest,
+    "retrieval": scenario_retrieval,
+    "organize": scenario_organize,
+    "cold_start": scenario_cold_start,
+}
+
+
+# --- Driver ---
+
+def run_child(name: str, workdir: str, args) -> dict:
+    """
+    Runs one scenario in a fresh interpreter and returns its results.
+    """
+    result_path = os.path.join(workdir, f"result-{name}.json")
+    if os.path.exists(result_path):
+        os.remove(result_path)
+    command = [
+        sys.executable, "-m", "benchmarks.run", "--child", name, "--workdir", workdir,
+        "--workers", str(args.workers), "--queries", str(args.queries), "--llm-delay", str(args.llm_delay),
+        "--llm-token-delay", str(args.llm_token_delay),
+    ]
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=REPO_ROOT, capture_output=not args.verbose, text=True)
+    wall = time.perf_counter() - start
+    if process.returncode != 0 or not os.path.exists(result_path):
+        tail = (process.stderr or "").strip().splitlines()[-20:]
+        return {"error": f"exit code {process.returncode}", "stderr_tail": tail}
+    with open(result_path, encoding="utf-8") as f:
+        result = json.load(f)
+    result["wall_s"] = round(wall, 3)
+    return result
+
+
+def git_revision() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def print_comparison(baseline: dict, current: dict):
+    """
+    Prints every numeric metric present in both reports, with the relative change.
+    """
+    before = flatten(baseline.get("scenarios", {}))
+    after = flatten(current.get("scenarios", {}))
+    print(f"\n--- Compared to {baseline.get('meta', {}).get('git_revision')} ---")
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name], after[name]
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"{name:55s} {old:>12} -> {new:<12} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="Corpus size.")
+    parser.add_argument("--files", type=int, help="Library files (overrides --scale).")
+    parser.add_argument("--inbox", type=int, help="Inbox files (overrides --scale).")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run ({', '.join(SCENARIOS)}).")
+    parser.add_argument("--workdir", help="Where the corpus and data live (kept between runs if given).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Ingest worker processes.")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries to time.")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="Seconds the stub LLM takes per request.")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005,
+                        help="Seconds the stub LLM takes per generated token.")
+    parser.add_argument("--output", metavar="FILE", help="Write the results as JSON to FILE.")
+    parser.add_argument("--baseline", metavar="FILE", help="Print changes relative to an earlier results file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the scenarios' own output.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, REPO_ROOT)
+        result = SCENARIOS[args.child](args.workdir, args)
+        result["peak_rss_mb"] = peak_rss_mb()
+        from file_organizer.metrics import METRICS
+        result["stages"] = METRICS.summary()["spans"]
+        with open(os.path.join(args.workdir, f"result-{args.child}.json"), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        return
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="organizer_bench_")
+    files, inbox = SCALES[args.scale]
+    files = args.files if args.files is not None else files
+    inbox = args.inbox if args.inbox is not None else inbox
+    print(f"--- Preparing corpus ({files} library files, {inbox} inbox files, seed {args.seed}) in {workdir} ---")
+    load_or_generate(os.path.join(workdir, "corpus"), files=files, inbox=inbox, seed=args.seed)
+
+    # Later scenarios query the knowledge base that ingest builds.
+    if "ingest" not in names and not os.path.exists(os.path.join(workdir, "data", "manifest.sqlite3")):
+        names.insert(0, "ingest")
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": args.scale, "files": files, "inbox": inbox, "seed": args.seed,
+            "workers": args.workers, "llm_delay_s": args.llm_delay, "llm_token_delay_s": args.llm_token_delay,
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            print(f"--- Running scenario '{name}' ---")
+            report["scenarios"][name] = run_child(name, workdir, args)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
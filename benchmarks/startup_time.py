@@ -0,0 +1,125 @@
+"""
+Measures the import cost of the CLI entry points.
+
+Each target is imported in a fresh interpreter several times and the median
+wall time is reported, along with the net cost over a bare interpreter. With
+`--compare REF` the same measurements are taken on another git revision
+(checked out into a temporary worktree) so the before/after can be compared.
+
+Usage:
+    python -m benchmarks.startup_time [--runs 10] [--compare HEAD~1] [--output results.json]
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Snippets executed in a fresh interpreter, relative to the tree being measured.
+TARGETS = {
+    "bare_interpreter": "pass",
+    "import_main": "import main",
+    "import_registry": "import file_organizer.embeddors.embeddor_registry",
+    "registry_lookup_txt": (
+        "from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry;"
+        "EmbeddorRegistry().get_embeddor_for_file('notes.txt')"
+    ),
+}
+
+
+def time_snippet(tree: str, snippet: str, runs: int) -> dict:
+    """
+    Runs a snippet `runs` times in fresh interpreters and returns timing statistics.
+    """
+    samples = []
+    errors = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", snippet], cwd=tree, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            errors = result.stderr.strip().splitlines()[-1] if result.stderr else "failed"
+            break
+        samples.append(elapsed)
+    if not samples:
+        return {"error": errors}
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "min_ms": round(min(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "runs": len(samples),
+    }
+
+
+def top_imports(tree: str, snippet: str, limit: int = 15) -> list:
+    """
+    Returns the most expensive modules (cumulative microseconds) from `python -X importtime`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet], cwd=tree, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # Format: "import time:   self_us | cumulative_us | module"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({"module": name.strip(), "cumulative_us": int(cumulative_us), "self_us": int(self_us)})
+    rows.sort(key=lambda row: row["cumulative_us"], reverse=True)
+    return rows[:limit]
+
+
+def measure_tree(tree: str, runs: int) -> dict:
+    """
+    Measures every target in the given source tree.
+    """
+    results = {name: time_snippet(tree, snippet, runs) for name, snippet in TARGETS.items()}
+    bare = results["bare_interpreter"].get("median_ms", 0.0)
+    for name, stats in results.items():
+        if name != "bare_interpreter" and "median_ms" in stats:
+            stats["net_median_ms"] = round(stats["median_ms"] - bare, 2)
+    results["main_top_imports"] = top_imports(tree, TARGETS["import_main"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import/startup cost of main.py.")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per target.")
+    parser.add_argument("--compare", metavar="REF", help="Also measure this git revision (e.g. HEAD~1).")
+    parser.add_argument("--output", metavar="FILE", help="Write the results as JSON to FILE.")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "current": measure_tree(REPO_ROOT, args.runs)}
+
+    if args.compare:
+        worktree = tempfile.mkdtemp(prefix="startup_bench_")
+        try:
+            subprocess.run(
+                ["git", "worktree", "add", "--detach", worktree, args.compare],
+                cwd=REPO_ROOT, check=True, capture_output=True
+            )
+            # The generated config isn't tracked, so share the current one.
+            config_path = os.path.join(REPO_ROOT, "file_organizer", "config.py")
+            if os.path.exists(config_path):
+                shutil.copy(config_path, os.path.join(worktree, "file_organizer", "config.py"))
+            report[args.compare] = measure_tree(worktree, args.runs)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=REPO_ROOT, capture_output=True)
+            shutil.rmtree(worktree, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+A local stub of the Ollama chat API, for exercising the LLM agents without a model.
+
+The stub answers `POST /api/chat` with the first folder mentioned in the
+prompt's context (or `--default-folder`), after an artificial delay. Like a
+chatty model, it follows the path with an explanation unless the request's
+`stop` sequences or `num_predict` cut it short, and it spends `--token-delay`
+seconds per generated token, streaming them as they are "generated". It can
+also inject failures (HTTP 500, or `--fail-status`) to exercise timeouts and
+retries, and counts the requests it served and the tokens it generated
+(`GET /stub/stats`) so that concurrency, coalescing and bounded generation can
+be observed.
+
+Usage:
+    python -m benchmarks.stub_ollama [--port 11435] [--delay 0.5] [--token-delay 0.01] [--fail-rate 0.1]
+
+Then point OLLAMA_HOST at http://127.0.0.1:11435. It can also run in-process:
+
+    with StubOllamaServer(delay=0.2) as server:
+        ...  # use server.url as the Ollama host
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_FOLDER_PATTERN = re.compile(r'Folder: "([^"]+)"')
+_SOURCE_PATTERN = re.compile(r'\(from file: "([^"]+)"')
+_EXPLANATION = "\n\nThis folder contains the files most similar to the one being organized, so it is the best match."
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        stub: "StubOllamaServer" = self.server.stub
+        if self.path == "/stub/stats":
+            self._send_json(200, stub.get_stats())
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": stub.model, "model": stub.model}]})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-stub"})
+        else:
+            self._send_json(200, {"status": "Ollama is running"})
+
+    def do_POST(self):
+        stub: "StubOllamaServer" = self.server.stub
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+            return
+
+        stub.on_request_started()
+        try:
+            time.sleep(stub.delay)
+            if random.random() < stub.fail_rate:
+                stub.count("failed")
+                self._send_json(stub.fail_status, {"error": "injected failure"})
+                return
+            prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+            stub.count("prompt_chars", len(prompt))
+            pieces = stub.generate(prompt, request.get("options") or {})
+            created = datetime.now(timezone.utc).isoformat()
+            if request.get("stream", True):
+                # Streamed responses are newline-delimited JSON, one line per token as it is generated.
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for piece in pieces:
+                    time.sleep(stub.token_delay)
+                    stub.count("tokens")
+                    line = {"model": request.get("model"), "created_at": created,
+                            "message": {"role": "assistant", "content": piece}, "done": False}
+                    self.wfile.write(json.dumps(line).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                line = {"model": request.get("model"), "created_at": created,
+                        "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop"}
+                self.wfile.write(json.dumps(line).encode("utf-8") + b"\n")
+            else:
+                time.sleep(stub.token_delay * len(pieces))
+                for _ in pieces:
+                    stub.count("tokens")
+                message = {"role": "assistant", "content": "".join(pieces)}
+                self._send_json(200, {"model": request.get("model"), "created_at": created,
+                                      "message": message, "done": True, "done_reason": "stop"})
+            stub.count("served")
+        finally:
+            stub.on_request_finished()
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that is expected here.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubOllamaServer:
+    """
+    A threaded HTTP server imitating the parts of the Ollama API the agents use.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0, fail_rate: float = 0.0,
+                 default_folder: str = None, model: str = "stub-model", token_delay: float = 0.0,
+                 fail_status: int = 500):
+        self.delay = delay
+        self.token_delay = token_delay
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.default_folder = default_folder or os.path.expanduser("~")
+        self.model = model
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "served": 0, "failed": 0, "tokens": 0, "prompt_chars": 0, "in_flight": 0, "max_in_flight": 0}
+        self._server = _StubHTTPServer((host, port), _StubHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def answer(self, prompt: str) -> str:
+        match = _FOLDER_PATTERN.search(prompt)
+        if match:
+            return match.group(1)
+        match = _SOURCE_PATTERN.search(prompt)
+        return os.path.dirname(match.group(1)) if match else self.default_folder
+
+    def generate(self, prompt: str, options: dict) -> list:
+        """
+        Returns the answer's tokens (roughly, words), honouring `stop` and `num_predict`.
+        """
+        content = self.answer(prompt) + _EXPLANATION
+        for stop in options.get("stop") or []:
+            if stop and stop in content:
+                content = content[:content.index(stop)]
+        pieces = re.findall(r"\S+\s*|\s+", content)
+        num_predict = options.get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            pieces = pieces[:num_predict]
+        return pieces
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self._stats[name] += value
+
+    def on_request_started(self):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+
+    def on_request_finished(self):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def start(self) -> "StubOllamaServer":
+        """Serves requests on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub Ollama chat server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds each chat request takes.")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds per generated token.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with an error.")
+    parser.add_argument("--fail-status", type=int, default=500, help="HTTP status of the injected errors.")
+    parser.add_argument("--default-folder", default=None, help="Answer used when the prompt names no file.")
+    args = parser.parse_args()
+
+    server = StubOllamaServer(args.host, args.port, delay=args.delay, fail_rate=args.fail_rate,
+                              default_folder=args.default_folder, token_delay=args.token_delay,
+                              fail_status=args.fail_status)
+    print(f"Stub Ollama listening on {server.url} (delay {args.delay}s, {args.token_delay}s per token, "
+          f"fail rate {args.fail_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,15 @@
 import os
+import time
 import argparse
-import shutil # New import for deleting directories
 from file_organizer.rag_system import RAGSystem
 from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry
-from file_organizer import config 
-
-def process_and_ingest(directory_path: str, rag_system: RAGSystem, registry: EmbeddorRegistry):
-    """
-    Scans a directory, processes all supported files, and ingests them into the RAG system.
-    """
-    print(f"\n--- Scanning Directory: {directory_path} ---")
-    
-    for root, _, files in os.walk(directory_path):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            embeddor = registry.get_embeddor_for_file(file_path)
-            
-            if embeddor:
-                print(f"  Processing: {file_path}")
-                documents, metadatas, ids = embeddor.prepare_for_embedding(file_path)
-                
-                if documents:
-                    rag_system.ingest_documents(documents, metadatas, ids)
+from file_organizer.manifest import FileManifest
+from file_organizer.ingest_pipeline import IngestPipeline
+from file_organizer.dedup import format_dedup_stats
+from file_organizer.scanner import format_scan_stats
+from file_organizer.vector_store.local_store import default_vector_store_directory
+from file_organizer import config, generations
+from file_organizer.metrics import configure_logging, export_metrics, profiled
 
 def main():
     """
@@ -41,38 +29,155 @@ def main():
     parser.add_argument(
         '--fresh-build',
         action='store_true', # This makes it a flag that doesn't need a value (e.g., --fresh-build)
-        help='If set, deletes the existing knowledge base before building a new one.'
+        help='Build a new knowledge base alongside the live one and switch to it when complete. '
+             'An interrupted fresh build of the same directories is resumed.'
+    )
+    parser.add_argument(
+        '--restart',
+        action='store_true',
+        help='With --fresh-build, discard an interrupted fresh build instead of resuming it.'
+    )
+    parser.add_argument(
+        '--rebuild-folder-index',
+        action='store_true',
+        help='Rebuild the folder centroid index from every embedding in the knowledge base.'
+    )
+    # --- Pipeline tuning ---
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Number of worker processes used to extract and chunk files (0 runs extraction in-process).'
+    )
+    parser.add_argument(
+        '--queue-depth',
+        type=int,
+        default=64,
+        help='Maximum number of files in flight between extraction and the database writer.'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=512,
+        help='Number of chunks accumulated across files before each embedding/upsert call.'
     )
     
+    # --- Diagnostics ---
+    parser.add_argument(
+        '--verbose', '-v',
+        action='count',
+        default=0,
+        help='Log more (-v lists every processed file, -vv adds debug output).'
+    )
+    parser.add_argument(
+        '--log-level',
+        help='Logging level (DEBUG, INFO, WARNING, ERROR). Defaults to LOG_LEVEL in the config.'
+    )
+    parser.add_argument(
+        '--metrics-json',
+        metavar='FILE',
+        help="Write per-stage timings and counters as JSON to FILE ('-' for stdout) at exit."
+    )
+    parser.add_argument(
+        '--metrics-prom',
+        metavar='FILE',
+        help='Write per-stage timings and counters as a Prometheus textfile at exit.'
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        help='Run under cProfile, save the stats to FILE and print the top functions.'
+    )
+
     args = parser.parse_args()
+    configure_logging(args.log_level, args.verbose)
+    with profiled(args.profile):
+        try:
+            build(args)
+        finally:
+            export_metrics(args.metrics_json, args.metrics_prom)
 
-    # --- NEW: Logic to handle the --fresh-build flag ---
-    # This happens before the RAGSystem is initialized to avoid file lock issues.
-    if args.fresh_build:
-        db_path = config.CHROMA_PERSIST_DIRECTORY
-        if os.path.exists(db_path):
-            print("--- Deleting existing knowledge base for a fresh build... ---")
-            shutil.rmtree(db_path)
-            print("--- Knowledge base deleted. ---")
-    # ----------------------------------------------------
-    
+def build(args: argparse.Namespace):
+    """
+    Builds or updates the knowledge base as described by the parsed arguments.
+    """
     if args.directories:
         dirs_to_process = args.directories
         print(f"Processing specified directories: {dirs_to_process}")
     else:
         dirs_to_process = config.DEFAULT_KNOWLEDGE_DIRECTORIES
         print(f"No directories specified. Processing default directories from config:\n{dirs_to_process}")
-    
-    rag = RAGSystem()
-    registry = EmbeddorRegistry()
-    
+
+    valid_dirs = []
     for directory in dirs_to_process:
         if os.path.isdir(directory):
-            process_and_ingest(directory, rag, registry)
+            valid_dirs.append(directory)
         else:
             print(f"Warning: '{directory}' is not a valid directory. Skipping.")
-            
+
+    # A fresh build writes a new generation of the knowledge base; the live one
+    # keeps serving organize requests until the new one is complete.
+    generation, resumed = None, False
+    if args.fresh_build:
+        configured_store = (config.CHROMA_PERSIST_DIRECTORY if getattr(config, "VECTOR_BACKEND", "chroma") == "chroma"
+                            else default_vector_store_directory())
+        generation, resumed = generations.start_build(valid_dirs, resume=not args.restart)
+        generations.use_generation(generation)
+        if resumed:
+            print(f"--- Resuming the interrupted fresh build (generation {generation})... ---")
+        else:
+            print(f"--- Starting a fresh build (generation {generation}); the current knowledge base stays live meanwhile. ---")
+    else:
+        generations.apply_live_generation()
+
+    rag = RAGSystem()
+    registry = EmbeddorRegistry()
+    manifest = FileManifest()
+    pipeline = IngestPipeline(
+        rag, registry, manifest,
+        workers=args.workers,
+        queue_depth=args.queue_depth,
+        batch_size=args.batch_size,
+    )
+
+    start_time = time.perf_counter()
+    try:
+        stats = pipeline.run(valid_dirs)
+    except BaseException:
+        if generation is not None:
+            print("\n--- Fresh build interrupted; run it again with --fresh-build to resume. ---")
+        raise
+    finally:
+        manifest.close()
+        rag.persist()
+
+    # A resumed fresh build may have lost the centroids of its last batches before the interruption.
+    if args.rebuild_folder_index or resumed:
+        rag.rebuild_folder_index()
+
+    if generation is not None:
+        previous = generations.finish_build(generation)
+        print(f"--- Generation {generation} is now the live knowledge base. ---")
+        if previous is None:
+            print(f"The previous knowledge base at '{configured_store}' (and the manifest and indexes next to it) "
+                  "is no longer used and can be deleted.")
+
+    elapsed = time.perf_counter() - start_time
     print("\n--- Knowledge base build/update process complete. ---")
+    print(
+        f"Added: {stats['added']}, Updated: {stats['updated']}, Relocated: {stats['relocated']}, "
+        f"Skipped (unchanged): {stats['skipped']}, Removed: {stats['removed']}, Failed: {stats['failed']} in {elapsed:.2f}s"
+    )
+    print(format_scan_stats(pipeline.scanner.stats))
+    if pipeline.dedup is not None:
+        print(format_dedup_stats(pipeline.dedup.stats))
+    cache_stats = rag.cache_stats()
+    if cache_stats:
+        print(
+            f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.1%} hit rate), {cache_stats['evictions']} evictions, "
+            f"{cache_stats['entries']} entries"
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,392 @@
+"""
+Moves many files at once, with a journal to undo a batch or resume it after a crash.
+
+Every move is checked first: the source must be a file, the destination
+folder must already exist and the destination name must be free (nothing is
+ever overwritten). Moves are then grouped by the devices of their source and
+destination. Within a device, a move is a rename. Across devices, the file is
+copied to a temporary name next to the destination (with `copy_file_range`,
+or `sendfile` where that is unavailable) on several threads, flushed to disk
+and compared with the source by SHA-256 before it is renamed into place and
+the source removed.
+
+Each batch has an append-only journal (JSON lines) under
+MOVE_JOURNAL_DIRECTORY: the planned moves, then a record before and after
+each move. `resume` finishes the moves a journal doesn't record as done, and
+`undo` moves a batch's files back where they came from.
+"""
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import config
+from .metrics import increment, span
+
+logger = logging.getLogger(__name__)
+
+_COPY_CHUNK_BYTES = 64 * 1024 * 1024
+_HASH_CHUNK_BYTES = 1024 * 1024
+# copy_file_range fails with these where the kernel or file systems don't support it.
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM}
+
+
+def default_journal_directory() -> str:
+    """
+    Returns the move journal directory, next to the ChromaDB directory.
+    """
+    configured = getattr(config, "MOVE_JOURNAL_DIRECTORY", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "move_journals")
+
+
+def latest_journal(directory: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the most recent journal in the directory, or None.
+    """
+    directory = directory or default_journal_directory()
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(".jsonl")]
+    except FileNotFoundError:
+        return None
+    return os.path.join(directory, max(names)) if names else None
+
+
+class MoveResult(NamedTuple):
+    source: str
+    destination: str
+    moved: bool
+    error: Optional[str] = None
+
+
+class MoveJournal:
+    """
+    An append-only JSON-lines record of one batch of moves.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.batch_id = os.path.splitext(os.path.basename(path))[0]
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, directory: Optional[str] = None) -> "MoveJournal":
+        directory = directory or default_journal_directory()
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, f"moves-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"))
+
+    def write(self, record: dict, sync: bool = False):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            if sync:
+                self._sync()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+    @staticmethod
+    def read(path: str) -> Tuple[List[Tuple[str, str]], Dict[Tuple[str, int], dict]]:
+        """
+        Returns the planned (source, destination) moves of a journal and the
+        last record of each move in each phase ('move' or 'undo'). A torn last
+        line (from a crash while it was written) is ignored.
+        """
+        moves, states = [], {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record["op"] == "batch":
+                    moves = [tuple(move) for move in record["moves"]]
+                else:
+                    states[(record["phase"], record["n"])] = record
+        return moves, states
+
+
+class BulkMover:
+    """
+    Executes, resumes and undoes journaled batches of moves.
+    """
+    def __init__(self, journal_directory: Optional[str] = None, copy_threads: Optional[int] = None,
+                 verify: Optional[bool] = None):
+        """
+        Args:
+            journal_directory: Defaults to MOVE_JOURNAL_DIRECTORY.
+            copy_threads: Files copied concurrently across devices (defaults to MOVE_COPY_THREADS).
+            verify: Compare checksums of copies (defaults to MOVE_VERIFY_COPIES).
+        """
+        self.journal_directory = journal_directory or default_journal_directory()
+        self.copy_threads = max(1, copy_threads or getattr(config, "MOVE_COPY_THREADS", 4))
+        self.verify = getattr(config, "MOVE_VERIFY_COPIES", True) if verify is None else verify
+        self.journal_path: Optional[str] = None
+
+    def move_many(self, moves: Iterable[Tuple[str, str]]) -> List[MoveResult]:
+        """
+        Moves every (source, destination file path) pair, in a new journaled batch.
+
+        Returns:
+            One result per move, in order.
+        """
+        moves = [(os.path.abspath(source), os.path.abspath(destination)) for source, destination in moves]
+        journal = MoveJournal.create(self.journal_directory)
+        self.journal_path = journal.path
+        try:
+            journal.write({"op": "batch", "created": time.time(), "moves": moves}, sync=True)
+            return self._execute(journal, "move", list(enumerate(moves)))
+        finally:
+            journal.close()
+
+    def resume(self, journal_path: str) -> List[MoveResult]:
+        """
+        Finishes the moves of a batch that were not done (or found failed) when it was interrupted.
+
+        Returns:
+            The results of the moves that were still pending.
+        """
+        moves, states = MoveJournal.read(journal_path)
+        pending = [(n, move) for n, move in enumerate(moves)
+                   if states.get(("move", n), {}).get("op") not in ("done", "failed")]
+        return self._run_existing(journal_path, "move", pending, states)
+
+    def undo(self, journal_path: str) -> List[MoveResult]:
+        """
+        Moves the files of a batch back to their sources, most recent move
+        first. Files that were moved elsewhere since, or whose original name
+        has been taken, are left where they are.
+
+        Returns:
+            The results of the moves back (from the batch's destination to its source).
+        """
+        moves, states = MoveJournal.read(journal_path)
+        moved = [n for n in range(len(moves)) if states.get(("move", n), {}).get("op") == "done"]
+        pending = [(n, (moves[n][1], moves[n][0])) for n in reversed(moved)
+                   if states.get(("undo", n), {}).get("op") != "done"]
+        return self._run_existing(journal_path, "undo", pending, states)
+
+    # --- Internals ---
+
+    def _run_existing(self, journal_path: str, phase: str, pending: list, states: dict) -> List[MoveResult]:
+        self.journal_path = journal_path
+        journal = MoveJournal(journal_path)
+        try:
+            return self._execute(journal, phase, pending, states)
+        finally:
+            journal.close()
+
+    def _execute(self, journal: MoveJournal, phase: str, moves: List[Tuple[int, Tuple[str, str]]],
+                 states: Optional[dict] = None) -> List[MoveResult]:
+        results: Dict[int, MoveResult] = {}
+        groups: Dict[Tuple[int, int], list] = {}
+        folder_devices: Dict[str, Optional[int]] = {}
+        for n, (source, destination) in moves:
+            started = states is not None and (phase, n) in states
+            if started and self._recover(journal, phase, n, source, destination, states[(phase, n)]):
+                results[n] = MoveResult(source, destination, True)
+                continue
+            error, devices = self._check(source, destination, folder_devices)
+            if error:
+                journal.write({"op": "failed", "phase": phase, "n": n, "error": error})
+                results[n] = MoveResult(source, destination, False, error)
+                continue
+            groups.setdefault(devices, []).append((n, source, destination))
+
+        for (source_device, destination_device), group in groups.items():
+            method = "rename" if source_device == destination_device else "copy"
+            # The intent to move is on disk before any file is touched.
+            for n, source, destination in group:
+                journal.write({"op": "begin", "phase": phase, "n": n, "method": method})
+            journal.sync()
+            with span(f"move_{method}"):
+                if method == "rename":
+                    outcomes = map(lambda move: self._rename(journal, phase, *move), group)
+                else:
+                    pool = ThreadPoolExecutor(max_workers=self.copy_threads, thread_name_prefix="mover")
+                    with pool:
+                        outcomes = list(pool.map(lambda move: self._copy(journal, phase, *move), group))
+                for (n, source, destination), result in zip(group, outcomes):
+                    results[n] = result
+            journal.sync()
+            increment(f"move.{method}", sum(1 for n, _, _ in group if results[n].moved))
+        return [results[n] for n, _ in moves]
+
+    @staticmethod
+    def _check(source: str, destination: str, folder_devices: Dict[str, Optional[int]]):
+        """
+        Returns (error, None) if a move isn't allowed, else (None, (source device, destination device)).
+        """
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return "source file not found", None
+        if not os.path.isfile(source):
+            return "source is not a file", None
+        folder = os.path.dirname(destination)
+        if folder not in folder_devices:
+            try:
+                folder_devices[folder] = os.stat(folder).st_dev if os.path.isdir(folder) else None
+            except OSError:
+                folder_devices[folder] = None
+        if folder_devices[folder] is None:
+            return f"destination folder does not exist ('{folder}')", None
+        if os.path.lexists(destination):
+            return "destination already exists", None
+        return None, (stat.st_dev, folder_devices[folder])
+
+    def _rename(self, journal: MoveJournal, phase: str, n: int, source: str, destination: str) -> MoveResult:
+        try:
+            # Checked again right before the rename, which would replace an existing file.
+            if os.path.lexists(destination):
+                raise FileExistsError("destination already exists")
+            os.rename(source, destination)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                # Same device number but a different mount (e.g., a bind mount).
+                journal.write({"op": "begin", "phase": phase, "n": n, "method": "copy"}, sync=True)
+                return self._copy(journal, phase, n, source, destination)
+            journal.write({"op": "failed", "phase": phase, "n": n, "error": str(e)})
+            return MoveResult(source, destination, False, str(e))
+        journal.write({"op": "done", "phase": phase, "n": n})
+        logger.info("Moved '%s' to '%s'", source, destination)
+        return MoveResult(source, destination, True)
+
+    def _copy(self, journal: MoveJournal, phase: str, n: int, source: str, destination: str) -> MoveResult:
+        temp_path = self._temp_path(journal.batch_id, phase, n, destination)
+        try:
+            checksum = copy_verified(source, temp_path, verify=self.verify)
+            if os.path.lexists(destination):
+                raise FileExistsError("destination already exists")
+            os.rename(temp_path, destination)
+            _fsync_directory(os.path.dirname(destination))
+            # The copy is complete and verified, so the original can go (as with any move).
+            os.remove(source)
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            journal.write({"op": "failed", "phase": phase, "n": n, "error": str(e)})
+            return MoveResult(source, destination, False, str(e))
+        journal.write({"op": "done", "phase": phase, "n": n, "sha256": checksum})
+        logger.info("Copied '%s' to '%s'", source, destination)
+        return MoveResult(source, destination, True)
+
+    def _recover(self, journal: MoveJournal, phase: str, n: int, source: str, destination: str,
+                 record: dict) -> bool:
+        """
+        Settles a move that was started but not recorded as done.
+
+        Returns:
+            True if it turns out to be complete; otherwise it must be run again.
+        """
+        temp_path = self._temp_path(journal.batch_id, phase, n, destination)
+        if os.path.exists(temp_path):
+            # A partial copy of ours; the source is untouched.
+            os.remove(temp_path)
+        if not os.path.lexists(destination):
+            return False
+        if os.path.lexists(source):
+            if record.get("method") != "copy" or not _same_contents(source, destination):
+                # Not moved yet, and the destination name is taken (the check reports it).
+                return False
+            # Interrupted after the verified copy was renamed into place.
+            os.remove(source)
+        journal.write({"op": "done", "phase": phase, "n": n, "recovered": True})
+        return True
+
+    @staticmethod
+    def _temp_path(batch_id: str, phase: str, n: int, destination: str) -> str:
+        folder, name = os.path.split(destination)
+        return os.path.join(folder, f".{name}.{batch_id}-{phase}-{n}.partial")
+
+
+def copy_verified(source: str, destination: str, verify: bool = True) -> Optional[str]:
+    """
+    Copies a file's contents and metadata to a new file (which must not exist)
+    and flushes it to disk.
+
+    Returns:
+        The SHA-256 of the contents if `verify` is set (a mismatch raises OSError), else None.
+    """
+    with open(source, "rb") as fsrc, open(destination, "xb") as fdst:
+        _copy_contents(fsrc, fdst, os.fstat(fsrc.fileno()).st_size)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+    shutil.copystat(source, destination)
+    if not verify:
+        return None
+    checksum = _sha256(source)
+    if _sha256(destination) != checksum:
+        raise OSError(f"checksum mismatch copying '{source}'")
+    return checksum
+
+
+def _copy_contents(fsrc, fdst, size: int):
+    """
+    Copies in the kernel where possible: copy_file_range (which can also use
+    reflinks or server-side copies), then sendfile, then a buffered copy.
+    """
+    in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                count = os.copy_file_range(in_fd, out_fd, min(_COPY_CHUNK_BYTES, size - copied))
+                if count == 0:
+                    break
+                copied += count
+            return
+        except OSError as e:
+            if copied or e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    if hasattr(os, "sendfile"):
+        try:
+            while copied < size:
+                count = os.sendfile(out_fd, in_fd, copied, min(_COPY_CHUNK_BYTES, size - copied))
+                if count == 0:
+                    break
+                copied += count
+            return
+        except OSError as e:
+            if copied or e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    fsrc.seek(0)
+    shutil.copyfileobj(fsrc, fdst, _HASH_CHUNK_BYTES)
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _same_contents(first: str, second: str) -> bool:
+    try:
+        return os.path.getsize(first) == os.path.getsize(second) and _sha256(first) == _sha256(second)
+    except OSError:
+        return False
+
+
+def _fsync_directory(path: str):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    descriptor = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
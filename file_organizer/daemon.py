@@ -0,0 +1,275 @@
+import os
+import logging
+import json
+import time
+import queue
+import socket
+import threading
+import socketserver
+from typing import Dict, Any, Optional, Callable
+
+from .organizer import FileOrganizer
+from .plan import collect_files
+from .daemon_client import default_socket_path, daemon_supported
+from .metrics import METRICS, export_metrics
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a job's event stream.
+_END_OF_STREAM = object()
+
+
+class _Job:
+    """
+    A queued request plus the channel its events are streamed back on.
+    """
+    def __init__(self, request: Dict[str, Any]):
+        self.request = request
+        self.events: "queue.Queue[Any]" = queue.Queue()
+
+    def emit(self, event: Dict[str, Any]):
+        self.events.put(event)
+
+    def finish(self):
+        self.events.put(_END_OF_STREAM)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Reads one JSON request per connection and writes JSON events back, one per line.
+    """
+    def handle(self):
+        daemon: "OrganizerDaemon" = self.server.organizer_daemon
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            self._send({"event": "error", "error": f"invalid request: {e}"})
+            return
+
+        command = request.get("command")
+        if command == "health":
+            self._send({"status": "ok", "stats": daemon.get_stats()})
+            return
+        if command == "shutdown":
+            self._send({"event": "shutting_down"})
+            daemon.stop()
+            return
+        if command not in ("plan", "execute"):
+            self._send({"event": "error", "error": f"unknown command '{command}'"})
+            return
+
+        job = daemon.submit(request)
+        if job is None:
+            self._send({"event": "error", "error": "daemon is shutting down"})
+            return
+        while True:
+            event = job.events.get()
+            if event is _END_OF_STREAM:
+                break
+            try:
+                self._send(event)
+            except OSError:
+                # The client went away; the job still runs to completion.
+                break
+
+    def _send(self, event: Dict[str, Any]):
+        self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, getattr(socketserver, "UnixStreamServer", object)):
+    daemon_threads = True
+
+
+class OrganizerDaemon:
+    """
+    A long-running process that keeps the RAG system, LLM agent and embeddor
+    registry warm and serves organize requests over a local Unix socket.
+
+    Connections are accepted concurrently, but jobs run one at a time on a
+    single worker thread in arrival order, since the models are shared. The
+    daemon exits on its own after `idle_timeout` seconds without requests.
+    """
+    def __init__(self, socket_path: Optional[str] = None, idle_timeout: float = 1800.0,
+                 organizer_factory: Callable[[], FileOrganizer] = FileOrganizer):
+        if not daemon_supported():
+            raise RuntimeError("The organizer daemon requires Unix domain socket support.")
+        self.socket_path = socket_path or default_socket_path()
+        self.idle_timeout = idle_timeout
+        self.organizer_factory = organizer_factory
+        self.organizer: Optional[FileOrganizer] = None
+
+        self._jobs: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "started_at": time.time(),
+            "requests": 0,
+            "files_planned": 0,
+            "files_moved": 0,
+            "errors": 0,
+            "busy": False,
+        }
+        self._last_activity = time.monotonic()
+        self._stopping = threading.Event()
+        self._server: Optional[_UnixServer] = None
+
+    # --- Public API ---
+
+    def serve_forever(self):
+        """
+        Loads the models, binds the socket and serves until stopped or idle.
+        """
+        logger.info("Starting organizer daemon")
+        self._remove_stale_socket()
+        self.organizer = self.organizer_factory()
+
+        # Another daemon may have started while the models were loading.
+        self._remove_stale_socket()
+        # Create the socket owner-only from the start, rather than restricting it after bind().
+        umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        self._server.organizer_daemon = self
+
+        worker = threading.Thread(target=self._worker_loop, name="organizer-worker", daemon=True)
+        watchdog = threading.Thread(target=self._idle_watchdog, name="organizer-idle", daemon=True)
+        worker.start()
+        watchdog.start()
+        logger.info("Organizer daemon listening on %s (idle timeout %.0fs)", self.socket_path, self.idle_timeout)
+        try:
+            self._server.serve_forever(poll_interval=0.5)
+        finally:
+            self._stopping.set()
+            self._jobs.put(None)
+            worker.join()
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            logger.info("Organizer daemon stopped")
+
+    def _remove_stale_socket(self):
+        """
+        Removes a socket left behind by a daemon that is gone, which would make bind() fail.
+
+        Raises:
+            RuntimeError: If a daemon is still listening on the socket.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.socket_path)
+            except FileNotFoundError:
+                return
+            except ConnectionRefusedError:
+                logger.info("Removing the stale socket %s", self.socket_path)
+                os.remove(self.socket_path)
+                return
+        raise RuntimeError(f"An organizer daemon is already listening on {self.socket_path}.")
+
+    def stop(self):
+        """
+        Requests a clean shutdown; queued jobs are finished first.
+        """
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        # shutdown() blocks until serve_forever returns, so it must not run on a handler thread.
+        threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+    def submit(self, request: Dict[str, Any]) -> Optional[_Job]:
+        """
+        Queues a request and returns the job whose events will be streamed back,
+        or None if the daemon is shutting down.
+        """
+        if self._stopping.is_set():
+            return None
+        job = _Job(request)
+        self._touch()
+        with self._stats_lock:
+            self._stats["requests"] += 1
+        job.emit({"event": "queued", "position": self._jobs.qsize()})
+        self._jobs.put(job)
+        return job
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns counters describing the daemon's activity.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["uptime_seconds"] = round(time.time() - stats.pop("started_at"), 1)
+        stats["queued_jobs"] = self._jobs.qsize()
+        stats["idle_seconds"] = round(time.monotonic() - self._last_activity, 1)
+        stats["pid"] = os.getpid()
+        if self.organizer is not None:
+            stats["decisions"] = dict(self.organizer.decisions.stats)
+            stats["generation"] = self.organizer.generation
+        stats["metrics"] = METRICS.summary()
+        return stats
+
+    # --- Internals ---
+
+    def _touch(self):
+        self._last_activity = time.monotonic()
+
+    def _worker_loop(self):
+        """
+        Runs queued jobs one at a time against the warm organizer.
+        """
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            with self._stats_lock:
+                self._stats["busy"] = True
+            try:
+                self._run_job(job)
+            except Exception as e:
+                with self._stats_lock:
+                    self._stats["errors"] += 1
+                job.emit({"event": "error", "error": str(e)})
+            finally:
+                with self._stats_lock:
+                    self._stats["busy"] = False
+                self._touch()
+                job.finish()
+                # Keep the configured metrics files (e.g., a Prometheus textfile) current.
+                export_metrics()
+
+    def _run_job(self, job: _Job):
+        request = job.request
+        # A fresh build that finished since the last job is picked up here, between jobs.
+        self.organizer.follow_live_generation()
+        if request["command"] == "plan":
+            files = collect_files(request.get("paths", []), recursive=request.get("recursive", False))
+            job.emit({"event": "started", "files": len(files)})
+            before = dict(self.organizer.decisions.stats)
+            plan = self.organizer.build_plan(
+                files,
+                batch_size=request.get("batch_size", 32),
+                on_entry=lambda entry: job.emit({"event": "decision", "entry": entry}),
+            )
+            with self._stats_lock:
+                self._stats["files_planned"] += len(plan)
+            decisions = {key: value - before[key] for key, value in self.organizer.decisions.stats.items()}
+            job.emit({"event": "plan", "plan": plan, "decisions": decisions})
+        elif request["command"] == "execute":
+            moved = self.organizer.execute_plan(request.get("plan", []))
+            with self._stats_lock:
+                self._stats["files_moved"] += moved
+            job.emit({"event": "executed", "moved": moved})
+
+    def _idle_watchdog(self):
+        """
+        Stops the daemon once it has been idle for longer than the timeout.
+        """
+        while not self._stopping.wait(timeout=1.0):
+            busy = self._stats["busy"] or not self._jobs.empty()
+            if not busy and time.monotonic() - self._last_activity > self.idle_timeout:
+                logger.info("Idle for %.0fs, shutting down", self.idle_timeout)
+                self.stop()
+                return
@@ -0,0 +1,62 @@
+import os
+import json
+import socket
+import tempfile
+from typing import Iterator, Dict, Any, Optional
+
+# This module is imported on every CLI invocation, so it must only depend on
+# the standard library and the (lightweight) generated config.
+from . import config
+
+
+def default_socket_path() -> str:
+    """
+    Returns the Unix socket the organizer daemon listens on.
+    """
+    configured = getattr(config, "DAEMON_SOCKET_PATH", None)
+    if configured:
+        return configured
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return os.path.join(tempfile.gettempdir(), f"llm_file_organizer-{user}.sock")
+
+
+def daemon_supported() -> bool:
+    """True if this platform supports Unix domain sockets."""
+    return hasattr(socket, "AF_UNIX")
+
+
+def send_request(request: Dict[str, Any], socket_path: Optional[str] = None,
+                 timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Sends a single JSON request to the daemon and yields each JSON event it streams back.
+
+    Raises:
+        OSError: If the daemon is not running or the connection fails.
+    """
+    socket_path = socket_path or default_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("r", encoding="utf-8") as stream:
+            for line in stream:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def daemon_available(socket_path: Optional[str] = None) -> bool:
+    """
+    Checks whether a daemon is listening, using the health endpoint.
+    """
+    if not daemon_supported():
+        return False
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        for event in send_request({"command": "health"}, socket_path, timeout=2.0):
+            return event.get("status") == "ok"
+    except (OSError, ValueError):
+        return False
+    return False
@@ -0,0 +1,220 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+from typing import Optional, Tuple, List
+
+from . import config
+from .metrics import increment
+
+# How many decisions are cached between checks of the cache's size.
+CACHE_TRIM_INTERVAL = 256
+
+
+def default_decision_cache_path() -> str:
+    """
+    Returns the decision cache location, next to the ChromaDB directory.
+    """
+    configured = getattr(config, "DECISION_CACHE_PATH", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "decision_cache.sqlite3")
+
+
+def content_fingerprint(file_info: dict) -> str:
+    """
+    Fingerprints a file for the decision cache. Case, whitespace and digits are
+    normalized so that near-identical files (e.g., monthly copies of the same
+    report) share a fingerprint.
+    """
+    content = file_info.get("content", "") or ""
+    normalized = re.sub(r"\s+", " ", content.lower())
+    normalized = re.sub(r"\d", "0", normalized).strip()
+    _, ext = os.path.splitext(file_info.get("name", ""))
+    return hashlib.sha256(f"{ext.lower()}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def format_decision_stats(stats: dict) -> str:
+    return (
+        f"Decisions: {stats['bypassed']} bypassed, {stats['cached']} from cache, "
+        f"{stats['llm']} sent to the LLM"
+    )
+
+
+def is_folder_suggestion(response: Optional[str]) -> bool:
+    """
+    Whether an LLM response looks like a folder path, i.e. an answer worth caching.
+    """
+    return bool(response) and (":" in response or os.path.isabs(response))
+
+
+def neighbour_folders(rag_context: dict) -> List[Tuple[str, float]]:
+    """
+    Returns (folder, distance) for every retrieved neighbour in a RAG context.
+    A chunk shared by several files counts once for each of their folders.
+    """
+    metadatas = (rag_context.get("metadatas") or [[]])[0] or []
+    distances = (rag_context.get("distances") or [[]])[0] or []
+    folders = []
+    for meta, distance in zip(metadatas, distances):
+        meta = meta or {}
+        sources = meta.get("sources") or ([meta["source"]] if meta.get("source") else [])
+        for folder in dict.fromkeys(os.path.dirname(source) for source in sources):
+            folders.append((folder, distance))
+    return folders
+
+
+class DecisionEngine:
+    """
+    A decision layer in front of the LLM agent.
+
+    Decisions are made in the cheapest way that is safe:
+      1. Bypass: if the retrieved neighbours agree on a folder at small
+         distances (or the folder index is confident), that folder is used
+         without asking the LLM.
+      2. Cache: if an equivalent file (same content fingerprint, same candidate
+         folders, same prompt template) was decided before, that answer is reused.
+      3. LLM: otherwise the agent is asked and its answer is cached.
+    """
+    def __init__(self, llm, cache_path: Optional[str] = None):
+        self.llm = llm
+        self.min_agreement = getattr(config, "DECISION_BYPASS_MIN_AGREEMENT", 1.0)
+        self.max_distance = getattr(config, "DECISION_BYPASS_MAX_DISTANCE", 0.5)
+        self.min_neighbours = getattr(config, "DECISION_BYPASS_MIN_NEIGHBOURS", 2)
+        # 'direct' lets a confident folder index decide without the LLM.
+        self.folder_mode = getattr(config, "FOLDER_INDEX_MODE", "llm")
+        self.direct_min_score = getattr(config, "FOLDER_INDEX_DIRECT_MIN_SCORE", 0.85)
+        self.template_hash = hashlib.sha256(config.AGENT_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()
+        self.stats = {"bypassed": 0, "cached": 0, "llm": 0}
+
+        self._lock = threading.Lock()
+        self._conn = None
+        if getattr(config, "DECISION_CACHE_ENABLED", True):
+            self.max_cache_entries = getattr(config, "DECISION_CACHE_MAX_ENTRIES", 100000)
+            path = cache_path or default_decision_cache_path()
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS decisions_created ON decisions (created)")
+            self._conn.commit()
+            self._puts_since_trim = 0
+
+    # --- Bypass ---
+
+    def try_bypass(self, rag_context: dict) -> Optional[str]:
+        """
+        Returns a folder if the retrieval result is unambiguous enough to skip the LLM.
+        """
+        candidates = (rag_context.get("candidate_folders") or [[]])[0]
+        if self.folder_mode == "direct" and candidates and candidates[0][1] >= self.direct_min_score:
+            return candidates[0][0]
+
+        neighbours = neighbour_folders(rag_context)
+        if len(neighbours) < self.min_neighbours:
+            return None
+        folder, votes = Counter(folder for folder, _ in neighbours).most_common(1)[0]
+        if votes / len(neighbours) < self.min_agreement:
+            return None
+        if max(distance for f, distance in neighbours if f == folder) > self.max_distance:
+            return None
+        return folder
+
+    # --- Cache ---
+
+    def cache_key(self, file_info: dict, rag_context: dict) -> str:
+        folders = {folder for folder, _ in neighbour_folders(rag_context)}
+        folders.update(folder for folder, _ in (rag_context.get("candidate_folders") or [[]])[0])
+        parts = [content_fingerprint(file_info), "\n".join(sorted(folders)), self.template_hash]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM decisions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _cache_put(self, key: str, response: str):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO decisions (key, response, created) VALUES (?, ?, ?)",
+                (key, response, time.time())
+            )
+            # Keep the cache bounded by dropping the oldest decisions, checking its size now and then.
+            self._puts_since_trim += 1
+            if self._puts_since_trim >= CACHE_TRIM_INTERVAL:
+                self._puts_since_trim = 0
+                count = self._conn.execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+                if count > self.max_cache_entries:
+                    self._conn.execute(
+                        "DELETE FROM decisions WHERE key IN ("
+                        " SELECT key FROM decisions ORDER BY created LIMIT ?)",
+                        (count - self.max_cache_entries,)
+                    )
+            self._conn.commit()
+
+    # --- Decisions ---
+
+    def decide(self, file_info: dict, rag_context: dict) -> Tuple[Optional[str], str]:
+        """
+        Decides on a destination folder for a file.
+
+        Returns:
+            (suggested folder, how it was decided: 'bypass', 'cache' or 'llm').
+            The folder is None if the LLM request failed.
+        """
+        return self.decide_many([(file_info, rag_context)])[0]
+
+    def decide_many(self, requests: List[Tuple[dict, dict]]) -> List[Tuple[Optional[str], str]]:
+        """
+        Decides on many files at once. Files that need the LLM are sent to it
+        together, concurrently if the agent supports it (see `AsyncLLMAgent`).
+
+        Args:
+            requests: (file_info, rag_context) pairs.
+
+        Returns:
+            (suggested folder, how it was decided) for each request, in order
+            (the folder is None where the LLM request failed).
+        """
+        results: List[Optional[Tuple[Optional[str], str]]] = [None] * len(requests)
+        to_ask = []
+        for i, (file_info, rag_context) in enumerate(requests):
+            folder = self.try_bypass(rag_context)
+            if folder:
+                self.stats["bypassed"] += 1
+                increment("decisions.bypassed")
+                results[i] = (folder, "bypass")
+                continue
+            key = self.cache_key(file_info, rag_context)
+            cached = self._cache_get(key)
+            if cached is not None:
+                self.stats["cached"] += 1
+                increment("decisions.cached")
+                results[i] = (cached, "cache")
+                continue
+            to_ask.append((i, key))
+
+        if to_ask:
+            llm_requests = [requests[i] for i, _ in to_ask]
+            if hasattr(self.llm, "decide_many"):
+                responses = self.llm.decide_many(llm_requests)
+            else:
+                responses = [self.llm.decide_action(file_info=f, rag_context=c) for f, c in llm_requests]
+            for (i, key), response in zip(to_ask, responses):
+                response = response.strip() if response is not None else None
+                self.stats["llm"] += 1
+                increment("decisions.llm")
+                # Failed requests and answers that are not a folder are asked again next time.
+                if is_folder_suggestion(response):
+                    self._cache_put(key, response)
+                results[i] = (response, "llm")
+        return results
@@ -0,0 +1,220 @@
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+# Parameters of the MinHash hash functions are drawn from a fixed seed, so
+# signatures computed in different processes and runs are comparable.
+_SEED = 0x5EED
+
+
+def default_dedup_index_path() -> str:
+    """
+    Returns the deduplication index location, which lives next to the ChromaDB directory.
+    """
+    configured = getattr(config, "DEDUP_INDEX_PATH", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "dedup_index.sqlite3")
+
+
+def dedup_enabled() -> bool:
+    return getattr(config, "DEDUP_ENABLED", True)
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures of texts over word shingles.
+
+    The share of equal positions in two signatures estimates the Jaccard
+    similarity of the texts' shingle sets.
+    """
+    def __init__(self, num_perm: Optional[int] = None, shingle_size: Optional[int] = None):
+        self.num_perm = num_perm or getattr(config, "DEDUP_NUM_PERM", 64)
+        self.shingle_size = shingle_size or getattr(config, "DEDUP_SHINGLE_SIZE", 3)
+        rng = np.random.default_rng(_SEED)
+        # Multiply-shift hashing: ((a * x + b) mod 2^64) >> 32, with odd a.
+        self._a = rng.integers(1, 2 ** 63, size=self.num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        if not tokens:
+            return np.empty(0, dtype=np.uint64)
+        size = min(self.shingle_size, len(tokens))
+        shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        return np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+            dtype=np.uint64, count=len(shingles)
+        )
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        Returns the text's signature (uint32, length num_perm), or None if it has no words.
+        """
+        shingles = self._shingles(text)
+        if shingles.size == 0:
+            return None
+        # uint64 arithmetic wraps around, which is the "mod 2^64".
+        hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts: Iterable[str]) -> List[Optional[bytes]]:
+        """
+        Returns the signatures of many texts, serialized for storage (None for texts without words).
+        """
+        result = []
+        for text in texts:
+            signature = self.signature(text)
+            result.append(None if signature is None else signature.tobytes())
+        return result
+
+
+class DedupIndex:
+    """
+    Finds exact and near-duplicate chunks at ingest.
+
+    Exact duplicates share a content-addressed chunk id. Near duplicates are
+    found with locality-sensitive hashing: each stored chunk's MinHash
+    signature is cut into bands, and chunks that share a band bucket with a new
+    chunk are compared to it by signature. A new chunk whose estimated Jaccard
+    similarity to a stored one is at least `threshold` is not stored; the files
+    it came from reference the stored (canonical) chunk instead, so every
+    duplicate group lives in the collection once and the manifest's
+    `chunk_refs` lists all of its source files.
+
+    The index is only used by the ingest writer thread.
+    """
+    def __init__(self, path: Optional[str] = None, threshold: Optional[float] = None,
+                 num_perm: Optional[int] = None, bands: Optional[int] = None):
+        """
+        Opens (or creates) the index.
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity for a near duplicate.
+            num_perm: Signature length; must be divisible by `bands`.
+            bands: Number of LSH bands. More bands find less similar candidates.
+        """
+        self.path = path or default_dedup_index_path()
+        self.threshold = threshold if threshold is not None else getattr(config, "DEDUP_NEAR_THRESHOLD", 0.85)
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands or getattr(config, "DEDUP_BANDS", 8)
+        if self.hasher.num_perm % self.bands:
+            raise ValueError(f"DEDUP_NUM_PERM ({self.hasher.num_perm}) must be divisible by DEDUP_BANDS ({self.bands})")
+        self.rows = self.hasher.num_perm // self.bands
+        self.stats = {"new": 0, "exact": 0, "near": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, signature BLOB);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket INTEGER NOT NULL, chunk_id TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket);
+            CREATE INDEX IF NOT EXISTS bands_chunk ON bands (chunk_id);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        # Signatures made with other parameters can't be compared; start over.
+        params = f"{self.hasher.num_perm}/{self.hasher.shingle_size}/{self.bands}"
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'params'").fetchone()
+        if row is not None and row[0] != params:
+            logger.info("Deduplication parameters changed; clearing the index.")
+            self.clear()
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('params', ?)", (params,))
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _buckets(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        return [
+            (band, int.from_bytes(
+                hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).digest(),
+                "little", signed=True))
+            for band in range(self.bands)
+        ]
+
+    def resolve(self, chunk_id: str, signature: Optional[bytes]) -> Tuple[str, str]:
+        """
+        Decides how a chunk is stored.
+
+        Returns:
+            (chunk id to reference, kind), where kind is 'exact' (the chunk is
+            already stored), 'near' (a near duplicate is stored under the
+            returned id) or 'new' (the chunk must be stored; it is now indexed,
+            and must be `remove`d again if storing it fails).
+        """
+        if self.conn.execute("SELECT 1 FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone():
+            self.stats["exact"] += 1
+            return chunk_id, "exact"
+        if signature is None:
+            self.conn.execute("INSERT INTO chunks (chunk_id, signature) VALUES (?, NULL)", (chunk_id,))
+            self.stats["new"] += 1
+            return chunk_id, "new"
+
+        vector = np.frombuffer(signature, dtype=np.uint32)
+        buckets = self._buckets(vector)
+        candidates = self.conn.execute(
+            "SELECT DISTINCT c.chunk_id, c.signature FROM bands b JOIN chunks c ON c.chunk_id = b.chunk_id "
+            f"WHERE (b.band, b.bucket) IN (VALUES {', '.join('(?, ?)' for _ in buckets)})",
+            [value for bucket in buckets for value in bucket]
+        ).fetchall()
+        best_id, best_similarity = None, self.threshold
+        for candidate_id, candidate_signature in candidates:
+            similarity = float(np.mean(np.frombuffer(candidate_signature, dtype=np.uint32) == vector))
+            if similarity >= best_similarity:
+                best_id, best_similarity = candidate_id, similarity
+        if best_id is not None:
+            self.stats["near"] += 1
+            return best_id, "near"
+
+        self.conn.execute("INSERT INTO chunks (chunk_id, signature) VALUES (?, ?)", (chunk_id, signature))
+        self.conn.executemany(
+            "INSERT INTO bands (band, bucket, chunk_id) VALUES (?, ?, ?)",
+            [(band, bucket, chunk_id) for band, bucket in buckets]
+        )
+        self.stats["new"] += 1
+        return chunk_id, "new"
+
+    def remove(self, chunk_ids: List[str]):
+        """
+        Forgets chunks that were deleted from the collection.
+        """
+        self.conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", ((chunk_id,) for chunk_id in chunk_ids))
+        self.conn.executemany("DELETE FROM bands WHERE chunk_id = ?", ((chunk_id,) for chunk_id in chunk_ids))
+
+    def clear(self):
+        self.conn.execute("DELETE FROM chunks")
+        self.conn.execute("DELETE FROM bands")
+        self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def format_dedup_stats(stats: Dict[str, int]) -> str:
+    """
+    Summarizes how the chunks of a build were stored.
+    """
+    total = sum(stats.values())
+    if not total:
+        return "Deduplication: no new chunks."
+    return (
+        f"Deduplication: {stats['new']} new, {stats['exact']} exact and {stats['near']} near duplicate chunk(s) "
+        f"({(stats['exact'] + stats['near']) / total:.1%} not stored again)"
+    )
@@ -0,0 +1,299 @@
+import os
+import logging
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_directory() -> str:
+    """
+    Returns the embedding cache location. It lives outside the ChromaDB directory
+    so that it survives `--fresh-build`.
+    """
+    configured = getattr(config, "EMBEDDING_CACHE_DIRECTORY", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "embedding_cache")
+
+
+class EmbeddingCache:
+    """
+    A content-addressed, on-disk cache of embedding vectors.
+
+    Entries are keyed on (embedding model name, SHA-256 of the text), so a chunk
+    whose text is unchanged is never embedded twice, even if the file was moved,
+    renamed or the database was rebuilt from scratch.
+
+    Vectors are stored in a memory-mapped float32 matrix (`vectors.f32`) and an
+    SQLite index (`index.sqlite3`) maps each key to its row. When the cache
+    exceeds `max_bytes`, the least recently used entries are evicted and their
+    rows reused.
+
+    Several processes may share the cache (e.g., a build and the watcher).
+    Lookups and writes hold the index's write lock (`BEGIN IMMEDIATE`), so
+    rows are allocated, written and read one process at a time, and the
+    vector file is re-mapped whenever another process has grown it.
+    """
+    _GROWTH_ROWS = 4096
+
+    def __init__(self, model_name: str, directory: Optional[str] = None, max_bytes: int = 1024 ** 3):
+        """
+        Opens (or creates) the cache.
+
+        Args:
+            model_name: The embedding model; vectors from different models never mix.
+            directory: Where the cache files are stored.
+            max_bytes: Upper bound on the size of the vector file.
+        """
+        self.model_name = model_name
+        self.directory = directory or default_cache_directory()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=60.0,
+                                     check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key BLOB PRIMARY KEY,
+                slot INTEGER NOT NULL,
+                last_used INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+        self._conn.commit()
+
+        self.dim = self._get_meta("dim")
+        self._tick = self._get_meta("tick") or 0
+        self._vectors: Optional[np.memmap] = None
+        if self.dim:
+            self._open_vectors()
+
+    # --- Metadata helpers ---
+
+    def _get_meta(self, name: str) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value: int):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Holds the index's write lock (and this instance's lock) for a lookup or write.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have created or grown the cache since the last call.
+                self.dim = self.dim or self._get_meta("dim")
+                self._tick = self._get_meta("tick") or 0
+                if self.dim:
+                    self._open_vectors()
+                yield
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    # --- Vector file ---
+
+    @property
+    def max_entries(self) -> int:
+        return max(1, self.max_bytes // (self.dim * 4)) if self.dim else 0
+
+    def _file_rows(self) -> int:
+        return os.path.getsize(self._vectors_path) // (self.dim * 4) if os.path.exists(self._vectors_path) else 0
+
+    def _open_vectors(self):
+        """
+        Memory-maps the vector file at its current size, creating it if needed.
+        """
+        rows = self._file_rows()
+        if rows == 0:
+            self._resize_vectors(min(self._GROWTH_ROWS, self.max_entries))
+        elif self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def _resize_vectors(self, rows: int):
+        """
+        Grows the vector file to at least `rows` rows and re-maps it.
+        """
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        # Never shrink: another process may have grown the file further.
+        rows = max(rows, self._file_rows())
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(rows * self.dim * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def _allocate_slots(self, count: int) -> List[int]:
+        """
+        Returns `count` free rows: first previously freed rows, then fresh rows
+        (growing the file), then rows reclaimed by evicting the LRU entries.
+        Must run inside `_transaction`.
+        """
+        slots = [row[0] for row in self._conn.execute("SELECT slot FROM free_slots LIMIT ?", (count,))]
+        if slots:
+            self._conn.executemany("DELETE FROM free_slots WHERE slot = ?", [(slot,) for slot in slots])
+
+        capacity = self.max_entries
+        next_slot = self._get_meta("next_slot") or 0
+        fresh = min(count - len(slots), capacity - next_slot)
+        if fresh > 0:
+            slots.extend(range(next_slot, next_slot + fresh))
+            self._set_meta("next_slot", next_slot + fresh)
+            if next_slot + fresh > self._vectors.shape[0]:
+                self._resize_vectors(min(capacity, max(next_slot + fresh, self._vectors.shape[0] * 2)))
+
+        remaining = count - len(slots)
+        if remaining > 0:
+            # Evict at least 1% of the cache at a time to amortize the cost.
+            victims = self._conn.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?",
+                (max(remaining, capacity // 100),)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+            self.evictions += len(victims)
+            victim_slots = [slot for _, slot in victims]
+            slots.extend(victim_slots[:remaining])
+            self._conn.executemany(
+                "INSERT INTO free_slots (slot) VALUES (?)", [(slot,) for slot in victim_slots[remaining:]]
+            )
+        return slots
+
+    # --- Public API ---
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Looks up many texts at once.
+
+        Returns:
+            A list aligned with `texts`, holding a vector or None for each miss.
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        if not texts:
+            return results
+
+        keys = [self._key(text) for text in texts]
+        with self._transaction():
+            if self._vectors is None:
+                self.misses += len(texts)
+                return results
+            self._tick += 1
+            slots = {}
+            # SQLite limits the number of bound parameters, so query in chunks.
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, slot in self._conn.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", chunk
+                ):
+                    slots[key] = slot
+            if slots:
+                self._conn.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    [(self._tick, key) for key in slots]
+                )
+                self._set_meta("tick", self._tick)
+            for i, key in enumerate(keys):
+                slot = slots.get(key)
+                # Rows are written before they are committed; a row past the file is a miss.
+                if slot is not None and slot < self._vectors.shape[0]:
+                    results[i] = np.array(self._vectors[slot])
+
+        found = sum(1 for vector in results if vector is not None)
+        self.hits += found
+        self.misses += len(texts) - found
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """
+        Stores vectors for many texts at once.
+        """
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._transaction():
+            if not self.dim:
+                self.dim = int(matrix.shape[1])
+                self._set_meta("dim", self.dim)
+                self._open_vectors()
+            elif matrix.shape[1] != self.dim:
+                logger.warning("Embedding cache: dimension mismatch (%d != %d); not caching.", matrix.shape[1], self.dim)
+                return
+
+            # Drop duplicates (within the batch and already cached) so each key owns one row.
+            pending = {}
+            for text, vector in zip(texts, matrix):
+                pending.setdefault(self._key(text), vector)
+            existing = set()
+            keys = list(pending)
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(row[0] for row in self._conn.execute(
+                    f"SELECT key FROM entries WHERE key IN ({placeholders})", chunk
+                ))
+            new_keys = [key for key in keys if key not in existing][-self.max_entries:]
+            if not new_keys:
+                return
+
+            slots = self._allocate_slots(len(new_keys))
+
+            self._tick += 1
+            for key, slot in zip(new_keys, slots):
+                self._vectors[slot] = pending[key]
+            self._vectors.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                [(key, slot, self._tick) for key, slot in zip(new_keys, slots)]
+            )
+            self._set_meta("tick", self._tick)
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters for this session plus the cache's size.
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0,
+        }
+
+    def close(self):
+        """Flushes the vector file and closes the index."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._conn.commit()
+            self._conn.close()
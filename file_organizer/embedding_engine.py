@@ -0,0 +1,190 @@
+"""
+Embeds texts with the configured SentenceTransformer model, either in this
+process or in a pool of CPU worker processes.
+
+Texts are sorted by length and split into batches of similar length, so that
+little of a batch is padding; the vectors are returned in the input order.
+Each worker process loads its own copy of the model and runs it with a fixed
+number of intra-op threads (and, where the OS allows, on its own CPUs), so
+that the workers don't compete for cores. With EMBEDDING_BACKEND = "onnx" the
+model runs on ONNX Runtime (exported from EMBEDDING_MODEL_NAME on first use).
+"""
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional
+
+import numpy as np
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx")
+_THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# Each worker process loads the model once, in the pool initializer.
+_worker_model = None
+
+
+def load_model(model_name: str, backend: str = "torch", threads: Optional[int] = None, device: Optional[str] = None):
+    """
+    Loads a SentenceTransformer model, on ONNX Runtime if `backend` is 'onnx'.
+
+    Falls back to PyTorch (with a warning) if the installed sentence-transformers
+    or ONNX Runtime can't run the model.
+    """
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                       model_kwargs=_onnx_model_kwargs(threads))
+        except (ImportError, TypeError, ValueError, OSError) as e:
+            logger.warning("Can't run '%s' on ONNX Runtime (%s); using PyTorch.", model_name, e)
+    elif backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+    model = SentenceTransformer(model_name, device=device)
+    if threads:
+        _set_torch_threads(threads)
+    return model
+
+
+def _onnx_model_kwargs(threads: Optional[int]) -> dict:
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    return {"provider": "CPUExecutionProvider", "session_options": options}
+
+
+def _set_torch_threads(threads: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _encode(model, texts: list) -> np.ndarray:
+    # Not normalized, like ChromaDB's SentenceTransformerEmbeddingFunction, so
+    # stores and caches built with either are interchangeable.
+    return np.asarray(
+        model.encode(texts, batch_size=max(1, len(texts)), convert_to_numpy=True,
+                     normalize_embeddings=False, show_progress_bar=False),
+        dtype=np.float32,
+    )
+
+
+def _init_worker(model_name: str, backend: str, threads: int, cpu_sets: list, counter):
+    """
+    Pool initializer: pins this worker's threads (and CPUs) and loads the model.
+    """
+    global _worker_model
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    # Set before PyTorch is imported, so its OpenMP pool starts at this size.
+    for variable in _THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    if cpu_sets:
+        try:
+            os.sched_setaffinity(0, cpu_sets[index % len(cpu_sets)])
+        except OSError as e:
+            logger.debug("Could not pin embedding worker %d to CPUs: %s", index, e)
+    _worker_model = load_model(model_name, backend, threads, device="cpu")
+
+
+def _encode_in_worker(texts: list) -> np.ndarray:
+    return _encode(_worker_model, texts)
+
+
+def _available_cpus() -> list:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class EmbeddingEngine:
+    """
+    Embeds texts in length-sorted batches, in this process or in worker processes.
+
+    Called like an embedding function: `engine(texts)` returns a float32 matrix
+    with one row per text, in order.
+    """
+    def __init__(self, model_name: Optional[str] = None, workers: Optional[int] = None,
+                 threads: Optional[int] = None, batch_size: Optional[int] = None, backend: Optional[str] = None):
+        """
+        Args:
+            model_name: Defaults to EMBEDDING_MODEL_NAME.
+            workers: Worker processes (defaults to EMBEDDING_WORKERS); 0 embeds in this process.
+            threads: Intra-op threads per worker, or for this process if `workers`
+                is 0 (defaults to EMBEDDING_THREADS_PER_WORKER; None divides the
+                CPUs between the workers, or leaves the library default in-process).
+            batch_size: Texts per batch (defaults to EMBEDDING_BATCH_SIZE).
+            backend: 'torch' or 'onnx' (defaults to EMBEDDING_BACKEND).
+        """
+        self.model_name = model_name or config.EMBEDDING_MODEL_NAME
+        self.workers = max(0, getattr(config, "EMBEDDING_WORKERS", 0) if workers is None else workers)
+        self.threads = getattr(config, "EMBEDDING_THREADS_PER_WORKER", None) if threads is None else threads
+        self.batch_size = max(1, batch_size or getattr(config, "EMBEDDING_BATCH_SIZE", 64))
+        self.backend = backend or getattr(config, "EMBEDDING_BACKEND", "torch")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND {self.backend!r} (expected one of {', '.join(BACKENDS)})")
+        if self.workers and not self.threads:
+            self.threads = max(1, len(_available_cpus()) // self.workers)
+        self._model = None
+        self._pool = None
+
+    def __call__(self, input: Iterable[str]) -> np.ndarray:
+        texts = list(input)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Similar lengths share a batch, so few tokens are padding.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        if self.workers:
+            pool = self._get_pool()
+            results = pool.map(_encode_in_worker, [[texts[i] for i in batch] for batch in batches])
+        else:
+            model = self._get_model()
+            results = (_encode(model, [texts[i] for i in batch]) for batch in batches)
+
+        vectors = None
+        for batch, result in zip(batches, results):
+            if vectors is None:
+                vectors = np.empty((len(texts), result.shape[1]), dtype=np.float32)
+            vectors[batch] = result
+        return vectors
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = load_model(self.model_name, self.backend, self.threads)
+        return self._model
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            cpus = _available_cpus()
+            # Each worker gets its own CPUs when there are enough to go round.
+            cpu_sets = []
+            if hasattr(os, "sched_setaffinity") and self.workers * self.threads <= len(cpus):
+                cpu_sets = [set(cpus[i * self.threads:(i + 1) * self.threads]) for i in range(self.workers)]
+            # Spawned, not forked: a forked copy of a loaded PyTorch runtime can deadlock.
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                initargs=(self.model_name, self.backend, self.threads, cpu_sets, context.Value("i", 0)),
+            )
+            logger.info("Started %d embedding workers with %d threads each (%s).",
+                        self.workers, self.threads, self.backend)
+        return self._pool
+
+    def close(self):
+        """
+        Stops the worker processes (they are started again when needed).
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -1,7 +1,9 @@
+import time
+import hashlib
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Set, Iterable, Iterator
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from ..metrics import observe
 
 class BaseFileEmbeddor(ABC):
     """
@@ -10,6 +12,12 @@ class BaseFileEmbeddor(ABC):
     This ensures that every file handler, regardless of the file type,
     provides a consistent way to extract content and metadata.
     """
+    # File extensions (lowercase, with the dot) this embeddor handles.
+    SUPPORTED_EXTENSIONS: Set[str] = set()
+
+    # The max size of each chunk and the overlap between chunks (in characters).
+    CHUNK_SIZE = 1000
+    CHUNK_OVERLAP = 200
 
     @abstractmethod
     def can_handle(self, file_path: str) -> bool:
@@ -50,42 +58,120 @@ class BaseFileEmbeddor(ABC):
         """
         pass
 
-    def prepare_for_embedding(self, file_path: str) -> Tuple[List[str], List[Dict], List[str]]:
+    def extract_preview(self, file_path: str) -> str:
         """
-        A concrete method that orchestrates extraction, chunking, and preparation.
+        Extracts enough text to decide where a file belongs. Embeddors for large
+        formats can override this to avoid extracting the whole file.
         """
-        if not self.can_handle(file_path):
-            return [], [], []
+        return self.extract_content(file_path)
+
+    def _get_text_splitter(self):
+        """
+        Returns this embeddor's text splitter, building it on first use.
+        """
+        if getattr(self, "_text_splitter", None) is None:
+            # Imported here so that extracting content (all the organize path needs)
+            # doesn't pay for importing langchain.
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            # This splitter tries to keep paragraphs/sentences together.
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.CHUNK_SIZE,
+                chunk_overlap=self.CHUNK_OVERLAP
+            )
+        return self._text_splitter
 
+    def _chunk_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Splits a stream of text pieces into chunks without holding the whole text.
+
+        Text is buffered until it spans several chunks, split, and every chunk
+        but the last is emitted. The last one stays in the buffer, so the next
+        piece is split together with it and chunk boundaries and overlap match
+        splitting the full text at once closely.
+        """
+        text_splitter = self._get_text_splitter()
+        window = self.CHUNK_SIZE * 8
+        buffer = ""
+        # Time spent producing text (extraction) and splitting it (chunking), recorded once per file.
+        extract_seconds = chunk_seconds = 0.0
+        pieces = iter(pieces)
+        try:
+            while True:
+                mark = time.perf_counter()
+                piece = next(pieces, None)
+                extract_seconds += time.perf_counter() - mark
+                if piece is None:
+                    break
+                buffer += piece
+                if len(buffer) < window:
+                    continue
+                mark = time.perf_counter()
+                chunks = text_splitter.split_text(buffer)
+                chunk_seconds += time.perf_counter() - mark
+                if len(chunks) < 2:
+                    continue
+                yield from chunks[:-1]
+                # Keep the raw tail (not the stripped chunk) so whitespace at piece boundaries survives.
+                start = buffer.rfind(chunks[-1])
+                buffer = buffer[start:] if start >= 0 else chunks[-1]
+            if buffer.strip():
+                mark = time.perf_counter()
+                chunks = text_splitter.split_text(buffer)
+                chunk_seconds += time.perf_counter() - mark
+                yield from chunks
+        finally:
+            observe("extract", extract_seconds)
+            observe("chunk", chunk_seconds)
+
+    def _chunk_id(self, file_path: str, chunk_number: int, chunk: str) -> str:
+        """
+        Creates a content-addressed ID for a chunk: the hash of its text.
+
+        The ID doesn't depend on where the file lives, so moving a file only
+        changes its chunks' metadata, and identical chunks share one ID.
+        """
+        return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+    def _chunk_metadata(self, base_metadata: Dict[str, Any], chunk_number: int, chunk: str) -> Dict[str, Any]:
+        """
+        Creates metadata for a chunk, linking back to the original file.
+        """
+        chunk_metadata = base_metadata.copy()
+        chunk_metadata['chunk_number'] = chunk_number
+        chunk_metadata['content_snippet'] = chunk[:100] # Add a snippet for context
+        return chunk_metadata
+
+    def _iter_text(self, file_path: str) -> Iterable[str]:
+        """
+        Yields the file's text in pieces. The default extracts it all at once;
+        embeddors for large formats override this to read incrementally.
+        """
         content = self.extract_content(file_path)
-        if not content:
-            return [], [], []
-            
-        base_metadata = self.extract_metadata(file_path)
-        
-        # --- Chunking Logic ---
-        # This splitter tries to keep paragraphs/sentences together.
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # The max size of each chunk (in characters)
-            chunk_overlap=200   # The number of characters to overlap between chunks
-        )
-        chunks = text_splitter.split_text(content)
-        # -------------------------
-
-        # --- UPDATED: Prepare lists for multiple chunks ---
-        documents = chunks
-        metadatas = []
-        ids = []
+        if content:
+            yield content
 
-        for i, chunk in enumerate(chunks):
-            # Create a unique ID for each chunk
-            chunk_id = f"{file_path}-chunk-{i}"
-            ids.append(chunk_id)
+    def iter_chunks(self, file_path: str) -> Iterator[Tuple[str, Dict[str, Any], str]]:
+        """
+        Streams (chunk, metadata, id) tuples for a file without holding its full text.
+        """
+        if not self.can_handle(file_path):
+            return
 
-            # Create metadata for each chunk, linking back to the original file
-            chunk_metadata = base_metadata.copy()
-            chunk_metadata['chunk_number'] = i
-            chunk_metadata['content_snippet'] = chunk[:100] # Add a snippet for context
+        base_metadata = None
+        for i, chunk in enumerate(self._chunk_stream(self._iter_text(file_path))):
+            if base_metadata is None:
+                base_metadata = self.extract_metadata(file_path)
+            yield chunk, self._chunk_metadata(base_metadata, i, chunk), self._chunk_id(file_path, i, chunk)
+
+    def prepare_for_embedding(self, file_path: str) -> Tuple[List[str], List[Dict], List[str]]:
+        """
+        A concrete method that orchestrates extraction, chunking, and preparation.
+        """
+        documents = []
+        metadatas = []
+        ids = []
+        for chunk, chunk_metadata, chunk_id in self.iter_chunks(file_path):
+            documents.append(chunk)
             metadatas.append(chunk_metadata)
-        
-        return documents, metadatas, ids
\ No newline at end of file
+            ids.append(chunk_id)
+        return documents, metadatas, ids
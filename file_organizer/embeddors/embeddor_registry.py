@@ -1,29 +1,114 @@
-from .text_embeddor import TextFileEmbeddor
-from .pdf_embeddor import PDFEmbeddor
-# We will add future embeddors here, e.g., from .word_embeddor import WordDocumentEmbeddor
+import os
+import logging
+import importlib
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+# Built-in embeddors, referenced as "module:Class" strings so that looking up a
+# '.txt' file never imports pypdf (and nothing at all is imported until a file
+# of that type is actually seen). The extensions must match each embeddor's
+# SUPPORTED_EXTENSIONS; tests/test_embeddor_registry.py checks that they do.
+_BUILTIN_EMBEDDORS = {
+    "file_organizer.embeddors.text_embeddor:TextFileEmbeddor": (
+        '.txt', '.md', '.json', '.csv', '.py', '.js', '.html', '.css',
+    ),
+    "file_organizer.embeddors.pdf_embeddor:PDFEmbeddor": ('.pdf',),
+    # Add new built-in embeddors here
+}
+
+# Third-party packages can register embeddors under this entry point group.
+# The entry point name lists the extensions it handles, comma-separated, e.g.:
+#
+#   [project.entry-points."file_organizer.embeddors"]
+#   "docx,doc" = "my_package.word_embeddor:WordDocumentEmbeddor"
+ENTRY_POINT_GROUP = "file_organizer.embeddors"
+
+
+def _normalize_extension(ext: str) -> str:
+    ext = ext.strip().lower()
+    return ext if ext.startswith('.') else f'.{ext}'
+
 
 class EmbeddorRegistry:
     """
-    A registry to hold and manage all concrete embeddor instances.
+    A registry that maps file extensions to embeddors.
+
+    Embeddor classes are only imported and instantiated the first time a file
+    with one of their extensions is looked up, and each is constructed once.
     """
     def __init__(self):
         """
-        Initializes the registry by creating instances of all known embeddors.
+        Initializes the registry with the built-in extension table.
+        Entry points are discovered lazily, on the first lookup that needs them.
+        """
+        self._specs: Dict[str, object] = {}
+        for spec, extensions in _BUILTIN_EMBEDDORS.items():
+            for ext in extensions:
+                self._specs[ext] = spec
+        self._instances: Dict[object, object] = {}
+        self._entry_points_loaded = False
+
+    def _load_entry_points(self):
+        """
+        Adds third-party embeddors advertised through entry points. Only the
+        entry point metadata is read here; the plugin itself is imported on first use.
+        """
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        try:
+            # importlib.metadata is slow to import, so only pay for it when needed.
+            from importlib import metadata
+            entry_points = metadata.entry_points(group=ENTRY_POINT_GROUP)
+        except Exception as e:
+            logger.error("Error discovering embeddor plugins: %s", e)
+            return
+        for entry_point in entry_points:
+            for ext in entry_point.name.split(','):
+                if ext.strip():
+                    self._specs[_normalize_extension(ext)] = entry_point
+
+    def register(self, extensions, embeddor):
+        """
+        Registers an embeddor class, instance or "module:Class" string for the given extensions.
         """
-        self.embeddors = [
-            TextFileEmbeddor(),
-            PDFEmbeddor(),
-            # Add new embeddor instances here
-        ]
-        print(f"EmbeddorRegistry initialized with {len(self.embeddors)} embeddors.")
+        for ext in extensions:
+            self._specs[_normalize_extension(ext)] = embeddor
+
+    def supported_extensions(self) -> Set[str]:
+        """
+        Returns every extension the registry can handle, without importing any embeddor.
+        """
+        self._load_entry_points()
+        return set(self._specs)
+
+    def _instantiate(self, spec):
+        """
+        Imports and constructs the embeddor for a spec, caching the instance.
+        """
+        if spec in self._instances:
+            return self._instances[spec]
+
+        if isinstance(spec, str):
+            module_name, class_name = spec.split(':')
+            embeddor_class = getattr(importlib.import_module(module_name), class_name)
+            instance = embeddor_class()
+        elif hasattr(spec, "load"):
+            # An importlib.metadata.EntryPoint
+            instance = spec.load()()
+        elif isinstance(spec, type):
+            instance = spec()
+        else:
+            instance = spec
+
+        self._instances[spec] = instance
+        return instance
 
     def get_embeddor_for_file(self, file_path: str):
         """
         Finds and returns the appropriate embeddor for a given file path.
 
-        It iterates through the registered embeddors and returns the first one
-        that reports it can handle the file type.
-
         Args:
             file_path: The path to the file that needs processing.
 
@@ -31,10 +116,33 @@ class EmbeddorRegistry:
             An instance of a BaseFileEmbeddor subclass, or None if no
             suitable embeddor is found.
         """
-        for embeddor in self.embeddors:
-            if embeddor.can_handle(file_path):
-                print(f"Found suitable embeddor for '{file_path}': {embeddor.__class__.__name__}")
-                return embeddor
-        
-        print(f"No suitable embeddor found for '{file_path}'.")
-        return None
\ No newline at end of file
+        _, ext = os.path.splitext(file_path)
+        ext = ext.lower()
+        spec = self._specs.get(ext)
+        if spec is None and not self._entry_points_loaded:
+            self._load_entry_points()
+            spec = self._specs.get(ext)
+        if spec is None:
+            return None
+
+        try:
+            return self._instantiate(spec)
+        except Exception as e:
+            logger.error("Error loading embeddor for '%s' files: %s", ext, e)
+            # Don't retry a broken embeddor for every file of this type.
+            self._specs.pop(ext, None)
+            return None
+
+    @property
+    def embeddors(self) -> list:
+        """
+        All registered embeddors. Accessing this imports and instantiates every one of them.
+        """
+        self._load_entry_points()
+        instances = []
+        for spec in dict.fromkeys(self._specs.values()):
+            try:
+                instances.append(self._instantiate(spec))
+            except Exception as e:
+                logger.error("Error loading embeddor %s: %s", spec, e)
+        return instances
@@ -1,14 +1,32 @@
 import os
+import logging
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional, Tuple
 
 from pypdf import PdfReader # The library we just installed
 from .base_embeddor import BaseFileEmbeddor
+from .. import config
+
+logger = logging.getLogger(__name__)
 
 class PDFEmbeddor(BaseFileEmbeddor):
     """
     A concrete implementation for handling PDF files.
+
+    Each document is parsed once. Page text is extracted lazily and streamed
+    into the chunker, and extraction stops early (keeping what it has) once a
+    page, text-size or time budget is used up.
     """
+    SUPPORTED_EXTENSIONS = {'.pdf'}
+
+    def __init__(self):
+        # Budgets per file for ingest. None disables a limit.
+        self.max_pages: Optional[int] = getattr(config, "PDF_MAX_PAGES", 1000)
+        self.max_bytes: Optional[int] = getattr(config, "PDF_MAX_TEXT_BYTES", 20 * 1024 * 1024)
+        self.max_seconds: Optional[float] = getattr(config, "PDF_MAX_SECONDS", 120.0)
+        # Pages extracted when organizing a file; only the start of the text is used.
+        self.preview_pages: int = getattr(config, "ORGANIZE_PDF_MAX_PAGES", 3)
 
     def can_handle(self, file_path: str) -> bool:
         """
@@ -16,27 +34,60 @@ class PDFEmbeddor(BaseFileEmbeddor):
         """
         return file_path.lower().endswith('.pdf')
 
-    def extract_content(self, file_path: str) -> str:
+    def _iter_page_text(self, reader: PdfReader, file_path: str, max_pages: Optional[int] = None,
+                        max_bytes: Optional[int] = None, max_seconds: Optional[float] = None,
+                        report_limits: bool = True) -> Iterator[str]:
+        """
+        Yields the text of each page in order, stopping at the first budget that runs out.
+        Pages after the first are prefixed with a newline, as if the pages were joined.
+        """
+        start_time = time.monotonic()
+        total_bytes = 0
+        emitted = 0
+        for page_number, page in enumerate(reader.pages):
+            if max_pages is not None and page_number >= max_pages:
+                if report_limits:
+                    logger.info("Page limit reached for %s: using the first %d pages.", file_path, max_pages)
+                return
+            if max_seconds is not None and time.monotonic() - start_time > max_seconds:
+                logger.warning("Time limit reached for %s: using the first %d pages.", file_path, page_number)
+                return
+            try:
+                page_text = page.extract_text()
+            except Exception as e:
+                logger.warning("Error reading page %d of %s: %s", page_number + 1, file_path, e)
+                continue
+            if not page_text:
+                continue
+            if max_bytes is not None:
+                total_bytes += len(page_text.encode('utf-8'))
+                if total_bytes > max_bytes:
+                    logger.info("Text size limit reached for %s: using the first %d pages.", file_path, page_number)
+                    return
+            yield page_text if emitted == 0 else "\n" + page_text
+            emitted += 1
+
+    def extract_content(self, file_path: str, max_pages: Optional[int] = None) -> str:
         """
-        Extracts the text content from all pages of a PDF file.
+        Extracts the text content from the pages of a PDF file (all of them, or the first `max_pages`).
         """
         try:
             reader = PdfReader(file_path)
-            content = []
-            for page in reader.pages:
-                # Extract text from each page and add it to our list
-                page_text = page.extract_text()
-                if page_text:
-                    content.append(page_text)
-            # Join the content from all pages into a single string
-            return "\n".join(content)
+            # Join the content from the pages into a single string
+            return "".join(self._iter_page_text(reader, file_path, max_pages=max_pages, report_limits=False))
         except Exception as e:
-            print(f"Error reading PDF file {file_path}: {e}")
+            logger.error("Error reading PDF file %s: %s", file_path, e)
             return ""
 
-    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
+    def extract_preview(self, file_path: str) -> str:
         """
-        Extracts basic file system metadata and PDF-specific metadata.
+        Extracts only the first few pages, which is all the organize workflow needs.
+        """
+        return self.extract_content(file_path, max_pages=self.preview_pages)
+
+    def _metadata_from_reader(self, file_path: str, reader: Optional[PdfReader]) -> Dict[str, Any]:
+        """
+        Builds file system and PDF metadata, reusing an already opened reader.
         """
         metadata = {}
         try:
@@ -51,7 +102,8 @@ class PDFEmbeddor(BaseFileEmbeddor):
             })
 
             # Get PDF-specific metadata
-            reader = PdfReader(file_path)
+            if reader is None:
+                reader = PdfReader(file_path)
             if reader.metadata:
                 metadata.update({
                     "pdf_author": reader.metadata.author,
@@ -61,9 +113,39 @@ class PDFEmbeddor(BaseFileEmbeddor):
                 })
             return metadata
         except Exception as e:
-            print(f"Error extracting metadata for {file_path}: {e}")
+            logger.error("Error extracting metadata for %s: %s", file_path, e)
             # Return whatever metadata was successfully gathered before the error
             if "source" not in metadata:
                  metadata["source"] = file_path
             metadata["error"] = str(e)
-            return metadata
\ No newline at end of file
+            return metadata
+
+    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
+        """
+        Extracts basic file system metadata and PDF-specific metadata.
+        """
+        return self._metadata_from_reader(file_path, None)
+
+    def iter_chunks(self, file_path: str) -> Iterator[Tuple[str, Dict[str, Any], str]]:
+        """
+        Parses the PDF once, then streams its pages through the chunker within
+        the configured page, size and time budgets.
+        """
+        if not self.can_handle(file_path):
+            return
+
+        try:
+            reader = PdfReader(file_path)
+        except Exception as e:
+            logger.error("Error reading PDF file %s: %s", file_path, e)
+            return
+
+        base_metadata = self._metadata_from_reader(file_path, reader)
+        pages = self._iter_page_text(
+            reader, file_path,
+            max_pages=self.max_pages,
+            max_bytes=self.max_bytes,
+            max_seconds=self.max_seconds,
+        )
+        for i, chunk in enumerate(self._chunk_stream(pages)):
+            yield chunk, self._chunk_metadata(base_metadata, i, chunk), self._chunk_id(file_path, i, chunk)
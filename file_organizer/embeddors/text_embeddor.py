@@ -1,34 +1,88 @@
 import os
+import logging
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
 
 from .base_embeddor import BaseFileEmbeddor
+from .. import config
+
+logger = logging.getLogger(__name__)
 
 class TextFileEmbeddor(BaseFileEmbeddor):
     """
     A concrete implementation for handling plain text-based files.
+
+    Files are read incrementally in fixed-size blocks and streamed into the
+    chunker. Files larger than the size cap are sampled: only their head and
+    tail are read.
     """
-    
+    # A list of file extensions that can be treated as plain text.
+    SUPPORTED_EXTENSIONS = {'.txt', '.md', '.json', '.csv', '.py', '.js', '.html', '.css'}
+
+    # Size of each read (in characters).
+    READ_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self):
+        # Files larger than this (in bytes) are reduced to a head and tail sample of this total size.
+        self.max_file_bytes: int = getattr(config, "TEXT_MAX_FILE_BYTES", 64 * 1024 * 1024)
+        # Text read when organizing a file; only the start of the text is used.
+        self.preview_bytes: int = getattr(config, "ORGANIZE_TEXT_MAX_BYTES", 256 * 1024)
+
     def can_handle(self, file_path: str) -> bool:
         """
         Handles common text, code, and data file extensions.
         """
-        # A list of file extensions that can be treated as plain text.
-        text_extensions = {'.txt', '.md', '.json', '.csv', '.py', '.js', '.html', '.css'}
         # Check if the file's extension is in our list of text extensions.
         _, ext = os.path.splitext(file_path)
-        return ext.lower() in text_extensions
+        return ext.lower() in self.SUPPORTED_EXTENSIONS
 
-    def extract_content(self, file_path: str) -> str:
+    def _iter_text(self, file_path: str, max_bytes: Optional[int] = None) -> Iterator[str]:
         """
-        Reads the entire content of a text file into a string.
+        Yields the file's text block by block. If the file is larger than
+        `max_bytes`, yields only its first and last `max_bytes / 2` bytes.
         """
+        max_bytes = self.max_file_bytes if max_bytes is None else max_bytes
         try:
+            file_size = os.path.getsize(file_path)
             with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+                if file_size <= max_bytes:
+                    while True:
+                        block = f.read(self.READ_BLOCK_SIZE)
+                        if not block:
+                            return
+                        yield block
+
+                # --- Head/tail sampling for oversized files ---
+                half = max_bytes // 2
+                remaining = half
+                while remaining > 0:
+                    block = f.read(min(self.READ_BLOCK_SIZE, remaining))
+                    if not block:
+                        return
+                    remaining -= len(block)
+                    yield block
+
+            with open(file_path, 'rb') as f:
+                f.seek(max(0, file_size - half))
+                # The seek may land inside a multi-byte character; drop the partial bytes.
+                tail = f.read().decode('utf-8', errors='ignore')
+            yield "\n...\n"
+            for i in range(0, len(tail), self.READ_BLOCK_SIZE):
+                yield tail[i:i + self.READ_BLOCK_SIZE]
         except Exception as e:
-            print(f"Error reading text file {file_path}: {e}")
-            return ""
+            logger.error("Error reading text file %s: %s", file_path, e)
+
+    def extract_content(self, file_path: str) -> str:
+        """
+        Reads the content of a text file into a string (head and tail only for oversized files).
+        """
+        return "".join(self._iter_text(file_path))
+
+    def extract_preview(self, file_path: str) -> str:
+        """
+        Reads a head and tail sample of the file, which is all the organize workflow needs.
+        """
+        return "".join(self._iter_text(file_path, max_bytes=self.preview_bytes))
 
     def extract_metadata(self, file_path: str) -> Dict[str, Any]:
         """
@@ -39,7 +93,7 @@ class TextFileEmbeddor(BaseFileEmbeddor):
             stat = os.stat(file_path)
             # Get file extension
             _, ext = os.path.splitext(file_path)
-            
+
             return {
                 "source": file_path,
                 "file_size": stat.st_size,
@@ -48,5 +102,5 @@ class TextFileEmbeddor(BaseFileEmbeddor):
                 "file_type": ext.lower()
             }
         except Exception as e:
-            print(f"Error extracting metadata for {file_path}: {e}")
-            return {"source": file_path, "error": str(e)}
\ No newline at end of file
+            logger.error("Error extracting metadata for %s: %s", file_path, e)
+            return {"source": file_path, "error": str(e)}
@@ -1,5 +1,7 @@
 import os
-import shutil
+import logging
+
+logger = logging.getLogger(__name__)
 
 class FileManager:
     """
@@ -19,30 +21,20 @@ class FileManager:
         try:
             # exist_ok=True prevents an error if the directory already exists
             os.makedirs(path, exist_ok=True)
-            print(f"Ensured folder exists: {path}")
+            logger.info("Ensured folder exists: %s", path)
         except OSError as e:
-            print(f"Error creating folder {path}: {e}")
+            logger.error("Error creating folder %s: %s", path, e)
 
-    def move_file(self, src_path: str, dest_path: str):
+    def move_file(self, src_path: str, dest_path: str) -> bool:
         """
-        Safely moves a file, but ONLY if the destination folder already exists.
+        Safely moves a file, but ONLY if the destination folder already exists
+        and nothing is at the destination. The move is a journaled batch of one
+        (see `BulkMover`), so it can be undone like an executed plan.
+        Returns True if the file was moved.
         """
-        if not self.file_exists(src_path):
-            print(f"Error: Source file not found at {src_path}")
-            return
-
-        # --- UPDATED LOGIC ---
-        # Get the destination folder from the full destination path.
-        dest_folder = os.path.dirname(dest_path)
+        from .bulk_mover import BulkMover
 
-        # Check if the destination folder exists instead of creating it.
-        if not self.file_exists(dest_folder):
-            print(f"Error: Destination folder does not exist at '{dest_folder}'. Action aborted.")
-            return
-        # ---------------------
-
-        try:
-            shutil.move(src_path, dest_path)
-            print(f"Successfully moved '{src_path}' to '{dest_path}'")
-        except Exception as e:
-            print(f"Error moving file: {e}")
\ No newline at end of file
+        result = BulkMover().move_many([(src_path, dest_path)])[0]
+        if not result.moved:
+            logger.error("Could not move '%s': %s", src_path, result.error)
+        return result.moved
@@ -0,0 +1,323 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+def default_folder_index_path() -> str:
+    """
+    Returns the folder index location, next to the ChromaDB directory.
+    """
+    configured = getattr(config, "FOLDER_INDEX_PATH", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "folder_index.npz")
+
+
+@contextmanager
+def _file_lock(path: str):
+    """
+    Holds an exclusive lock on `path` (created if needed) across processes.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class FolderIndex:
+    """
+    A compact, derived index of folder centroids built from chunk embeddings.
+
+    Every folder is represented by up to `prototypes_per_folder` prototype
+    vectors, each stored as the running sum of the chunk embeddings assigned to
+    it plus a count. Classifying a file is then a single matrix-vector product
+    over all prototypes instead of a chunk-level nearest-neighbour search.
+
+    The index is updated incrementally as chunks are added and removed and is
+    persisted as a single .npz file. Several processes may update it (e.g., a
+    build and the watcher): each remembers its own changes since it loaded
+    the file, and `save` applies them to the file's current contents under a
+    lock, so no process overwrites another's updates.
+    """
+    def __init__(self, path: Optional[str] = None, prototypes_per_folder: Optional[int] = None,
+                 merge_threshold: Optional[float] = None):
+        """
+        Args:
+            path: Where the index is persisted.
+            prototypes_per_folder: Max prototypes per folder (1 = a single centroid).
+            merge_threshold: A vector starts a new prototype (while the folder has room)
+                when its cosine similarity to every existing one is below this.
+        """
+        self.path = path or default_folder_index_path()
+        self.prototypes_per_folder = max(1, prototypes_per_folder or getattr(config, "FOLDER_INDEX_PROTOTYPES", 1))
+        self.merge_threshold = merge_threshold if merge_threshold is not None else getattr(
+            config, "FOLDER_INDEX_MERGE_THRESHOLD", 0.75
+        )
+
+        self.sums = np.zeros((0, 0), dtype=np.float32)    # one row per prototype
+        self.counts = np.zeros(0, dtype=np.int64)          # chunks summed into each prototype
+        self.owners: List[str] = []                         # folder of each prototype
+        self._rows_by_folder: Dict[str, List[int]] = {}
+        self._normalized: Optional[np.ndarray] = None
+        # This process's changes since the last load or save, per prototype row.
+        self._delta_sums = np.zeros((0, 0), dtype=np.float32)
+        self._delta_counts = np.zeros(0, dtype=np.int64)
+        # Set by `clear`: the next save replaces the file instead of merging into it.
+        self._replace = False
+        self._saved_at = time.monotonic()
+        self.dirty = False
+        self.load()
+
+    # --- Persistence ---
+
+    def load(self):
+        """Loads the index from disk, if it exists, discarding unsaved changes."""
+        self._reset()
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.sums = data["sums"].astype(np.float32)
+                self.counts = data["counts"].astype(np.int64)
+                self.owners = [str(folder) for folder in data["owners"]]
+        except Exception as e:
+            logger.error("Error loading folder index %s: %s", self.path, e)
+            return
+        self._reset_deltas()
+        self._reindex()
+
+    def save(self):
+        """
+        Merges this process's changes into the index on disk (or replaces it
+        after `clear`), then compacts and atomically writes it.
+        """
+        with _file_lock(self.path + ".lock"):
+            if not self._replace:
+                self._merge_from_disk()
+            self._compact()
+            tmp_path = self.path + ".tmp.npz"
+            np.savez(tmp_path, sums=self.sums, counts=self.counts, owners=np.array(self.owners, dtype=str))
+            os.replace(tmp_path, self.path)
+        self._reset_deltas()
+        self._replace = False
+        self._saved_at = time.monotonic()
+        self.dirty = False
+
+    def save_if_due(self, interval: float):
+        """
+        Saves pending changes if the last save was more than `interval` seconds ago.
+        """
+        if self.dirty and time.monotonic() - self._saved_at >= interval:
+            self.save()
+
+    def clear(self):
+        """Removes every folder from the index."""
+        self._reset()
+        self._replace = True
+        self.dirty = True
+
+    def _reset(self):
+        self.sums = np.zeros((0, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.owners = []
+        self._reset_deltas()
+        self._reindex()
+
+    def _reset_deltas(self):
+        self._delta_sums = np.zeros_like(self.sums)
+        self._delta_counts = np.zeros_like(self.counts)
+
+    def _merge_from_disk(self):
+        """
+        Reloads the index from disk and re-applies this process's changes to it.
+        """
+        size = len(self.owners)
+        changed = np.flatnonzero((self._delta_counts[:size] != 0) | self._delta_sums[:size].any(axis=1))
+        deltas = [(self.owners[row], self._delta_sums[row].copy(), int(self._delta_counts[row])) for row in changed]
+        self.load()
+        for folder, delta_sum, delta_count in deltas:
+            rows = [row for row in self._rows_by_folder.get(folder, []) if self.counts[row] > 0]
+            if not rows:
+                if delta_count > 0:
+                    row = self._new_row(folder, delta_sum)
+                    self.counts[row] = delta_count
+                continue
+            if len(rows) == 1:
+                row = rows[0]
+            else:
+                # A net removal points away from the prototype it was taken from.
+                row, _ = self._nearest_row(rows, delta_sum if delta_count >= 0 else -delta_sum)
+            self.counts[row] += delta_count
+            if self.counts[row] <= 0:
+                self.counts[row] = 0
+                self.sums[row] = 0.0
+            else:
+                self.sums[row] += delta_sum
+
+    def _reindex(self):
+        self._rows_by_folder = {}
+        for row, folder in enumerate(self.owners):
+            self._rows_by_folder.setdefault(folder, []).append(row)
+        self._normalized = None
+
+    def _compact(self):
+        """Drops prototypes whose count has reached zero, and any spare capacity."""
+        size = len(self.owners)
+        keep = self.counts[:size] > 0
+        self.sums = self.sums[:size][keep]
+        self.counts = self.counts[:size][keep]
+        self.owners = [folder for folder, kept in zip(self.owners, keep) if kept]
+        self._reset_deltas()
+        self._reindex()
+
+    # --- Updates ---
+
+    @staticmethod
+    def folder_of(metadata: dict) -> Optional[str]:
+        source = metadata.get("source") if metadata else None
+        return os.path.dirname(source) if source else None
+
+    def _new_row(self, folder: str, vector: np.ndarray) -> int:
+        row = len(self.owners)
+        if self.sums.shape[1] == 0:
+            self.sums = np.zeros((0, vector.shape[0]), dtype=np.float32)
+            self._delta_sums = np.zeros_like(self.sums)
+        if row >= self.sums.shape[0]:
+            # Grow geometrically so adding many folders stays linear overall.
+            capacity = max(64, self.sums.shape[0] * 2)
+            sums = np.zeros((capacity, self.sums.shape[1]), dtype=np.float32)
+            sums[:row] = self.sums[:row]
+            counts = np.zeros(capacity, dtype=np.int64)
+            counts[:row] = self.counts[:row]
+            self.sums, self.counts = sums, counts
+            delta_sums = np.zeros_like(sums)
+            delta_sums[:row] = self._delta_sums[:row]
+            delta_counts = np.zeros_like(counts)
+            delta_counts[:row] = self._delta_counts[:row]
+            self._delta_sums, self._delta_counts = delta_sums, delta_counts
+        self.sums[row] = vector
+        self.counts[row] = 1
+        self.owners.append(folder)
+        self._rows_by_folder.setdefault(folder, []).append(row)
+        return row
+
+    def _nearest_row(self, rows: List[int], vector: np.ndarray) -> Tuple[int, float]:
+        prototypes = self.sums[rows]
+        norms = np.linalg.norm(prototypes, axis=1) * (np.linalg.norm(vector) or 1.0)
+        sims = prototypes @ vector / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(sims))
+        return rows[best], float(sims[best])
+
+    def _add_to_row(self, row: int, vector: np.ndarray) -> int:
+        self.sums[row] += vector
+        self.counts[row] += 1
+        return row
+
+    def add(self, embeddings: Sequence[Sequence[float]], metadatas: Sequence[dict]):
+        """
+        Adds chunk embeddings to the centroids of their source folders.
+        """
+        for vector, metadata in zip(np.asarray(embeddings, dtype=np.float32), metadatas):
+            folder = self.folder_of(metadata)
+            if folder is None:
+                continue
+            rows = [row for row in self._rows_by_folder.get(folder, []) if self.counts[row] > 0]
+            if not rows:
+                row = self._new_row(folder, vector)
+            elif self.prototypes_per_folder == 1:
+                row = self._add_to_row(rows[0], vector)
+            else:
+                row, similarity = self._nearest_row(rows, vector)
+                if similarity < self.merge_threshold and len(rows) < self.prototypes_per_folder:
+                    row = self._new_row(folder, vector)
+                else:
+                    self._add_to_row(row, vector)
+            self._delta_sums[row] += vector
+            self._delta_counts[row] += 1
+        self._normalized = None
+        self.dirty = True
+
+    def remove(self, embeddings: Sequence[Sequence[float]], metadatas: Sequence[dict]):
+        """
+        Subtracts chunk embeddings that are being deleted or replaced.
+        """
+        for vector, metadata in zip(np.asarray(embeddings, dtype=np.float32), metadatas):
+            folder = self.folder_of(metadata)
+            rows = [row for row in self._rows_by_folder.get(folder, []) if self.counts[row] > 0]
+            if not rows:
+                continue
+            row, _ = self._nearest_row(rows, vector) if len(rows) > 1 else (rows[0], 1.0)
+            self.counts[row] -= 1
+            if self.counts[row] <= 0:
+                self.counts[row] = 0
+                self.sums[row] = 0.0
+            else:
+                self.sums[row] -= vector
+            self._delta_sums[row] -= vector
+            self._delta_counts[row] -= 1
+        self._normalized = None
+        self.dirty = True
+
+    # --- Classification ---
+
+    def classify(self, query_embedding: Sequence[float], top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Ranks folders by cosine similarity between the query and their prototypes.
+
+        Returns:
+            Up to `top_k` (folder, score) pairs, best first. A folder's score is
+            the similarity of its closest prototype.
+        """
+        size = len(self.owners)
+        if size == 0:
+            return []
+        if self._normalized is None:
+            sums = self.sums[:size]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            self._normalized = sums / np.where(norms == 0, 1.0, norms)
+            # Empty prototypes must never win.
+            self._normalized[self.counts[:size] <= 0] = 0.0
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self._normalized @ query
+
+        ranked = []
+        seen = set()
+        for row in np.argsort(-scores):
+            if self.counts[row] <= 0:
+                continue
+            folder = self.owners[row]
+            if folder in seen:
+                continue
+            seen.add(folder)
+            ranked.append((folder, float(scores[row])))
+            if len(ranked) >= top_k:
+                break
+        return ranked
+
+    def folder_count(self) -> int:
+        return sum(1 for rows in self._rows_by_folder.values() if any(self.counts[row] > 0 for row in rows))
@@ -0,0 +1,195 @@
+"""
+Blue/green generations of the knowledge base.
+
+A generation is a directory under GENERATIONS_DIRECTORY that holds one complete
+knowledge base: the vector store, the manifest, the folder index and the
+deduplication index. The file CURRENT names the live generation. It is only
+ever replaced atomically, so readers see either the old or the new knowledge
+base and never a partial one. The embedding and decision caches are keyed by
+content, so all generations share them.
+
+`build_knowledge_base.py --fresh-build` builds a new generation while the live
+one keeps serving, then switches CURRENT over to it. The new generation's
+manifest is committed after every batch of files is stored, so it is also the
+checkpoint of completed files: an interrupted build of the same directories
+resumes from it.
+
+Until the first generation is built, the knowledge base lives at the
+individually configured paths (CHROMA_PERSIST_DIRECTORY, MANIFEST_PATH, ...).
+"""
+import os
+import json
+import time
+import shutil
+import logging
+from typing import List, Optional, Tuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+# Describes the generation being built: its name and the directories it covers.
+BUILD_FILE = "BUILDING.json"
+
+# Config paths that belong to a generation, and their names inside its directory.
+_GENERATION_PATHS = {
+    "CHROMA_PERSIST_DIRECTORY": "chromadb",
+    "VECTOR_STORE_DIRECTORY": "vectors",
+    "MANIFEST_PATH": "manifest.sqlite3",
+    "FOLDER_INDEX_PATH": "folder_index.npz",
+    "DEDUP_INDEX_PATH": "dedup_index.sqlite3",
+}
+# Their configured values, saved the first time a generation is used.
+_configured_paths: Optional[dict] = None
+
+
+def generations_directory() -> str:
+    """
+    Returns the directory that holds the generations, next to the ChromaDB directory by default.
+    """
+    configured = getattr(config, "GENERATIONS_DIRECTORY", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "generations")
+
+
+def generation_path(name: str) -> str:
+    return os.path.join(generations_directory(), name)
+
+
+def live_generation() -> Optional[str]:
+    """
+    Returns the name of the live generation, or None if the knowledge base is at the configured paths.
+    """
+    try:
+        with open(os.path.join(generations_directory(), CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def use_generation(name: Optional[str]):
+    """
+    Points the knowledge base paths in the config at a generation, or back at
+    the configured paths if `name` is None. Stores, manifests and indexes
+    opened afterwards use that generation.
+    """
+    global _configured_paths
+    if _configured_paths is None:
+        from .decision import default_decision_cache_path
+        from .embedding_cache import default_cache_directory
+        from .bulk_mover import default_journal_directory
+        # The caches, the move journals and the generations themselves stay where
+        # they are; their defaults are relative to the ChromaDB directory.
+        config.GENERATIONS_DIRECTORY = generations_directory()
+        config.MOVE_JOURNAL_DIRECTORY = default_journal_directory()
+        config.EMBEDDING_CACHE_DIRECTORY = default_cache_directory()
+        config.DECISION_CACHE_PATH = default_decision_cache_path()
+        _configured_paths = {attr: getattr(config, attr, None) for attr in _GENERATION_PATHS}
+    if name is None:
+        for attr, value in _configured_paths.items():
+            setattr(config, attr, value)
+        return
+    directory = generation_path(name)
+    for attr, file_name in _GENERATION_PATHS.items():
+        setattr(config, attr, os.path.join(directory, file_name))
+
+
+def apply_live_generation() -> Optional[str]:
+    """
+    Points the config at the live generation (if there is one) and returns its name.
+    """
+    name = live_generation()
+    if name is not None or _configured_paths is not None:
+        use_generation(name)
+    return name
+
+
+def start_build(directories: List[str], resume: bool = True) -> Tuple[str, bool]:
+    """
+    Starts building a new generation of the given directories, or resumes the
+    interrupted build of the same directories. An interrupted build of other
+    directories (or any, if `resume` is False) is discarded.
+
+    Returns:
+        (the generation's name, whether an interrupted build is resumed).
+    """
+    root = generations_directory()
+    os.makedirs(root, exist_ok=True)
+    directories = sorted(os.path.abspath(d) for d in directories)
+    state = _read_build_state()
+    if state is not None:
+        same = state.get("directories") == directories and os.path.isdir(generation_path(state["generation"]))
+        if resume and same:
+            state["attempts"] = state.get("attempts", 1) + 1
+            _write_atomic(os.path.join(root, BUILD_FILE), json.dumps(state, indent=2))
+            return state["generation"], True
+        logger.info("Discarding the unfinished build of generation %s", state["generation"])
+        shutil.rmtree(generation_path(state["generation"]), ignore_errors=True)
+
+    name = time.strftime("%Y%m%d-%H%M%S")
+    suffix = 1
+    while os.path.exists(generation_path(name)) or name == live_generation():
+        suffix += 1
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+    os.makedirs(generation_path(name))
+    state = {"generation": name, "directories": directories, "started_at": time.time(), "attempts": 1}
+    _write_atomic(os.path.join(root, BUILD_FILE), json.dumps(state, indent=2))
+    return name, False
+
+
+def finish_build(name: str, keep: Optional[int] = None) -> Optional[str]:
+    """
+    Makes a completed generation the live one and deletes all but the `keep`
+    (default GENERATIONS_KEEP) most recent earlier generations, so processes
+    still reading the previous one can finish their work.
+
+    Returns:
+        The name of the previous live generation (None if it was at the configured paths).
+    """
+    root = generations_directory()
+    previous = live_generation()
+    _write_atomic(os.path.join(root, CURRENT_FILE), name + "\n")
+    try:
+        os.remove(os.path.join(root, BUILD_FILE))
+    except FileNotFoundError:
+        pass
+    logger.info("Generation %s is live (was %s)", name, previous or "the configured paths")
+
+    keep = max(0, getattr(config, "GENERATIONS_KEEP", 1) if keep is None else keep)
+    older = sorted(
+        (entry for entry in os.listdir(root) if entry != name and os.path.isdir(os.path.join(root, entry))),
+        reverse=True,
+    )
+    for entry in older[keep:]:
+        logger.info("Deleting generation %s", entry)
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    return previous
+
+
+def _read_build_state() -> Optional[dict]:
+    try:
+        with open(os.path.join(generations_directory(), BUILD_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_atomic(path: str, text: str):
+    """
+    Replaces a file's contents so that readers see either the old or the new file, even after a crash.
+    """
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if hasattr(os, "O_DIRECTORY"):
+        descriptor = os.open(os.path.dirname(path), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
@@ -0,0 +1,472 @@
+import os
+import queue
+import pickle
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, Optional, Dict, Any, List, Sequence, Set
+
+from . import config
+from .embeddors.embeddor_registry import EmbeddorRegistry
+from .manifest import FileManifest, hash_file
+from .dedup import DedupIndex, MinHasher, dedup_enabled
+from .metrics import METRICS, span, increment
+from .scanner import DirectoryScanner, ScannedFile
+
+logger = logging.getLogger(__name__)
+
+# Each worker process builds its own registry (and MinHasher) once, in the pool initializer.
+_worker_registry: Optional[EmbeddorRegistry] = None
+_worker_hasher: Optional[MinHasher] = None
+# Worker processes send their metrics back with each result.
+_send_metrics = False
+
+
+def _config_settings() -> Dict[str, Any]:
+    """
+    Returns the config's settings, including changes made at runtime, for worker processes.
+    """
+    settings = {}
+    for name, value in vars(config).items():
+        if not name.isupper():
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        settings[name] = value
+    return settings
+
+
+def _init_worker(send_metrics: bool = False, settings: Optional[Dict[str, Any]] = None):
+    """
+    Pool initializer: applies the parent's config settings and creates the
+    embeddor registry used by this worker process.
+    """
+    global _worker_registry, _worker_hasher, _send_metrics
+    for name, value in (settings or {}).items():
+        setattr(config, name, value)
+    _worker_registry = EmbeddorRegistry()
+    _worker_hasher = MinHasher() if dedup_enabled() else None
+    _send_metrics = send_metrics
+
+
+def _prepare_file(file_path: str) -> Dict[str, Any]:
+    """
+    Runs in a worker process: hashes, extracts and chunks a single file.
+    """
+    if _worker_registry is None:
+        _init_worker()
+    try:
+        stat = os.stat(file_path)
+        with span("hash"):
+            content_hash = hash_file(file_path)
+        embeddor = _worker_registry.get_embeddor_for_file(file_path)
+        if embeddor is None:
+            result = {"path": file_path, "error": "no suitable embeddor"}
+        else:
+            documents, metadatas, ids = embeddor.prepare_for_embedding(file_path)
+            result = {
+                "path": file_path,
+                "stat": stat,
+                "content_hash": content_hash,
+                "documents": documents,
+                "metadatas": metadatas,
+                "ids": ids,
+            }
+            if _worker_hasher is not None:
+                # Signatures for near-duplicate detection are computed here, in parallel.
+                with span("minhash"):
+                    result["signatures"] = _worker_hasher.signatures(documents)
+    except Exception as e:
+        result = {"path": file_path, "error": str(e)}
+    if _send_metrics:
+        result["metrics"] = METRICS.drain()
+    return result
+
+
+def new_build_stats() -> dict:
+    """
+    Returns a fresh set of counters describing what a build did with each file.
+    """
+    return {"added": 0, "updated": 0, "relocated": 0, "skipped": 0, "removed": 0, "failed": 0}
+
+
+class IngestPipeline:
+    """
+    A staged ingest pipeline for building the knowledge base.
+
+    Stage 1 (main thread) scans the directories (see `DirectoryScanner`) and
+    filters out files the manifest says are unchanged. Stage 2 (a process pool) runs
+    `prepare_for_embedding` on the remaining files. Stage 3 (a single writer
+    thread) accumulates the chunks of many files into large batches and is the
+    only code that writes to the vector store and the manifest.
+
+    The number of files in flight and the number of finished files waiting for
+    the writer are both capped at `queue_depth`, so memory stays flat no matter
+    how large the directory tree is.
+    """
+    _SENTINEL = None
+    # How often the writer saves the folder index, so a killed build loses little of it.
+    _FOLDER_INDEX_SAVE_SECONDS = 30.0
+
+    def __init__(self, rag_system, registry: EmbeddorRegistry, manifest: FileManifest,
+                 workers: Optional[int] = None, queue_depth: int = 64, batch_size: int = 512,
+                 dedup: Optional[DedupIndex] = None, scanner: Optional[DirectoryScanner] = None):
+        """
+        Args:
+            rag_system: The RAGSystem to write chunks into.
+            registry: Used in the main process to decide which files are supported.
+            manifest: The manifest used to skip unchanged files.
+            workers: Number of extraction processes. 0 runs extraction inline.
+            queue_depth: Max files in flight and max finished files awaiting the writer.
+            batch_size: Number of chunks to accumulate before each upsert.
+            dedup: The duplicate chunk index; one is opened if DEDUP_ENABLED is set.
+            scanner: Finds the files under the directories; by default one that
+                only yields files with an extension the registry supports.
+        """
+        self.rag_system = rag_system
+        self.registry = registry
+        self.manifest = manifest
+        self.dedup = dedup if dedup is not None else (DedupIndex() if dedup_enabled() else None)
+        if self.dedup is not None and len(self.dedup) and rag_system.store.count() == 0:
+            # The store was deleted or rebuilt; the index describes chunks that are gone.
+            self.dedup.clear()
+        # A knowledge base built before file-level vectors existed gets them on its next build.
+        self._index_all_files = rag_system.file_store.count() == 0 and rag_system.store.count() > 0
+        self.scanner = scanner or DirectoryScanner(extensions=registry.supported_extensions())
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.queue_depth = max(1, queue_depth)
+        self.batch_size = max(1, batch_size)
+        self.stats = new_build_stats()
+        self._stats_lock = threading.Lock()
+
+        self._results: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=self.queue_depth)
+        self._batch: List[Dict[str, Any]] = []
+        self._batch_chunks = 0
+        self._writer_error: Optional[BaseException] = None
+
+    def _count(self, key: str):
+        """Increments a build counter; the producer and writer threads both count."""
+        with self._stats_lock:
+            self.stats[key] += 1
+        increment(f"ingest.{key}")
+
+    # --- Stage 1: discovery ---
+
+    def _filter_changed(self, files: Iterable[ScannedFile]) -> Iterator[str]:
+        """
+        Yields the supported files that the manifest doesn't know unchanged.
+        Files without a stat (None) are stat'ed here.
+        """
+        for file_path, stat in files:
+            if not self.registry.get_embeddor_for_file(file_path):
+                continue
+            if stat is None:
+                try:
+                    stat = os.stat(file_path)
+                except OSError as e:
+                    logger.warning("Could not stat %s: %s", file_path, e)
+                    self._count("failed")
+                    continue
+            if self.manifest.is_unchanged(file_path, stat):
+                self._count("skipped")
+                continue
+            yield file_path
+
+    # --- Stage 2: extraction ---
+
+    def _dispatch(self, file_paths: Iterable[str]):
+        """
+        Feeds files through the worker pool, keeping at most `queue_depth` in flight.
+        """
+        if self.workers < 1:
+            for file_path in file_paths:
+                self._put(_prepare_file(file_path))
+            return
+
+        # Spawned, not forked: the parent has loaded the embedding model and
+        # ChromaDB and runs the writer thread, whose locks a fork would copy.
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(True, _config_settings()),
+        )
+        with pool:
+            pending: set[Future] = set()
+            for file_path in file_paths:
+                pending.add(pool.submit(_prepare_file, file_path))
+                if len(pending) >= self.queue_depth:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._put(future.result())
+            for future in pending:
+                self._put(future.result())
+
+    def _put(self, result: Dict[str, Any]):
+        """
+        Hands a finished file to the writer, blocking while the writer is behind.
+        """
+        if self._writer_error is not None:
+            raise RuntimeError("Ingest writer failed") from self._writer_error
+        self._results.put(result)
+
+    # --- Stage 3: accumulation and writing ---
+
+    def _writer_loop(self):
+        """
+        Single writer: accumulates results into cross-file batches and upserts them.
+        """
+        finished = False
+        try:
+            while True:
+                result = self._results.get()
+                if result is self._SENTINEL:
+                    finished = True
+                    break
+                self._accept(result)
+            self._flush()
+        except BaseException as e:
+            self._writer_error = e
+            # Keep draining so the producer never blocks on a full queue.
+            while not finished:
+                finished = self._results.get() is self._SENTINEL
+
+    def _accept(self, result: Dict[str, Any]):
+        """
+        Classifies a finished file and adds its chunks to the current batch.
+        """
+        file_path = result["path"]
+        if "metrics" in result:
+            METRICS.merge(result.pop("metrics"))
+        if "error" in result:
+            logger.warning("Failed: %s (%s)", file_path, result["error"])
+            self._count("failed")
+            return
+
+        entry = self.manifest.get(file_path)
+        if entry and entry["content_hash"] == result["content_hash"]:
+            # Touched but not modified; just refresh the stat fields.
+            self.manifest.record(file_path, result["stat"], result["content_hash"], entry["chunk_ids"])
+            self._count("skipped")
+            return
+
+        if entry is None and self._relocate_moved(file_path, result):
+            return
+
+        logger.info("Processing: %s", file_path)
+        result["previous_ids"] = entry["chunk_ids"] if entry else None
+        # Deduplication drops chunks that are stored already; keep a metadata for the file's vector.
+        result["file_metadata"] = result["metadatas"][0] if result["metadatas"] else None
+        self._deduplicate(result)
+        self._batch.append(result)
+        self._batch_chunks += len(result["documents"])
+        if self._batch_chunks >= self.batch_size:
+            self._flush()
+
+    def _deduplicate(self, result: Dict[str, Any]):
+        """
+        Sets the chunk ids the file references (`chunk_ids`) and keeps only the
+        chunks that aren't stored yet in `documents`/`metadatas`/`ids`.
+        """
+        if self.dedup is None:
+            result["chunk_ids"] = list(result["ids"])
+            return
+        signatures = result.pop("signatures", None) or [None] * len(result["ids"])
+        chunk_ids, documents, metadatas, ids = [], [], [], []
+        for document, metadata, chunk_id, signature in zip(result["documents"], result["metadatas"],
+                                                           result["ids"], signatures):
+            referenced_id, kind = self.dedup.resolve(chunk_id, signature)
+            increment(f"dedup.{kind}")
+            chunk_ids.append(referenced_id)
+            if kind == "new":
+                documents.append(document)
+                metadatas.append(metadata)
+                ids.append(chunk_id)
+        result.update(chunk_ids=chunk_ids, documents=documents, metadatas=metadatas, ids=ids)
+
+    def _relocate_moved(self, file_path: str, result: Dict[str, Any]) -> bool:
+        """
+        Detects a file that was moved (a recorded file with the same content no
+        longer exists at its old path) and relocates its chunks instead of
+        ingesting them again.
+
+        Returns:
+            True if the file was relocated.
+        """
+        for old_path in self.manifest.paths_with_hash(result["content_hash"]):
+            if old_path == file_path or os.path.exists(old_path):
+                continue
+            # Pending upserts may carry the old path's metadata, so write them first.
+            self._flush()
+            self.rag_system.relocate_source(old_path, file_path, manifest=self.manifest)
+            chunk_ids = self.manifest.get(file_path)["chunk_ids"]
+            self.manifest.record(file_path, result["stat"], result["content_hash"], chunk_ids)
+            self._count("relocated")
+            logger.info("Relocated: %s -> %s", old_path, file_path)
+            return True
+        return False
+
+    def _flush(self):
+        """
+        Upserts the accumulated batch and its files' file-level vectors, then
+        updates the manifest for every file in it. Files with a chunk that
+        could not be stored are counted as failed and left out of the
+        manifest, so the next build retries them.
+        """
+        if not self._batch:
+            return
+
+        documents, metadatas, ids = [], [], []
+        for result in self._batch:
+            documents.extend(result["documents"])
+            metadatas.extend(result["metadatas"])
+            ids.extend(result["ids"])
+        failed_ids = set(self.rag_system.ingest_documents(documents, metadatas, ids)) if documents else set()
+        if failed_ids and self.dedup is not None:
+            # `resolve` indexed these chunks as stored; later files must not reference them.
+            self.dedup.remove(list(failed_ids))
+
+        stored = []
+        for result in self._batch:
+            # A file may also reference a chunk that another file of the batch failed to store.
+            if failed_ids.intersection(result["chunk_ids"]):
+                logger.warning("Failed: %s (its chunks could not be stored)", result["path"])
+                self._count("failed")
+            else:
+                stored.append(result)
+        self.rag_system.index_files(
+            (result["path"], result["chunk_ids"], result["file_metadata"]) for result in stored
+        )
+
+        for result in stored:
+            previous_ids = result["previous_ids"]
+            self.manifest.record(result["path"], result["stat"], result["content_hash"], result["chunk_ids"])
+            self._count("updated" if previous_ids is not None else "added")
+        # Several files may share a chunk; each file's stale chunks are released separately.
+        for result in stored:
+            if result["previous_ids"]:
+                new_ids = set(result["chunk_ids"])
+                self._release_chunks(result["path"], [i for i in result["previous_ids"] if i not in new_ids])
+
+        # Saved every so often, before the manifest commits: a killed build loses at most the last interval's centroids.
+        self.rag_system.save_folder_index(self._FOLDER_INDEX_SAVE_SECONDS)
+        self.manifest.commit()
+        if self.dedup is not None:
+            self.dedup.commit()
+        self._batch = []
+        self._batch_chunks = 0
+
+    # --- Cleanup ---
+
+    def _release_chunks(self, file_path: str, chunk_ids: List[str]):
+        """
+        Releases chunks a file no longer references (its manifest entry must
+        already be updated). Chunk ids are content-addressed, so other files
+        may share them: only chunks no file references are deleted, and shared
+        chunks stored under this file's path are pointed at a file that still
+        has them.
+        """
+        if not chunk_ids:
+            return
+        referrers = self.manifest.referrers(chunk_ids)
+        unreferenced = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id not in referrers]
+        if unreferenced:
+            self.rag_system.delete_documents(unreferenced)
+            if self.dedup is not None:
+                self.dedup.remove(unreferenced)
+        by_referrer: Dict[str, List[str]] = {}
+        for chunk_id, path in referrers.items():
+            if path != file_path:
+                by_referrer.setdefault(path, []).append(chunk_id)
+        for path, ids in by_referrer.items():
+            self.rag_system.relocate_source(file_path, path, ids=ids)
+
+    def _remove_unlisted(self, directory_path: str, listed: Set[str], failed_directories: Sequence[str] = ()):
+        """
+        Removes the chunks of manifest files under a directory that the scan
+        didn't list, if they no longer exist or the scanner's rules now
+        exclude them (ignore files, excluded or hidden directories, size and
+        depth limits). Files under directories the scan failed to list, and
+        files it skipped for any other reason (e.g., a failed stat), are kept.
+        """
+        failed = [os.path.join(directory, "") for directory in failed_directories]
+        unlisted = [
+            file_path for file_path in self.manifest.paths_under(directory_path)
+            if file_path not in listed and not any(file_path.startswith(prefix) for prefix in failed)
+        ]
+        existing = {file_path for file_path in unlisted if os.path.exists(file_path)}
+        excluded = self.scanner.exclusion_rules(existing, directory_path)
+        for file_path in unlisted:
+            if file_path in excluded:
+                reason = f"excluded: {excluded[file_path]}"
+            elif file_path in existing:
+                logger.warning("Keeping %s: the scan skipped it, but no rule excludes it", file_path)
+                continue
+            else:
+                reason = "deleted"
+            entry = self.manifest.get(file_path)
+            self.manifest.remove(file_path)
+            self.rag_system.remove_files([file_path])
+            if entry and entry["chunk_ids"]:
+                self._release_chunks(file_path, entry["chunk_ids"])
+            self._count("removed")
+            logger.info("Removed: %s (%s)", file_path, reason)
+        self.manifest.commit()
+        if self.dedup is not None:
+            self.dedup.commit()
+
+    def run(self, directories: Iterable[str]) -> dict:
+        """
+        Ingests every new or changed file under the given directories, and
+        removes the files under them that the scan no longer lists.
+
+        Returns:
+            The build statistics (added, updated, relocated, skipped, removed, failed).
+        """
+        directories = [os.path.abspath(d) for d in directories]
+        for directory in directories:
+            logger.info("Scanning directory: %s", directory)
+        listed: Set[str] = set()
+
+        def record_listed(files: Iterable[ScannedFile]) -> Iterator[ScannedFile]:
+            for scanned in files:
+                listed.add(scanned.path)
+                yield scanned
+
+        self._run_candidates(self._filter_changed(record_listed(self.scanner.scan(directories))))
+        # The scanner logs and skips what it can't read; nothing under those directories is removed.
+        failed_directories = self.scanner.stats.failed_directories
+        for directory in failed_directories:
+            logger.warning("Keeping the indexed files under %s, which could not be scanned", directory)
+        for directory in directories:
+            self._remove_unlisted(directory, listed, failed_directories)
+        return self.stats
+
+    def run_files(self, file_paths: Iterable[str]) -> dict:
+        """
+        Ingests specific files (e.g., files that were just moved into the
+        knowledge base) without walking their directories.
+
+        Returns:
+            The build statistics.
+        """
+        self._run_candidates(self._filter_changed(ScannedFile(os.path.abspath(p), None) for p in file_paths))
+        return self.stats
+
+    def _run_candidates(self, candidates: Iterator[str]):
+        """
+        Runs the extraction and writer stages over the given candidate files.
+        """
+        if self._index_all_files:
+            self.rag_system.rebuild_file_index(self.manifest)
+            self._index_all_files = False
+        writer = threading.Thread(target=self._writer_loop, name="ingest-writer", daemon=True)
+        writer.start()
+        try:
+            self._dispatch(candidates)
+        finally:
+            self._results.put(self._SENTINEL)
+            writer.join()
+        if self._writer_error is not None:
+            raise RuntimeError("Ingest writer failed") from self._writer_error
@@ -1,5 +1,108 @@
+import os
+import random
+import asyncio
+import logging
+from typing import List, Tuple, Dict, Optional
+
 import ollama
 from . import config
+from .metrics import span, increment
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates how many tokens a text takes (about four characters per token for English).
+    """
+    return (len(text) + 3) // 4
+
+
+def _snippet(text: str, max_chars: int) -> str:
+    """
+    Collapses whitespace and shortens a text to at most `max_chars` characters at a word boundary.
+    """
+    text = " ".join(text.split()).replace('"', "'")
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + "..."
+    return text
+
+
+def build_context(rag_context: dict, token_budget: int = 600, snippet_chars: int = 160) -> str:
+    """
+    Renders retrieval results for the prompt within a token budget.
+
+    Results are collapsed by folder: each folder is listed once, closest first,
+    with the names of its matching files and a short snippet of its closest
+    chunk. The folder index's candidate folders that are not listed yet follow.
+    Entries are added until the budget is spent (the closest folder is always
+    included).
+    """
+    documents = (rag_context.get('documents') or [[]])[0] or []
+    metadatas = (rag_context.get('metadatas') or [[]])[0] or []
+    distances = (rag_context.get('distances') or [[]])[0] or []
+
+    folders: Dict[str, dict] = {}
+    for doc, meta, distance in zip(documents, metadatas, distances):
+        meta = meta or {}
+        # A chunk shared by several files (see `RAGSystem._expand_sources`) counts for each of them.
+        for source in meta.get('sources') or [meta.get('source', 'Unknown location')]:
+            folder = os.path.dirname(source)
+            group = folders.get(folder)
+            if group is None or distance < group['distance']:
+                files = group['files'] if group else []
+                group = folders[folder] = {'distance': distance, 'doc': doc, 'files': files}
+            name = os.path.basename(source)
+            if name not in group['files']:
+                group['files'].append(name)
+
+    entries = []
+    for folder, group in sorted(folders.items(), key=lambda item: item[1]['distance']):
+        files = ", ".join(group['files'][:3])
+        if len(group['files']) > 3:
+            files += f" and {len(group['files']) - 3} more"
+        entries.append(
+            f'- Folder: "{folder}" (distance: {group["distance"]:.4f}; similar files: {files})\n'
+            f'  Snippet: "{_snippet(group["doc"], snippet_chars)}"'
+        )
+    candidate_folders = (rag_context.get('candidate_folders') or [[]])[0] or []
+    candidates = [
+        f'- "{folder}" (similarity: {score:.4f})' for folder, score in candidate_folders if folder not in folders
+    ]
+
+    lines, used = [], 0
+    for entry in entries:
+        cost = estimate_tokens(entry)
+        if lines and used + cost > token_budget:
+            break
+        lines.append(entry)
+        used += cost
+    context_str = "\n".join(lines)
+
+    heading = "\n\nOther candidate folders ranked by similarity to existing content:"
+    listed = []
+    used += estimate_tokens(heading)
+    for candidate in candidates:
+        cost = estimate_tokens(candidate)
+        if used + cost > token_budget:
+            break
+        listed.append(candidate)
+        used += cost
+    if listed:
+        context_str += heading + "\n" + "\n".join(listed)
+    return context_str
+
+
+def first_line(text: str) -> Optional[str]:
+    """
+    Returns the first non-empty line of a response once it is complete
+    (followed by a newline), or None while it may still be growing.
+    """
+    text = text.lstrip()
+    if "\n" not in text:
+        return None
+    return text.split("\n", 1)[0].strip()
+
 
 class LLMAgent:
     """
@@ -11,46 +114,74 @@ class LLMAgent:
         """
         self.client = ollama.Client(host=config.OLLAMA_HOST)
         self.model = config.OLLAMA_MODEL
-        print(f"LLM Agent initialized to use model '{self.model}' at {config.OLLAMA_HOST}")
-    
-    def decide_action(self, file_info: dict, rag_context: dict):
+        # The answer is a single path, so the context is kept short and generation is bounded.
+        self.context_token_budget = getattr(config, "PROMPT_CONTEXT_TOKEN_BUDGET", 600)
+        self.snippet_chars = getattr(config, "PROMPT_SNIPPET_CHARS", 160)
+        self.options = {"num_predict": getattr(config, "LLM_NUM_PREDICT", 128)}
+        stop = getattr(config, "LLM_STOP", ["\n"])
+        if stop:
+            self.options["stop"] = list(stop)
+        self.stream = getattr(config, "LLM_STREAM", True)
+        # Keeps the model loaded between requests (e.g., "30m"; -1 keeps it loaded indefinitely).
+        self.keep_alive = getattr(config, "OLLAMA_KEEP_ALIVE", "30m")
+        logger.info("LLM Agent initialized to use model '%s' at %s", self.model, config.OLLAMA_HOST)
+
+    def _chat_arguments(self, prompt: str) -> dict:
+        return {
+            "model": self.model,
+            "messages": [{'role': 'user', 'content': prompt}],
+            "options": self.options,
+            "keep_alive": self.keep_alive,
+        }
+
+    def decide_action(self, file_info: dict, rag_context: dict) -> Optional[str]:
         """
-        Leverages the LLM to decide on a file organization action. 
+        Leverages the LLM to decide on a file organization action.
+
+        Returns:
+            The first line of the LLM's answer, or None if the request failed.
         """
         prompt = self._build_prompt(file_info, rag_context)
-        print("\n--- Sending the Following Prompt to LLM ---")
-        print(prompt)
-        print("--------------------------")
+        logger.debug("Sending the following prompt to the LLM:\n%s", prompt)
 
+        increment("llm.requests")
         try:
-            response = self.client.chat(
-                model=self.model,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
-            # The agent's response is parsed to extract the command 
-            return response['message']['content']
+            with span("llm_call"):
+                if not self.stream:
+                    response = self.client.chat(**self._chat_arguments(prompt))
+                    return first_line(response['message']['content'] + "\n") or ""
+                # Stream the answer and hang up as soon as its first line is complete.
+                parts = self.client.chat(stream=True, **self._chat_arguments(prompt))
+                content = ""
+                try:
+                    for part in parts:
+                        content += part['message']['content']
+                        line = first_line(content)
+                        if line is not None:
+                            increment("llm.early_stops")
+                            return line
+                finally:
+                    parts.close()
+                return content.strip()
         except Exception as e:
-            return f"Error communicating with Ollama: {e}"
+            increment("llm.errors")
+            logger.warning("Error communicating with Ollama: %s", e)
+            return None
 
     def _build_prompt(self, file_info: dict, rag_context: dict) -> str:
         """
         Constructs the prompt for the LLM with file info and RAG context. 
         """
-        # Access the documents, metadata, and distances.
-        retrieved_docs = rag_context['documents'][0]
-        retrieved_metadatas = rag_context['metadatas'][0]
-        retrieved_distances = rag_context['distances'][0]
+        with span("prompt_build"):
+            return self._format_prompt(file_info, rag_context)
 
-        # Create a more informative bullet point for each result.
-        bullet_points = []
-        for doc, meta, dist in zip(retrieved_docs, retrieved_metadatas, retrieved_distances):
-            # Safely get the source path from the metadata.
-            source_path = meta.get('source', 'Unknown location')
-            # Add the distance score, formatted to 4 decimal places, to the prompt.
-            bullet_points.append(f'- Content: "{doc}"\n  (from file: "{source_path}", distance: {dist:.4f})')
+    def _format_prompt(self, file_info: dict, rag_context: dict) -> str:
+        """
+        Fills in the prompt template.
+        """
+        # Collapse the retrieved results by folder, within the context's token budget.
+        context_str = build_context(rag_context, self.context_token_budget, self.snippet_chars)
 
-        context_str = "\n\n".join(bullet_points) # Use double newlines to separate entries
-        
         # Load the prompt template from the config file.
         prompt_template = config.AGENT_PROMPT_TEMPLATE
         
@@ -62,6 +193,108 @@ class LLMAgent:
         )
         return prompt
 
+class AsyncLLMAgent(LLMAgent):
+    """
+    An LLM agent that sends many prompts concurrently using Ollama's async client.
+
+    At most `max_concurrency` requests are in flight at once. Each request has a
+    timeout and is retried with exponential backoff. Identical prompts that are
+    in flight at the same time are sent only once.
+    """
+    def __init__(self, max_concurrency: int = None, timeout: float = None, max_retries: int = None,
+                 retry_backoff: float = None):
+        super().__init__()
+        self.max_concurrency = max(1, max_concurrency or getattr(config, "OLLAMA_MAX_CONCURRENCY", 4))
+        self.timeout = timeout if timeout is not None else getattr(config, "OLLAMA_REQUEST_TIMEOUT", 120.0)
+        self.max_retries = max_retries if max_retries is not None else getattr(config, "OLLAMA_MAX_RETRIES", 2)
+        self.retry_backoff = retry_backoff if retry_backoff is not None else getattr(config, "OLLAMA_RETRY_BACKOFF", 1.0)
+
+    def decide_many(self, requests: List[Tuple[dict, dict]]) -> List[Optional[str]]:
+        """
+        Decides on many files at once. Blocks until every decision is made.
+
+        Args:
+            requests: (file_info, rag_context) pairs, as passed to `decide_action`.
+
+        Returns:
+            The LLM's responses, in the same order as `requests` (None where a request failed).
+        """
+        if not requests:
+            return []
+        return asyncio.run(self.decide_many_async(requests))
+
+    async def decide_many_async(self, requests: List[Tuple[dict, dict]]) -> List[Optional[str]]:
+        """
+        The coroutine behind `decide_many`, for callers that already run an event loop.
+        """
+        prompts = [self._build_prompt(file_info, rag_context) for file_info, rag_context in requests]
+        logger.info("Sending %d prompt(s) to the LLM (%d unique, up to %d at a time)",
+                    len(prompts), len(set(prompts)), self.max_concurrency)
+        if logger.isEnabledFor(logging.DEBUG):
+            for prompt in dict.fromkeys(prompts):
+                logger.debug("Sending the following prompt to the LLM:\n%s", prompt)
+        increment("llm.coalesced", len(prompts) - len(set(prompts)))
+
+        # The async client is bound to the running event loop, so create one per call.
+        client = ollama.AsyncClient(host=config.OLLAMA_HOST)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        in_flight: Dict[str, asyncio.Task] = {}
+
+        def request_for(prompt: str) -> asyncio.Task:
+            # Coalesce identical prompts into a single request.
+            if prompt not in in_flight:
+                in_flight[prompt] = asyncio.ensure_future(self._chat_with_retries(client, semaphore, prompt))
+            return in_flight[prompt]
+
+        return list(await asyncio.gather(*(request_for(prompt) for prompt in prompts)))
+
+    async def _chat_with_retries(self, client: ollama.AsyncClient, semaphore: asyncio.Semaphore, prompt: str) -> Optional[str]:
+        """
+        Sends one prompt, retrying timeouts and transient errors with exponential backoff.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    increment("llm.requests")
+                    with span("llm_call"):
+                        return await asyncio.wait_for(self._chat_once(client, prompt), timeout=self.timeout)
+            except Exception as e:
+                # Client errors (e.g., an unknown model) will not succeed on a retry.
+                permanent = isinstance(e, ollama.ResponseError) and 400 <= e.status_code < 500
+                if permanent or attempt >= self.max_retries:
+                    if isinstance(e, asyncio.TimeoutError):
+                        e = f"timed out after {self.timeout}s"
+                    increment("llm.errors")
+                    logger.warning("Error communicating with Ollama: %s", e)
+                    return None
+                delay = self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+                attempt += 1
+                increment("llm.retries")
+                logger.info("LLM request failed (%s); retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+
+    async def _chat_once(self, client: ollama.AsyncClient, prompt: str) -> str:
+        """
+        Sends one prompt. When streaming, the request is closed as soon as the
+        first line of the answer is complete, which stops generation.
+        """
+        if not self.stream:
+            response = await client.chat(**self._chat_arguments(prompt))
+            return first_line(response['message']['content'] + "\n") or ""
+        parts = await client.chat(stream=True, **self._chat_arguments(prompt))
+        content = ""
+        try:
+            async for part in parts:
+                content += part['message']['content']
+                line = first_line(content)
+                if line is not None:
+                    increment("llm.early_stops")
+                    return line
+        finally:
+            await parts.aclose()
+        return content.strip()
+
 if __name__ == '__main__':
     # This block runs only when the script is executed directly
     
@@ -0,0 +1,247 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List
+
+from . import config
+
+
+def default_manifest_path() -> str:
+    """
+    Returns the manifest location, which lives next to the ChromaDB directory.
+    """
+    configured = getattr(config, "MANIFEST_PATH", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "manifest.sqlite3")
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Computes the SHA-256 digest of a file's bytes without loading it into memory.
+    """
+    with open(file_path, 'rb') as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class FileManifest:
+    """
+    A persistent record of every file ingested into the knowledge base.
+
+    Each entry stores the file's size, modification time, content hash and the
+    ids of the chunks it produced, so a rebuild can skip unchanged files,
+    replace the chunks of changed files and remove the chunks of deleted ones.
+
+    Chunk ids are content-addressed, so identical chunks of different files
+    share one id. The `chunk_refs` table records which files reference each
+    chunk; a chunk is only deleted once no file references it.
+    """
+    def __init__(self, path: Optional[str] = None):
+        """
+        Opens (or creates) the manifest database.
+        """
+        self.path = path or default_manifest_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # The ingest pipeline reads from its producer thread and writes from its
+        # writer thread, so the connection is shared and guarded by a lock.
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_refs (
+                chunk_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                PRIMARY KEY (chunk_id, path)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunk_refs_path ON chunk_refs (path)")
+        self._backfill_chunk_refs()
+        self.conn.commit()
+
+    def _backfill_chunk_refs(self):
+        """
+        Fills `chunk_refs` from the file entries of a manifest created before it existed.
+        """
+        if self.conn.execute("SELECT 1 FROM chunk_refs LIMIT 1").fetchone():
+            return
+        rows = self.conn.execute("SELECT path, chunk_ids FROM files").fetchall()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO chunk_refs (chunk_id, path) VALUES (?, ?)",
+            ((chunk_id, path) for path, chunk_ids in rows for chunk_id in json.loads(chunk_ids))
+        )
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the manifest entry for a file, or None if it has never been ingested.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime, content_hash, chunk_ids FROM files WHERE path = ?",
+                (file_path,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "size": row[0],
+            "mtime": row[1],
+            "content_hash": row[2],
+            "chunk_ids": json.loads(row[3]),
+        }
+
+    def is_unchanged(self, file_path: str, stat: os.stat_result) -> bool:
+        """
+        Cheap check using only size and mtime; no file content is read.
+        """
+        entry = self.get(file_path)
+        return (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+        )
+
+    def record(self, file_path: str, stat: os.stat_result, content_hash: str, chunk_ids: List[str]):
+        """
+        Inserts or replaces the entry for a file.
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime, content_hash, chunk_ids) VALUES (?, ?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime, content_hash, json.dumps(chunk_ids))
+            )
+            self.conn.execute("DELETE FROM chunk_refs WHERE path = ?", (file_path,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO chunk_refs (chunk_id, path) VALUES (?, ?)",
+                ((chunk_id, file_path) for chunk_id in chunk_ids)
+            )
+
+    def remove(self, file_path: str):
+        """
+        Deletes the entry for a file.
+        """
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (file_path,))
+            self.conn.execute("DELETE FROM chunk_refs WHERE path = ?", (file_path,))
+
+    def relocate(self, old_path: str, new_path: str):
+        """
+        Moves a file's entry to a new path, keeping its stat fields, hash and chunks.
+        An existing entry at the new path (a file that was overwritten) is replaced.
+        """
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM files WHERE path = ?", (old_path,)).fetchone() is None:
+                return
+            self.conn.execute("DELETE FROM files WHERE path = ?", (new_path,))
+            self.conn.execute("DELETE FROM chunk_refs WHERE path = ?", (new_path,))
+            self.conn.execute("UPDATE files SET path = ? WHERE path = ?", (new_path, old_path))
+            self.conn.execute("UPDATE chunk_refs SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def paths_with_hash(self, content_hash: str) -> List[str]:
+        """
+        Returns the recorded paths of files with the given content hash.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT path FROM files WHERE content_hash = ?", (content_hash,)).fetchall()
+        return [row[0] for row in rows]
+
+    def referrers(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """
+        Maps each of the given chunk ids that is still referenced to one file referencing it.
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        referrers = {}
+        with self.lock:
+            # Stay well below SQLite's limit on the number of query parameters.
+            for i in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT chunk_id, MIN(path) FROM chunk_refs WHERE chunk_id IN ({', '.join('?' * len(batch))}) "
+                    "GROUP BY chunk_id",
+                    batch
+                ).fetchall()
+                referrers.update(rows)
+        return referrers
+
+    def sources(self, chunk_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Maps each of the given chunk ids to every file that references it.
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        sources: Dict[str, List[str]] = {}
+        with self.lock:
+            for i in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT chunk_id, path FROM chunk_refs WHERE chunk_id IN ({', '.join('?' * len(batch))}) "
+                    "ORDER BY path",
+                    batch
+                ).fetchall()
+                for chunk_id, path in rows:
+                    sources.setdefault(chunk_id, []).append(path)
+        return sources
+
+    def shared_chunks(self, paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Maps each of the given files to those of its chunk ids that other files reference too.
+        """
+        paths = list(dict.fromkeys(paths))
+        shared: Dict[str, List[str]] = {}
+        with self.lock:
+            for i in range(0, len(paths), 500):
+                batch = paths[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT r.path, r.chunk_id FROM chunk_refs r WHERE r.path IN ({', '.join('?' * len(batch))}) "
+                    "AND EXISTS (SELECT 1 FROM chunk_refs o WHERE o.chunk_id = r.chunk_id AND o.path != r.path)",
+                    batch
+                ).fetchall()
+                for path, chunk_id in rows:
+                    shared.setdefault(path, []).append(chunk_id)
+        return shared
+
+    def paths(self) -> List[str]:
+        """
+        Returns every recorded file path.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT path FROM files").fetchall()
+        return [row[0] for row in rows]
+
+    def paths_under(self, directory_path: str) -> List[str]:
+        """
+        Returns every recorded file path that lives under the given directory.
+        """
+        prefix = os.path.join(directory_path, "")
+        # substr() keeps the match exact and case-sensitive, unlike LIKE.
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def commit(self):
+        """Flushes pending changes to disk."""
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        """Commits and closes the underlying database."""
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,289 @@
+"""
+Lightweight instrumentation: timing spans, counters and histograms.
+
+Stages of the pipeline are wrapped in spans (`with span("embed"): ...`). Each
+span records its duration in a histogram named after the stage. Counters
+track discrete events (cache hits, LLM retries, ...). Everything is kept in
+the process-wide `METRICS` registry and can be exported at exit as a JSON
+summary or as a Prometheus textfile (for node_exporter's textfile collector).
+
+This module only uses the standard library so that importing it is free.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Upper bounds (in seconds) of the histogram buckets; the last bucket is +Inf.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram of durations in seconds.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float, count: int = 1):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.bucket_counts[index] += count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile by interpolating within its bucket.
+        """
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if bucket_count and seen + bucket_count >= target:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = low + (high - low) * (target - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"buckets": list(self.buckets), "bucket_counts": list(self.bucket_counts),
+                "count": self.count, "sum": self.sum, "min": self.min, "max": self.max}
+
+    def merge(self, data: dict):
+        if data["count"] == 0:
+            return
+        for i, bucket_count in enumerate(data["bucket_counts"]):
+            self.bucket_counts[i] += bucket_count
+        self.count += data["count"]
+        self.sum += data["sum"]
+        self.min = min(self.min, data["min"])
+        self.max = max(self.max, data["max"])
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_s": round(self.sum, 6),
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "min_ms": round(self.min * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50) * 1000, 3),
+            "p90_ms": round(self.quantile(0.90) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """
+    A thread-safe registry of counters and duration histograms.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.started_at = time.time()
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float, count: int = 1):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds, count)
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Times the enclosed block and records it in the `name` histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    # --- Moving metrics between processes ---
+
+    def drain(self) -> dict:
+        """
+        Returns the raw metrics and resets the registry. Worker processes use
+        this to hand their measurements to the parent, which `merge`s them.
+        """
+        with self._lock:
+            data = {
+                "counters": dict(self.counters),
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            }
+            self.counters.clear()
+            self.histograms.clear()
+        return data
+
+    def merge(self, data: dict):
+        with self._lock:
+            for name, value in data.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, raw in data.get("histograms", {}).items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(raw["buckets"])
+                histogram.merge(raw)
+
+    # --- Export ---
+
+    def summary(self) -> dict:
+        """
+        Returns counters and per-stage latency summaries.
+        """
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started_at, 3),
+                "counters": dict(sorted(self.counters.items())),
+                "spans": {name: h.summary() for name, h in sorted(self.histograms.items())},
+            }
+
+    def to_prometheus(self, prefix: str = "file_organizer") -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        """
+        def metric_name(name):
+            return f"{prefix}_" + "".join(c if c.isalnum() else "_" for c in name)
+
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = metric_name(name) + "_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, histogram in sorted(self.histograms.items()):
+                metric = metric_name(name) + "_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.sum}")
+                lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+        """
+        Writes the JSON summary and/or the Prometheus textfile. Files are
+        replaced atomically, so a collector never reads a partial file.
+        """
+        if json_path == "-":
+            print(json.dumps(self.summary(), indent=2))
+        elif json_path:
+            _write_atomic(json_path, json.dumps(self.summary(), indent=2))
+        if prometheus_path:
+            _write_atomic(prometheus_path, self.to_prometheus())
+
+
+def _write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# The process-wide registry.
+METRICS = Metrics()
+
+
+def span(name: str):
+    """Times a block into the global registry: `with span("embed"): ...`."""
+    return METRICS.span(name)
+
+
+def increment(name: str, value: float = 1):
+    METRICS.increment(name, value)
+
+
+def observe(name: str, seconds: float, count: int = 1):
+    METRICS.observe(name, seconds, count)
+
+
+def export_metrics(json_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+    """
+    Exports the global registry. Paths default to METRICS_JSON_PATH and
+    METRICS_PROMETHEUS_PATH in the config; nothing is written if neither is set.
+    """
+    if json_path is None or prometheus_path is None:
+        try:
+            from . import config
+        except ImportError:
+            config = None
+        json_path = json_path or getattr(config, "METRICS_JSON_PATH", None)
+        prometheus_path = prometheus_path or getattr(config, "METRICS_PROMETHEUS_PATH", None)
+    METRICS.export(json_path=json_path, prometheus_path=prometheus_path)
+
+
+@contextmanager
+def profiled(output_path: Optional[str] = None, top: int = 30):
+    """
+    Runs the enclosed block under cProfile. The raw stats are saved to
+    `output_path` (for snakeviz, pstats, ...) and the most expensive functions
+    by cumulative time are printed to stderr.
+    """
+    if not output_path:
+        yield
+        return
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+        print(f"\n--- Profile written to '{output_path}'; top {top} functions by cumulative time ---", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(top)
+
+
+def configure_logging(level: str = None, verbosity: int = 0):
+    """
+    Sets up leveled logging for the command-line entry points.
+
+    Args:
+        level: A level name (e.g., 'DEBUG'). Defaults to LOG_LEVEL in the config, or WARNING.
+        verbosity: Each -v lowers the level by one step (WARNING -> INFO -> DEBUG).
+    """
+    if level is None:
+        try:
+            from . import config
+            level = getattr(config, "LOG_LEVEL", "WARNING")
+        except ImportError:
+            level = "WARNING"
+    numeric = logging.getLevelName(str(level).upper())
+    if not isinstance(numeric, int):
+        numeric = logging.WARNING
+    numeric = max(logging.DEBUG, numeric - 10 * verbosity)
+    # Third-party libraries (chromadb, httpx, ...) only report warnings and errors.
+    logging.basicConfig(level=max(numeric, logging.WARNING), format=LOG_FORMAT)
+    logging.getLogger("file_organizer").setLevel(numeric)
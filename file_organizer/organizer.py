@@ -0,0 +1,254 @@
+import os
+import logging
+from typing import Iterable, List, Dict, Any, Optional, Callable
+
+from . import config, generations
+from .rag_system import RAGSystem
+from .llm_agent import LLMAgent, AsyncLLMAgent
+from .decision import DecisionEngine
+from .metrics import span
+from .file_manager import FileManager
+from .bulk_mover import BulkMover, MoveResult, latest_journal
+from .embeddors.embeddor_registry import EmbeddorRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class FileOrganizer:
+    """
+    Builds the RAG system, LLM agent and embeddor registry once and uses them
+    to plan and execute moves for any number of files.
+    """
+    def __init__(self, rag: Optional[RAGSystem] = None, llm: Optional[LLMAgent] = None,
+                 registry: Optional[EmbeddorRegistry] = None, file_manager: Optional[FileManager] = None):
+        """
+        Initializes all modules. Existing instances can be passed in to share them.
+        """
+        # The knowledge base generation the RAG system reads (see `follow_live_generation`).
+        self.generation = generations.live_generation() if rag else generations.apply_live_generation()
+        self.rag = rag or RAGSystem()
+        self.llm = llm or AsyncLLMAgent()
+        self.registry = registry or EmbeddorRegistry()
+        self.file_manager = file_manager or FileManager()
+        # The journal of the most recent batch of moves, for undoing it.
+        self.last_journal: Optional[str] = None
+        # Bypasses the LLM for unambiguous files and caches its other decisions.
+        self.decisions = DecisionEngine(self.llm)
+
+    def follow_live_generation(self) -> bool:
+        """
+        Reopens the knowledge base if a fresh build has made another generation
+        live since it was opened. The LLM agent and registry are kept.
+
+        Returns:
+            True if the knowledge base was reopened.
+        """
+        generation = generations.live_generation()
+        if generation == self.generation:
+            return False
+        logger.info("Switching to knowledge base generation %s", generation)
+        self.rag.close()
+        generations.use_generation(generation)
+        self.rag = RAGSystem()
+        self.generation = generation
+        return True
+
+    def build_plan(self, file_paths: List[str], batch_size: int = 32,
+                   on_entry: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Proposes a destination for every file.
+
+        Files are processed in batches: the contents of a batch are extracted,
+        their retrieval queries are embedded together, and then the files that
+        need the LLM are sent to it concurrently. `on_entry`, if given, is called with each entry as soon
+        as it is decided, so callers can stream progress.
+
+        Returns:
+            One plan entry per file, with keys `source`, `destination`,
+            `suggested_folder`, `action` ('move' or 'skip') and `reason`.
+            Decided entries also record `decided_by` ('bypass', 'cache' or 'llm').
+        """
+        plan = []
+        for i in range(0, len(file_paths), batch_size):
+            entries = self._plan_batch(file_paths[i:i + batch_size])
+            if on_entry:
+                for entry in entries:
+                    on_entry(entry)
+            plan.extend(entries)
+        return plan
+
+    def _plan_batch(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Plans a single batch of files.
+        """
+        entries: List[Dict[str, Any]] = []
+        contents: List[str] = []
+        file_types: List[Optional[str]] = []
+        same_file_type = getattr(config, "RETRIEVAL_SAME_FILE_TYPE", False)
+        for file_path in file_paths:
+            entry = {
+                "source": os.path.abspath(file_path),
+                "destination": None,
+                "suggested_folder": None,
+                "action": "skip",
+                "reason": None,
+            }
+            entries.append(entry)
+            contents.append("")
+            file_types.append(None)
+
+            if not self.file_manager.file_exists(file_path):
+                entry["reason"] = "file does not exist"
+                continue
+            embeddor = self.registry.get_embeddor_for_file(file_path)
+            if not embeddor:
+                entry["reason"] = "no suitable processor"
+                continue
+            with span("extract_preview"):
+                content = embeddor.extract_preview(file_path)
+            if not content:
+                entry["reason"] = "could not extract content"
+                continue
+            contents[-1] = content
+            if same_file_type:
+                # Only retrieve files of the same type, as recorded for the chunks at ingest.
+                file_types[-1] = embeddor.extract_metadata(file_path).get("file_type")
+
+        # --- Embed all of the batch's queries together ---
+        pending = [i for i, content in enumerate(contents) if content]
+        contexts = self.rag.retrieve_context_batch(
+            [contents[i] for i in pending], n_results=3, file_types=[file_types[i] for i in pending]
+        )
+
+        decided = []
+        for i, context in zip(pending, contexts):
+            entry = entries[i]
+            if context is None:
+                entry["reason"] = "context retrieval failed"
+                continue
+            entry["candidate_folders"] = (context.get("candidate_folders") or [[]])[0]
+            file_info = {"name": os.path.basename(entry["source"]), "content": contents[i][:500]}
+            decided.append((entry, file_info, context))
+
+        # --- Decide on the whole batch (LLM requests run concurrently) ---
+        decisions = self.decisions.decide_many([(file_info, context) for _, file_info, context in decided])
+        for (entry, _, _), (suggestion, decided_by) in zip(decided, decisions):
+            entry["decided_by"] = decided_by
+            self._apply_suggestion(entry, suggestion)
+        return entries
+
+    def _apply_suggestion(self, entry: Dict[str, Any], suggested_folder: Optional[str]):
+        """
+        Validates and corrects the LLM's response, then fills in the plan entry.
+        """
+        if suggested_folder is None:
+            entry["reason"] = "the LLM request failed"
+            return
+        entry["suggested_folder"] = suggested_folder
+
+        # The LLM sometimes suggests a file path; use its parent folder instead.
+        _, file_extension = os.path.splitext(suggested_folder)
+        if file_extension:
+            suggested_folder = os.path.dirname(suggested_folder)
+
+        if not suggested_folder or not (":" in suggested_folder or os.path.isabs(suggested_folder)):
+            entry["reason"] = f"invalid destination format suggested ('{suggested_folder}')"
+            return
+        if not self.file_manager.file_exists(suggested_folder):
+            entry["reason"] = f"destination folder does not exist ('{suggested_folder}')"
+            return
+
+        destination = os.path.join(suggested_folder, os.path.basename(entry["source"]))
+        if os.path.normcase(os.path.abspath(destination)) == os.path.normcase(entry["source"]):
+            entry["reason"] = "file is already in the suggested folder"
+            return
+
+        entry["destination"] = destination
+        entry["action"] = "move"
+
+    def execute_plan(self, plan: List[Dict[str, Any]]) -> int:
+        """
+        Executes every 'move' entry in a plan (see `execute_moves`).
+
+        Returns:
+            The number of files that were moved.
+        """
+        return sum(1 for result in self.execute_moves(plan) if result.moved)
+
+    def execute_moves(self, plan: List[Dict[str, Any]], manifest=None) -> List[MoveResult]:
+        """
+        Executes every 'move' entry in a plan as one journaled batch (see
+        `BulkMover`), which `undo_moves` can reverse. The journal's path is
+        kept in `last_journal`. Moved files that are in the knowledge base are
+        relocated in the index (and in `manifest`, if one is given).
+
+        Returns:
+            One result per 'move' entry, in order.
+        """
+        moves = [(entry["source"], entry["destination"]) for entry in plan if entry["action"] == "move"]
+        if not moves:
+            return []
+        mover = BulkMover()
+        try:
+            results = mover.move_many(moves)
+        finally:
+            self.last_journal = mover.journal_path
+        self._relocate_moved(results, manifest)
+        return results
+
+    def undo_moves(self, journal_path: Optional[str] = None) -> List[MoveResult]:
+        """
+        Moves the files of an executed batch (by default the most recent one) back where they came from.
+
+        Returns:
+            One result per file moved back (or not, with the reason).
+        """
+        return self._run_journal(BulkMover().undo, journal_path)
+
+    def resume_moves(self, journal_path: Optional[str] = None) -> List[MoveResult]:
+        """
+        Finishes an interrupted batch of moves (by default the most recent one).
+
+        Returns:
+            One result per move that was still pending.
+        """
+        return self._run_journal(BulkMover().resume, journal_path)
+
+    def _run_journal(self, run, journal_path: Optional[str]):
+        journal_path = journal_path or latest_journal()
+        if journal_path is None:
+            raise FileNotFoundError("There is no move journal.")
+        self.last_journal = journal_path
+        results = run(journal_path)
+        self._relocate_moved(results)
+        return results
+
+    def _relocate_moved(self, results: Iterable[MoveResult], manifest=None) -> int:
+        """
+        Lets the knowledge base entries (and manifest entries) of moved files
+        follow them, so retrieval sees the new folders at once without re-embedding.
+
+        Returns:
+            The number of files that were moved.
+        """
+        from .manifest import FileManifest
+
+        moved = 0
+        own_manifest = manifest is None
+        if own_manifest:
+            manifest = FileManifest()
+        try:
+            for result in results:
+                if not result.moved:
+                    continue
+                moved += 1
+                try:
+                    self.rag.relocate_source(result.source, result.destination, manifest=manifest)
+                except Exception as e:
+                    # The move itself succeeded; the next knowledge base build repairs the index.
+                    logger.error("Could not update the index for %s: %s", result.destination, e)
+        finally:
+            if own_manifest:
+                manifest.close()
+            self.rag.persist()
+        return moved
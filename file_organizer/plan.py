@@ -0,0 +1,71 @@
+import os
+import logging
+import glob
+import json
+from typing import Iterable, List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Plan helpers are shared by the in-process organizer, the daemon and the thin
+# CLI client, so this module must only depend on the standard library.
+
+
+def collect_files(inputs: Iterable[str], recursive: bool = False) -> List[str]:
+    """
+    Expands a mix of file paths, directories and glob patterns into a list of files.
+
+    Directories contribute the files directly inside them (or every file below
+    them when `recursive` is set). Duplicates are dropped, order is preserved.
+    """
+    seen = set()
+    files = []
+
+    def add(path: str):
+        path = os.path.abspath(path)
+        if path not in seen and os.path.isfile(path):
+            seen.add(path)
+            files.append(path)
+
+    for item in inputs:
+        item = os.path.expanduser(item)
+        if os.path.isdir(item):
+            if recursive:
+                for root, _, names in os.walk(item):
+                    for name in sorted(names):
+                        add(os.path.join(root, name))
+            else:
+                for name in sorted(os.listdir(item)):
+                    add(os.path.join(item, name))
+        elif os.path.exists(item):
+            add(item)
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                logger.warning("'%s' matched no files. Skipping.", item)
+            for match in matches:
+                add(match)
+    return files
+
+
+def format_plan(plan: List[Dict[str, Any]]) -> str:
+    """
+    Renders a plan as human-readable text.
+    """
+    lines = []
+    moves = [entry for entry in plan if entry["action"] == "move"]
+    skips = [entry for entry in plan if entry["action"] != "move"]
+    lines.append(f"--- Proposed Moves ({len(moves)}) ---")
+    for entry in moves:
+        lines.append(f"'{entry['source']}'\n  -> '{entry['destination']}'")
+    if skips:
+        lines.append(f"--- Skipped ({len(skips)}) ---")
+        for entry in skips:
+            lines.append(f"'{entry['source']}': {entry['reason']}")
+    return "\n".join(lines)
+
+
+def plan_to_json(plan: List[Dict[str, Any]]) -> str:
+    """
+    Serializes a plan to JSON.
+    """
+    return json.dumps(plan, indent=2)
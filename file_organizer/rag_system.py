@@ -1,43 +1,116 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import os
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
 # The dot before 'config' creates a relative import that works
 # because both files are in the same 'file_organizer' package.
 from . import config
+from .embedding_cache import EmbeddingCache
+from .embedding_engine import EmbeddingEngine
+from .folder_index import FolderIndex
+from .embeddors.base_embeddor import BaseFileEmbeddor
+from .metrics import span, increment
+from .vector_store import create_vector_store
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODES = ("two_stage", "flat")
+
 
 class RAGSystem:
     """
-    Manages the ChromaDB vector database for the file organization agent. 
+    Manages the vector database for the file organization agent. 
     """
     def __init__(self):
         """
         Initializes the RAGSystem.
         """
-        print("--- Initializing RAGSystem ---")
+        logger.info("Initializing RAGSystem")
+
+        # This uses the SentenceTransformer model to create embeddings locally (see EMBEDDING_WORKERS).
+        self.embedding_function = EmbeddingEngine(config.EMBEDDING_MODEL_NAME)
+
+        # This caches embeddings by chunk text so unchanged chunks are never re-embedded.
+        self.embedding_cache = None
+        if getattr(config, "EMBEDDING_CACHE_ENABLED", True):
+            self.embedding_cache = EmbeddingCache(
+                model_name=config.EMBEDDING_MODEL_NAME,
+                max_bytes=getattr(config, "EMBEDDING_CACHE_MAX_BYTES", 1024 ** 3),
+            )
 
-        # This client saves data to the specified directory. 
-        self.client = chromadb.PersistentClient(path=config.CHROMA_PERSIST_DIRECTORY)
+        # This opens the store where embeddings are kept (a ChromaDB collection or the local store).
+        backend = getattr(config, "VECTOR_BACKEND", "chroma")
+        self.store = create_vector_store(backend)
+        logger.info("Vector store '%s' opened.", backend)
 
-        # This uses the SentenceTransformer model to create embeddings locally. 
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=config.EMBEDDING_MODEL_NAME
-        )
+        # This keeps one vector per file (the mean of its chunks' embeddings), for two-stage retrieval.
+        self.file_store = create_vector_store(backend, collection="files")
+        self.retrieval_mode = getattr(config, "RETRIEVAL_MODE", "two_stage")
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown RETRIEVAL_MODE {self.retrieval_mode!r} "
+                             f"(expected one of {', '.join(RETRIEVAL_MODES)})")
+        self.candidate_files = max(1, getattr(config, "RETRIEVAL_CANDIDATE_FILES", 20))
 
-        # This gets or creates the collection where embeddings will be stored. 
-        self.collection = self.client.get_or_create_collection(
-            name=config.CHROMA_COLLECTION_NAME,
-            embedding_function=self.embedding_function,
-        )
-        print(f"ChromaDB collection '{config.CHROMA_COLLECTION_NAME}' loaded/created.")
-        print("-" * 30)
+        # This keeps per-folder centroids of the chunk embeddings for fast folder classification.
+        self.folder_index = FolderIndex() if getattr(config, "FOLDER_INDEX_ENABLED", True) else None
+
+        # Queries are chunked like ingested files; see `_query_chunks` and `_fuse`.
+        self.query_max_chunks = max(1, getattr(config, "QUERY_MAX_CHUNKS", 8))
+        self.query_fusion = getattr(config, "QUERY_FUSION", "rrf")
+        self._query_splitter = None
+
+        # Duplicate chunks are stored once; the manifest knows all of their source files.
+        self._manifest = None
     
-    def ingest_documents(self, documents: list[str], metadatas: list[dict], ids: list[str]):
+    def embed(self, texts: list[str], use_cache: bool = True) -> list[list[float]]:
+        """
+        Embeds texts, serving previously seen texts from the embedding cache and
+        only running the embedding model on the misses.
+        """
+        if not texts:
+            return []
+        if self.embedding_cache is None or not use_cache:
+            increment("embed.texts", len(texts))
+            with span("embed"):
+                return np.asarray(self.embedding_function(texts), dtype=np.float32).tolist()
+
+        vectors = self.embedding_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        increment("embed.cache_hits", len(texts) - len(missing))
+        if missing:
+            increment("embed.texts", len(missing))
+            with span("embed"):
+                computed = self.embedding_function([texts[i] for i in missing])
+            self.embedding_cache.put_many([texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+    def ingest_documents(self, documents: list[str], metadatas: list[dict], ids: list[str]) -> list[str]:
         """
-        Ingests or updates documents in the ChromaDB collection in batches.
+        Ingests or updates documents in the vector store in batches.
+
+        Returns:
+            The ids of the documents that could not be stored (their batch
+            failed to embed or upsert), so callers can retry them later.
         """
+        # Chunk ids are content-addressed, so identical chunks (within a file or
+        # across the files of a batch) arrive with the same id; upsert each once.
+        if len(set(ids)) < len(ids):
+            first = {}
+            for index, doc_id in enumerate(ids):
+                first.setdefault(doc_id, index)
+            keep = sorted(first.values())
+            documents = [documents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+
         # --- NEW: Batching Logic ---
         # ChromaDB has a max batch size. We'll process our documents in smaller chunks.
         batch_size = 4000 # A safe number well below the max limit of ~5461
         total_documents = len(documents)
+        failed_ids = []
 
         for i in range(0, total_documents, batch_size):
             # Create a slice for the current batch
@@ -48,31 +121,475 @@ class RAGSystem:
 
             try:
                 # Ingest the current batch
-                self.collection.upsert(
-                    documents=batch_docs,
-                    metadatas=batch_metadatas,
-                    ids=batch_ids
-                )
-                print(f"Successfully ingested/updated batch {i//batch_size + 1} ({len(batch_docs)} documents).")
+                batch_embeddings = self.embed(batch_docs)
+                # Chunks being replaced must leave the folder centroids before the new ones join.
+                self._remove_from_folder_index(batch_ids)
+                with span("upsert"):
+                    self.store.upsert(
+                        documents=batch_docs,
+                        embeddings=batch_embeddings,
+                        metadatas=batch_metadatas,
+                        ids=batch_ids
+                    )
+                increment("upsert.chunks", len(batch_ids))
+                if self.folder_index is not None:
+                    self.folder_index.add(batch_embeddings, batch_metadatas)
+                logger.debug("Ingested/updated batch %d (%d documents).", i // batch_size + 1, len(batch_docs))
             except Exception as e:
-                print(f"Error ingesting batch starting at index {i}: {e}")
+                logger.error("Error ingesting batch starting at index %d: %s", i, e)
+                failed_ids.extend(batch_ids)
         # -------------------------
+        return failed_ids
+
+    def delete_documents(self, ids: list[str]):
+        """
+        Removes documents from the vector store by id, in batches.
+        """
+        batch_size = 4000
+        for i in range(0, len(ids), batch_size):
+            batch_ids = ids[i:i + batch_size]
+            try:
+                self._remove_from_folder_index(batch_ids)
+                self.store.delete(ids=batch_ids)
+            except Exception as e:
+                logger.error("Error deleting batch starting at index %d: %s", i, e)
     
-    def retrieve_context(self, query: str, n_results: int = 3):
+    def relocate_source(self, old_path: str, new_path: str, manifest=None, ids: list[str] = None) -> int:
         """
-        Retrieves the top n_results most relevant document snippets from the collection.
-        This is the 'Retrieval' part of RAG.
+        Points the chunks of a moved file at its new path without re-embedding them.
+
+        The chunks' `source` metadata is updated in place, the folder index
+        moves their embeddings from the old folder's centroids to the new
+        one's, and the file's vector and manifest entry (if a manifest is
+        given) follow the file.
+
+        Args:
+            ids: Only relocate these chunks (of those whose source is `old_path`).
+
+        Returns:
+            The number of chunks updated.
+        """
+        # Relocating some of a file's chunks (to another file sharing them) leaves the file where it is.
+        relocate_file = ids is None
+        with span("relocate"):
+            existing = self.store.get(ids=ids, where={"source": old_path}, include=["embeddings", "metadatas"])
+            ids = existing["ids"]
+            if ids:
+                metadatas = [dict(metadata, source=new_path) for metadata in existing["metadatas"]]
+                self.store.update(ids=ids, metadatas=metadatas)
+                if self.folder_index is not None:
+                    self.folder_index.remove(existing["embeddings"], existing["metadatas"])
+                    self.folder_index.add(existing["embeddings"], metadatas)
+            if relocate_file:
+                self._relocate_file_vector(old_path, new_path)
+            if manifest is not None:
+                manifest.relocate(old_path, new_path)
+                manifest.commit()
+        increment("relocate.chunks", len(ids))
+        logger.debug("Relocated %d chunks from %s to %s", len(ids), old_path, new_path)
+        return len(ids)
+
+    def _relocate_file_vector(self, old_path: str, new_path: str):
+        existing = self.file_store.get(ids=[old_path], include=["embeddings", "metadatas", "documents"])
+        if not existing["ids"]:
+            return
+        self.file_store.delete(ids=[old_path])
+        metadata = dict(existing["metadatas"][0], source=new_path, folder=os.path.dirname(new_path))
+        self.file_store.upsert(ids=[new_path], embeddings=[existing["embeddings"][0]],
+                               documents=[os.path.basename(new_path)], metadatas=[metadata])
+
+    def index_files(self, files: Iterable[Tuple[str, List[str], Optional[dict]]]):
+        """
+        Stores the file-level vectors of ingested files: the normalized mean
+        of the embeddings of the chunks each file references (read back from
+        the vector store, so chunks shared with other files count too).
+
+        Args:
+            files: (path, chunk ids, metadata of one of its chunks) per file.
+                The file vector's metadata is the path's `source` and
+                `folder`, the chunk count and the `file_type` that
+                `extract_metadata` recorded in the chunk metadata.
+        """
+        files = list(files)
+        ids = list(dict.fromkeys(chunk_id for _, chunk_ids, _ in files for chunk_id in chunk_ids))
+        embeddings = self._chunk_embeddings(ids)
+        vectors, metadatas, paths, empty = [], [], [], []
+        for path, chunk_ids, chunk_metadata in files:
+            found = [embeddings[chunk_id] for chunk_id in chunk_ids if chunk_id in embeddings]
+            if not found:
+                empty.append(path)
+                continue
+            paths.append(path)
+            vectors.append(_file_vector(found))
+            chunk_metadata = chunk_metadata or {}
+            metadatas.append({
+                "source": path,
+                "folder": os.path.dirname(path),
+                "file_type": chunk_metadata.get("file_type") or os.path.splitext(path)[1].lower(),
+                "chunks": len(found),
+            })
+        with span("upsert.files"):
+            if paths:
+                self.file_store.upsert(ids=paths, embeddings=vectors, metadatas=metadatas,
+                                       documents=[os.path.basename(path) for path in paths])
+            if empty:
+                self.file_store.delete(ids=empty)
+        increment("upsert.files", len(paths))
+
+    def remove_files(self, paths: List[str]):
+        """
+        Removes the file-level vectors of files that left the knowledge base.
+        """
+        if paths:
+            self.file_store.delete(ids=list(paths))
+
+    def rebuild_file_index(self, manifest, batch_size: int = 500):
+        """
+        Recomputes the file-level vector of every file in the manifest (e.g.,
+        for a knowledge base built before file vectors existed).
+        """
+        batch = []
+        for path in manifest.paths():
+            entry = manifest.get(path)
+            if entry and entry["chunk_ids"]:
+                batch.append(path)
+            if len(batch) >= batch_size:
+                self._index_manifest_files(manifest, batch)
+                batch = []
+        self._index_manifest_files(manifest, batch)
+        self.file_store.persist()
+        logger.info("File index rebuilt (%d files).", self.file_store.count())
+
+    def _index_manifest_files(self, manifest, paths: List[str]):
+        if not paths:
+            return
+        files = []
+        for path in paths:
+            chunk_ids = manifest.get(path)["chunk_ids"]
+            # Prefer the metadata of a chunk stored under this very file.
+            own = self.store.get(where={"source": path}, limit=1, include=["metadatas"])
+            files.append((path, chunk_ids, own["metadatas"][0] if own["ids"] else None))
+        self.index_files(files)
+
+    def _chunk_embeddings(self, ids: List[str], page_size: int = 4000) -> Dict[str, list]:
+        embeddings = {}
+        for i in range(0, len(ids), page_size):
+            page = self.store.get(ids=ids[i:i + page_size], include=["embeddings"])
+            embeddings.update(zip(page["ids"], page["embeddings"]))
+        return embeddings
+
+    def _remove_from_folder_index(self, ids: list[str]):
+        """
+        Subtracts the stored embeddings of the given chunks (if they exist) from the folder index.
+        """
+        if self.folder_index is None or not ids:
+            return
+        existing = self.store.get(ids=ids, include=["embeddings", "metadatas"])
+        if existing["ids"]:
+            self.folder_index.remove(existing["embeddings"], existing["metadatas"])
+
+    def classify_folders(self, query_embedding: list[float], top_k: int = 5) -> list:
+        """
+        Ranks candidate destination folders for a query embedding using the folder index.
+
+        Returns:
+            A list of (folder, score) pairs, best first (empty if the index is disabled or empty).
+        """
+        if self.folder_index is None:
+            return []
+        return self.folder_index.classify(query_embedding, top_k=top_k)
+
+    def rebuild_folder_index(self, page_size: int = 5000):
+        """
+        Rebuilds the folder index from every embedding in the vector store.
+        """
+        if self.folder_index is None:
+            return
+        self.folder_index.clear()
+        offset = 0
+        while True:
+            page = self.store.get(limit=page_size, offset=offset, include=["embeddings", "metadatas"])
+            if not page["ids"]:
+                break
+            self.folder_index.add(page["embeddings"], page["metadatas"])
+            offset += len(page["ids"])
+        self.folder_index.save()
+        logger.info("Folder index rebuilt from %d chunks (%d folders).", offset, self.folder_index.folder_count())
+
+    def save_folder_index(self, interval: float = 0.0):
+        """
+        Saves the folder index's pending changes if its last save was at least `interval` seconds ago.
         """
-        try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
+        if self.folder_index is not None:
+            self.folder_index.save_if_due(interval)
+
+    def persist(self):
+        """
+        Saves derived indexes (such as the folder index) that have pending changes.
+        """
+        self.store.persist()
+        self.file_store.persist()
+        if self.folder_index is not None and self.folder_index.dirty:
+            self.folder_index.save()
+
+    def close(self):
+        """
+        Saves pending changes, closes the vector store and stops any embedding workers.
+        """
+        self.persist()
+        self.store.close()
+        self.file_store.close()
+        self.embedding_function.close()
+
+    def _query_chunks(self, text: str) -> list[str]:
+        """
+        Splits a query text the same way files are chunked at ingest, and keeps
+        at most QUERY_MAX_CHUNKS evenly spaced chunks so that a long document is
+        represented from start to end without embedding all of it.
+        """
+        if self._query_splitter is None:
+            # Imported here so that creating a RAGSystem doesn't pay for importing langchain.
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._query_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=BaseFileEmbeddor.CHUNK_SIZE,
+                chunk_overlap=BaseFileEmbeddor.CHUNK_OVERLAP
             )
-            print(f"Successfully retrieved context for query: '{query}'")
-            return results
-        except Exception as e:
-            print(f"Error retrieving context: {e}")
-            return None
+        chunks = self._query_splitter.split_text(text) or [text]
+        if len(chunks) > self.query_max_chunks:
+            picks = np.linspace(0, len(chunks) - 1, self.query_max_chunks).round().astype(int)
+            chunks = [chunks[i] for i in sorted(set(picks))]
+        return chunks
+
+    def _fuse(self, results: dict, rows: range, n_results: int) -> dict:
+        """
+        Fuses the results of several query chunks into one deduplicated top-k.
+
+        Hits are grouped by source file. With 'rrf' a file's score is the sum of
+        1 / (60 + rank) over the query chunks that retrieved it; with 'max' it is
+        its smallest distance to any query chunk. Each file is represented by
+        its closest chunk.
+
+        Returns:
+            A single-query result shaped like `VectorStore.query`'s.
+        """
+        best = {}    # source -> (distance, id, document, metadata)
+        scores = {}  # source -> fused score (higher is better)
+        for row in rows:
+            ranked_sources = []
+            for rank, doc_id in enumerate(results["ids"][row]):
+                distance = results["distances"][row][rank]
+                metadata = results["metadatas"][row][rank] or {}
+                source = metadata.get("source", doc_id)
+                if source not in best or distance < best[source][0]:
+                    best[source] = (distance, doc_id, results["documents"][row][rank], metadata)
+                if source not in ranked_sources:
+                    ranked_sources.append(source)
+            for rank, source in enumerate(ranked_sources):
+                if self.query_fusion == "max":
+                    scores[source] = max(scores.get(source, float("-inf")), -best[source][0])
+                else:
+                    scores[source] = scores.get(source, 0.0) + 1.0 / (60 + rank + 1)
+
+        top = sorted(scores, key=lambda source: (-scores[source], best[source][0]))[:n_results]
+        return {
+            "ids": [[best[source][1] for source in top]],
+            "distances": [[best[source][0] for source in top]],
+            "documents": [[best[source][2] for source in top]],
+            "metadatas": [[best[source][3] for source in top]],
+            "embeddings": None,
+            "uris": None,
+            "data": None,
+            "included": ["documents", "metadatas", "distances"],
+        }
+
+    def retrieve_context(self, query: str, n_results: int = 3, file_type: Optional[str] = None):
+        """
+        Retrieves the top n_results most relevant document snippets from the vector store.
+        This is the 'Retrieval' part of RAG.
+
+        The query is chunked like an ingested file, its chunks are embedded and
+        searched together, and the hits are fused into the n_results best
+        distinct source files.
+
+        Args:
+            file_type: Only retrieve files of this `file_type` (e.g., '.pdf'), if there are any.
+        """
+        return self.retrieve_context_batch([query], n_results=n_results, file_types=[file_type])[0]
+
+    def retrieve_context_batch(self, queries: list[str], n_results: int = 3, batch_size: int = 64,
+                               file_types: Optional[List[Optional[str]]] = None) -> list:
+        """
+        Retrieves context for many queries. The chunks of a batch of queries are
+        embedded in one call.
+
+        With RETRIEVAL_MODE 'two_stage', each query's mean chunk embedding
+        first finds its RETRIEVAL_CANDIDATE_FILES nearest files in the small
+        file-level store ('query.files'), then its chunks are searched only
+        among those files' chunks ('query.chunks'), so the cost of the second
+        stage doesn't grow with the total amount of text. With 'flat' (or
+        before any file vectors exist), all chunks of a batch are searched
+        with one multi-query `VectorStore.query` ('query').
+
+        Args:
+            file_types: Optional `file_type` filter per query (None for no filter).
+
+        Returns:
+            One result per query, each shaped like the result of `retrieve_context`
+            (or None for queries whose batch failed).
+        """
+        two_stage = self.retrieval_mode == "two_stage" and self.file_store.count() > 0
+        contexts = []
+        for i in range(0, len(queries), batch_size):
+            batch_queries = queries[i:i + batch_size]
+            batch_types = (file_types or [])[i:i + batch_size]
+            try:
+                with span("chunk"):
+                    chunk_lists = [self._query_chunks(query) for query in batch_queries]
+                all_chunks = [chunk for chunks in chunk_lists for chunk in chunks]
+                query_embeddings = self.embed(all_chunks, use_cache=False)
+                row = 0
+                query_rows = []
+                for chunks in chunk_lists:
+                    query_rows.append(range(row, row + len(chunks)))
+                    row += len(chunks)
+                file_embeddings = [_file_vector([query_embeddings[r] for r in rows]) for rows in query_rows]
+                if two_stage:
+                    results = self._query_two_stage(query_embeddings, query_rows, file_embeddings,
+                                                    batch_types, n_results)
+                else:
+                    # Fetch extra hits per chunk, since several may come from the same file.
+                    with span("query"):
+                        result = self.store.query(
+                            query_embeddings=query_embeddings,
+                            n_results=n_results * 2,
+                            include=["documents", "metadatas", "distances"]
+                        )
+                    results = [(result, rows) for rows in query_rows]
+            except Exception as e:
+                logger.error("Error retrieving context for batch starting at index %d: %s", i, e)
+                contexts.extend([None] * len(batch_queries))
+                continue
+
+            # Fuse each query's chunk results back into one single-query result.
+            batch_contexts = []
+            for (result, rows), file_embedding in zip(results, file_embeddings):
+                context = self._fuse(result, rows, n_results)
+                context["candidate_folders"] = [self.classify_folders(file_embedding)]
+                batch_contexts.append(context)
+            self._expand_sources(batch_contexts)
+            contexts.extend(batch_contexts)
+        logger.debug("Retrieved context for %d queries.", len(queries))
+        return contexts
+
+    def _query_two_stage(self, query_embeddings: list, query_rows: List[range], file_embeddings: list,
+                         file_types: List[Optional[str]], n_results: int) -> list:
+        """
+        Runs both retrieval stages for a batch of queries.
+
+        Returns:
+            A (result, rows) pair per query: its chunks' `VectorStore.query`
+            result and the rows of that result that belong to it.
+        """
+        # Stage 1: candidate files, in one search per distinct file type filter.
+        candidates: List[List[str]] = [[] for _ in query_rows]
+        with span("query.files"):
+            by_type: Dict[Optional[str], List[int]] = {}
+            for index in range(len(query_rows)):
+                file_type = file_types[index] if index < len(file_types) else None
+                by_type.setdefault(file_type, []).append(index)
+            for file_type, indexes in by_type.items():
+                where = {"file_type": file_type} if file_type else None
+                hits = self.file_store.query(
+                    query_embeddings=[file_embeddings[index] for index in indexes],
+                    n_results=self.candidate_files, where=where, include=[]
+                )
+                for index, ids in zip(indexes, hits["ids"]):
+                    candidates[index] = ids
+            # A file type that no stored file has doesn't filter at all.
+            unmatched = [index for index in range(len(query_rows)) if not candidates[index]]
+            if unmatched and any(file_types):
+                hits = self.file_store.query(
+                    query_embeddings=[file_embeddings[index] for index in unmatched],
+                    n_results=self.candidate_files, include=[]
+                )
+                for index, ids in zip(unmatched, hits["ids"]):
+                    candidates[index] = ids
+            # A chunk shared by several files is stored under only one of them,
+            # which may not be a candidate; search under that file too.
+            stored_under = self._stored_sources([path for ids in candidates for path in ids])
+        increment("query.candidate_files", sum(len(ids) for ids in candidates))
+
+        # Stage 2: each query's chunks among its candidate files' chunks.
+        results = []
+        with span("query.chunks"):
+            for rows, paths in zip(query_rows, candidates):
+                sources = list(dict.fromkeys(
+                    paths + [source for path in paths for source in stored_under.get(path, ())]
+                ))
+                result = self.store.query(
+                    query_embeddings=[query_embeddings[r] for r in rows],
+                    n_results=n_results * 2,
+                    where={"source": {"$in": sources}} if sources else None,
+                    include=["documents", "metadatas", "distances"]
+                )
+                results.append((result, range(len(rows))))
+        return results
+
+    def _stored_sources(self, paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Maps files to the other files their shared chunks (see `FileManifest`) are stored under.
+        """
+        shared = self._get_manifest().shared_chunks(paths)
+        if not shared:
+            return {}
+        ids = list(dict.fromkeys(chunk_id for chunk_ids in shared.values() for chunk_id in chunk_ids))
+        stored = {}
+        for i in range(0, len(ids), 4000):
+            page = self.store.get(ids=ids[i:i + 4000], include=["metadatas"])
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                stored[doc_id] = (metadata or {}).get("source")
+        return {
+            path: sorted({stored[chunk_id] for chunk_id in chunk_ids if stored.get(chunk_id) not in (None, path)})
+            for path, chunk_ids in shared.items()
+        }
+
+    def _get_manifest(self):
+        if self._manifest is None:
+            from .manifest import FileManifest
+            self._manifest = FileManifest()
+        return self._manifest
+
+    def _expand_sources(self, contexts: list):
+        """
+        Adds a `sources` list to the metadata of retrieved chunks that several
+        files share (exact or near duplicates), with the chunk's own source first.
+        """
+        ids = [doc_id for context in contexts for doc_id in context["ids"][0]]
+        if not ids:
+            return
+        sources = self._get_manifest().sources(ids)
+        for context in contexts:
+            metadatas = context["metadatas"][0]
+            for i, doc_id in enumerate(context["ids"][0]):
+                paths = sources.get(doc_id, [])
+                if len(paths) < 2:
+                    continue
+                source = metadatas[i].get("source")
+                metadatas[i] = dict(metadatas[i], sources=[source] + [p for p in paths if p != source])
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the embedding cache's hit/miss counters, or an empty dict if it is disabled.
+        """
+        return self.embedding_cache.stats() if self.embedding_cache else {}
+
+def _file_vector(embeddings) -> list:
+    """
+    Returns the normalized mean of a file's chunk embeddings.
+    """
+    mean = np.mean(np.asarray(embeddings, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm > 0 else mean).tolist()
 
 # Example of how to instantiate and use the class (for testing purposes)
 if __name__ == '__main__':
@@ -80,7 +597,7 @@ if __name__ == '__main__':
 
     # --- Ingestion Step ---
     # We re-run ingestion to ensure the data is present for the test.
-    # ChromaDB's upsert handles this gracefully without creating duplicates.
+    # The store's upsert handles this gracefully without creating duplicates.
     sample_docs = [
         "This is a project report about artificial intelligence.",
         "A simple text file containing a grocery list: milk, bread, eggs."
@@ -93,7 +610,7 @@ if __name__ == '__main__':
     rag_system.ingest_documents(
         documents=sample_docs, metadatas=sample_metadatas, ids=sample_ids
     )
-    print(f"Total items in collection: {rag_system.collection.count()}")
+    print(f"Total items in collection: {rag_system.store.count()}")
     print("-" * 30)
 
     # --- Retrieval Step ---
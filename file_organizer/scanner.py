@@ -0,0 +1,459 @@
+"""
+Finds the files to ingest under one or more root directories.
+
+Directories are listed with `os.scandir` and pruned before they are entered:
+hidden directories, dependency and cache directories (SCAN_EXCLUDE_DIRS), and
+anything matched by an ignore file (`.gitignore` style, read in every
+directory) or by the SCAN_EXCLUDE patterns. Files are filtered by extension
+before they are stat'ed, then by size, so unsupported and oversized files
+cost no more than their directory entry. Several roots are scanned
+concurrently.
+
+Usage (lists what a build would ingest, with the scan statistics):
+    python -m file_organizer.scanner DIR [DIR ...]
+"""
+import os
+import re
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from . import config
+from .metrics import increment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXCLUDE_DIRS = (
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "__pycache__", ".venv", "venv",
+    "site-packages", ".tox", ".mypy_cache", ".pytest_cache", ".cache",
+)
+DEFAULT_IGNORE_FILES = (".gitignore", ".organizerignore")
+
+# Why a file or directory was skipped, in the order they are reported.
+SKIP_RULES = ("hidden", "excluded_dir", "ignored", "too_deep", "extension", "too_large", "error")
+
+
+class ScannedFile(NamedTuple):
+    path: str
+    stat: Optional[os.stat_result]  # None if not stat'ed yet
+
+
+class IgnorePattern(NamedTuple):
+    regex: "re.Pattern"
+    negated: bool
+    directory_only: bool
+
+
+def compile_pattern(pattern: str) -> Optional[IgnorePattern]:
+    """
+    Compiles one line of a `.gitignore`-style file. Returns None for blank lines and comments.
+
+    The regex matches the path relative to the ignore file's directory, with '/' separators.
+    """
+    pattern = pattern.rstrip("\n\r")
+    if not pattern.strip() or pattern.startswith("#"):
+        return None
+    pattern = pattern.rstrip(" ")
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\"):
+        pattern = pattern[1:]
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    # A pattern with a slash (other than a trailing one) is relative to the
+    # ignore file's directory; one without matches a name at any depth.
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    parts, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    return IgnorePattern(re.compile(prefix + "".join(parts) + "$", re.DOTALL), negated, directory_only)
+
+
+def compile_patterns(lines: Iterable[str]) -> List[IgnorePattern]:
+    return [compiled for compiled in map(compile_pattern, lines) if compiled is not None]
+
+
+# Patterns of one ignore file (or of SCAN_EXCLUDE), with the directory they are relative to.
+_RuleSet = Tuple[str, List[IgnorePattern]]
+
+
+def is_ignored(path: str, is_dir: bool, rule_sets: Sequence[_RuleSet]) -> bool:
+    """
+    Applies ignore rules as git does: the last matching pattern wins, and
+    deeper ignore files take precedence over those of their parents.
+    """
+    ignored = False
+    for base, patterns in rule_sets:
+        relative = path[len(base):].lstrip(os.sep)
+        if os.sep != "/":
+            relative = relative.replace(os.sep, "/")
+        for pattern in patterns:
+            if pattern.directory_only and not is_dir:
+                continue
+            if pattern.regex.match(relative):
+                ignored = not pattern.negated
+    return ignored
+
+
+class ScanStats:
+    """
+    What a scan found and skipped. `seconds` is the time the longest root took
+    to scan, not counting time the caller spent on the yielded files.
+    `failed_directories` lists the directories that could not be listed, so
+    the files under them are unknown rather than gone.
+    """
+    def __init__(self):
+        self.files = 0
+        self.directories = 0
+        self.skipped: Counter = Counter()
+        self.seconds = 0.0
+        self.failed_directories: List[str] = []
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    def merge(self, other: "ScanStats"):
+        self.files += other.files
+        self.directories += other.directories
+        self.skipped.update(other.skipped)
+        self.seconds = max(self.seconds, other.seconds)
+        self.failed_directories.extend(other.failed_directories)
+
+    def as_dict(self) -> dict:
+        return {
+            "files": self.files,
+            "directories": self.directories,
+            "skipped": {rule: self.skipped[rule] for rule in SKIP_RULES if self.skipped[rule]},
+            "seconds": round(self.seconds, 3),
+            "files_per_second": round(self.files_per_second, 1),
+        }
+
+
+def format_scan_stats(stats: ScanStats) -> str:
+    skipped = ", ".join(f"{count} {rule.replace('_', ' ')}" for rule, count in stats.as_dict()["skipped"].items())
+    return (
+        f"Scan: {stats.files} file(s) in {stats.directories} director(ies) in {stats.seconds:.2f}s "
+        f"({stats.files_per_second:.0f} files/s); skipped: {skipped or 'none'}"
+    )
+
+
+class DirectoryScanner:
+    """
+    Walks directory trees with `os.scandir`, applying the ignore and pruning rules.
+
+    All settings default to the SCAN_* values in the config.
+    """
+    def __init__(self, extensions: Optional[Iterable[str]] = None, exclude: Optional[Sequence[str]] = None,
+                 exclude_dirs: Optional[Iterable[str]] = None, ignore_files: Optional[Iterable[str]] = None,
+                 skip_hidden: Optional[bool] = None, max_file_bytes: Optional[int] = -1,
+                 max_depth: Optional[int] = -1, threads: Optional[int] = None):
+        """
+        Args:
+            extensions: Only files with these extensions are yielded (e.g., the
+                registry's `supported_extensions()`); None yields every file.
+            exclude: Gitignore-style patterns, relative to each root.
+            exclude_dirs: Names of directories that are never entered.
+            ignore_files: Names of the ignore files read in every directory.
+            skip_hidden: Don't enter directories whose names start with a dot.
+            max_file_bytes: Larger files are skipped (None for no limit).
+            max_depth: Directory levels entered below each root (None for no limit).
+            threads: Roots scanned concurrently.
+        """
+        self.extensions = None if extensions is None else {ext.lower() for ext in extensions}
+        self.exclude = compile_patterns(getattr(config, "SCAN_EXCLUDE", []) if exclude is None else exclude)
+        self.exclude_dirs = set(getattr(config, "SCAN_EXCLUDE_DIRS", DEFAULT_EXCLUDE_DIRS)
+                                if exclude_dirs is None else exclude_dirs)
+        self.ignore_files = tuple(getattr(config, "SCAN_IGNORE_FILES", DEFAULT_IGNORE_FILES)
+                                  if ignore_files is None else ignore_files)
+        self.skip_hidden = getattr(config, "SCAN_SKIP_HIDDEN", True) if skip_hidden is None else skip_hidden
+        self.max_file_bytes = getattr(config, "SCAN_MAX_FILE_BYTES", 512 * 1024 * 1024) if max_file_bytes == -1 else max_file_bytes
+        self.max_depth = getattr(config, "SCAN_MAX_DEPTH", None) if max_depth == -1 else max_depth
+        self.threads = max(1, threads or getattr(config, "SCAN_THREADS", 4))
+        self.stats = ScanStats()
+        self._stats_lock = threading.Lock()
+
+    def scan(self, roots: Iterable[str]) -> Iterator[ScannedFile]:
+        """
+        Yields the files to ingest under every root. With several roots, they
+        are scanned concurrently and their files are interleaved.
+        """
+        roots = [os.path.abspath(root) for root in roots]
+        self.stats = ScanStats()
+        if len(roots) <= 1 or self.threads == 1:
+            for root in roots:
+                root_stats = ScanStats()
+                try:
+                    yield from self._walk(root, root_stats)
+                finally:
+                    self._finish_root(root_stats)
+            return
+        yield from self._scan_concurrently(roots)
+
+    def _scan_concurrently(self, roots: List[str]) -> Iterator[ScannedFile]:
+        results: "queue.Queue" = queue.Queue(maxsize=1024)
+        pending = queue.Queue()
+        for root in roots:
+            pending.put(root)
+        stopping = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            while not stopping.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def worker():
+            while not stopping.is_set():
+                try:
+                    root = pending.get_nowait()
+                except queue.Empty:
+                    break
+                root_stats = ScanStats()
+                try:
+                    for scanned in self._walk(root, root_stats):
+                        if not put(scanned):
+                            break
+                except Exception as e:
+                    logger.warning("Scanning %s failed: %s", root, e)
+                    root_stats.failed_directories.append(root)
+                self._finish_root(root_stats)
+            put(done)
+
+        threads = [threading.Thread(target=worker, name=f"scanner-{i}", daemon=True)
+                   for i in range(min(self.threads, len(roots)))]
+        for thread in threads:
+            thread.start()
+        running = len(threads)
+        try:
+            while running:
+                item = results.get()
+                if item is done:
+                    running -= 1
+                else:
+                    yield item
+        finally:
+            stopping.set()
+            for thread in threads:
+                thread.join()
+
+    def _finish_root(self, root_stats: ScanStats):
+        with self._stats_lock:
+            self.stats.merge(root_stats)
+        increment("scan.files", root_stats.files)
+        for rule, count in root_stats.skipped.items():
+            increment(f"scan.skipped.{rule}", count)
+
+    def _walk(self, root: str, stats: ScanStats) -> Iterator[ScannedFile]:
+        """
+        Walks one root depth-first. The time spent here (not while the caller
+        holds a yielded file) is added to `stats.seconds`.
+        """
+        started = time.perf_counter()
+        stack: List[Tuple[str, int, Tuple[_RuleSet, ...]]] = [(root, 0, ((root, self.exclude),) if self.exclude else ())]
+        while stack:
+            directory, depth, rule_sets = stack.pop()
+            try:
+                with os.scandir(directory) as iterator:
+                    entries = list(iterator)
+            except OSError as e:
+                logger.warning("Could not scan %s: %s", directory, e)
+                stats.skipped["error"] += 1
+                stats.failed_directories.append(directory)
+                continue
+            stats.directories += 1
+
+            names = {entry.name for entry in entries}
+            rule_sets = self._with_ignore_files(directory, rule_sets, names.__contains__)
+
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    stats.skipped["error"] += 1
+                    continue
+                if is_dir:
+                    rule = self._directory_rule(entry.name, entry.path, depth, rule_sets)
+                    if rule:
+                        stats.skipped[rule] += 1
+                    else:
+                        stack.append((entry.path, depth + 1, rule_sets))
+                    continue
+
+                rule = self._file_rule(entry.name, entry.path, rule_sets)
+                if rule:
+                    stats.skipped[rule] += 1
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError as e:
+                    logger.warning("Could not stat %s: %s", entry.path, e)
+                    stats.skipped["error"] += 1
+                    continue
+                if self.max_file_bytes is not None and stat.st_size > self.max_file_bytes:
+                    stats.skipped["too_large"] += 1
+                    continue
+
+                stats.files += 1
+                stats.seconds += time.perf_counter() - started
+                yield ScannedFile(entry.path, stat)
+                started = time.perf_counter()
+        stats.seconds += time.perf_counter() - started
+
+    def _directory_rule(self, name: str, path: str, depth: int, rule_sets: Sequence[_RuleSet]) -> Optional[str]:
+        """
+        Returns the rule that keeps the scan out of a directory, or None to enter it.
+        """
+        if self.skip_hidden and name.startswith("."):
+            return "hidden"
+        if name in self.exclude_dirs:
+            return "excluded_dir"
+        if rule_sets and is_ignored(path, True, rule_sets):
+            return "ignored"
+        if self.max_depth is not None and depth >= self.max_depth:
+            return "too_deep"
+        return None
+
+    def _file_rule(self, name: str, path: str, rule_sets: Sequence[_RuleSet]) -> Optional[str]:
+        """
+        Returns the rule that skips a file before it is stat'ed, or None.
+        """
+        if self.extensions is not None and os.path.splitext(name)[1].lower() not in self.extensions:
+            return "extension"
+        if name in self.ignore_files or (rule_sets and is_ignored(path, False, rule_sets)):
+            return "ignored"
+        return None
+
+    def _with_ignore_files(self, directory: str, rule_sets: Tuple[_RuleSet, ...],
+                           has_file: Callable[[str], bool]) -> Tuple[_RuleSet, ...]:
+        """
+        Adds the patterns of a directory's ignore files to the rules in effect.
+        """
+        for ignore_file in self.ignore_files:
+            if has_file(ignore_file):
+                patterns = self._read_ignore_file(os.path.join(directory, ignore_file))
+                if patterns:
+                    rule_sets = rule_sets + ((directory, patterns),)
+        return rule_sets
+
+    def exclusion_rules(self, paths: Iterable[str], root: str) -> Dict[str, str]:
+        """
+        Checks which files a scan of `root` positively excludes, by applying the
+        same rules as the walk to each file's directories and to the file itself.
+
+        Returns:
+            {path: the rule that excludes it} for the excluded paths. Paths the
+            scan would list, or whose directories can't be read, are left out.
+        """
+        root = os.path.abspath(root)
+        # directory -> (the rule that excludes it or one of its ancestors, the rules in effect inside it).
+        # Both are None if it or one of its ancestors can't be read.
+        directories: Dict[str, Tuple[Optional[str], Optional[Tuple[_RuleSet, ...]]]] = {}
+
+        def rules_in(directory: str, depth: int) -> Tuple[Optional[str], Optional[Tuple[_RuleSet, ...]]]:
+            if directory in directories:
+                return directories[directory]
+            rule: Optional[str] = None
+            rule_sets: Optional[Tuple[_RuleSet, ...]] = ((root, self.exclude),) if self.exclude else ()
+            if directory != root:
+                rule, rule_sets = rules_in(os.path.dirname(directory), depth - 1)
+                if rule is None and rule_sets is not None:
+                    rule = self._directory_rule(os.path.basename(directory), directory, depth - 1, rule_sets)
+            if rule is None and rule_sets is not None:
+                try:
+                    names = set(os.listdir(directory))
+                    rule_sets = self._with_ignore_files(directory, rule_sets, names.__contains__)
+                except OSError:
+                    rule_sets = None
+            directories[directory] = (rule, rule_sets)
+            return rule, rule_sets
+
+        excluded = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            relative = os.path.relpath(path, root)
+            if relative == os.curdir or relative.split(os.sep)[0] == os.pardir:
+                continue
+            rule, rule_sets = rules_in(os.path.dirname(path), relative.count(os.sep))
+            if rule is None and rule_sets is not None:
+                rule = self._file_rule(os.path.basename(path), path, rule_sets)
+                if rule is None and self.max_file_bytes is not None:
+                    try:
+                        if os.stat(path).st_size > self.max_file_bytes:
+                            rule = "too_large"
+                    except OSError:
+                        pass
+            if rule:
+                excluded[path] = rule
+        return excluded
+
+    @staticmethod
+    def _read_ignore_file(path: str) -> List[IgnorePattern]:
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                return compile_patterns(f)
+        except OSError as e:
+            logger.warning("Could not read %s: %s", path, e)
+            return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the files a knowledge base build would ingest.")
+    parser.add_argument("directories", metavar="DIR", nargs="*",
+                        help="Directories to scan (default: DEFAULT_KNOWLEDGE_DIRECTORIES).")
+    parser.add_argument("--all-extensions", action="store_true",
+                        help="List files of every type, not only those an embeddor supports.")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Only print the statistics.")
+    args = parser.parse_args()
+
+    extensions = None
+    if not args.all_extensions:
+        from .embeddors.embeddor_registry import EmbeddorRegistry
+        extensions = EmbeddorRegistry().supported_extensions()
+    scanner = DirectoryScanner(extensions=extensions)
+    for scanned in scanner.scan(args.directories or config.DEFAULT_KNOWLEDGE_DIRECTORIES):
+        if not args.quiet:
+            print(scanned.path)
+    print(format_scan_stats(scanner.stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
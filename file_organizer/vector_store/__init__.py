@@ -0,0 +1,38 @@
+import os
+from typing import Optional
+
+from .. import config
+from .base import VectorStore
+
+BACKENDS = ("chroma", "local")
+
+
+def create_vector_store(backend: Optional[str] = None, embedding_function=None, space: Optional[str] = None,
+                        collection: Optional[str] = None) -> VectorStore:
+    """
+    Opens the configured vector store.
+
+    Args:
+        backend: 'chroma' (a ChromaDB collection) or 'local' (an in-process,
+            memory-mapped store). Defaults to VECTOR_BACKEND in the config.
+        embedding_function: Passed to the ChromaDB collection.
+        space: Distance function of a new local store (defaults to VECTOR_STORE_SPACE).
+        collection: Opens a secondary store of the knowledge base instead of
+            the chunk store (e.g., 'files' for the file-level vectors): the
+            collection CHROMA_COLLECTION_NAME + '_' + collection, or that
+            subdirectory of VECTOR_STORE_DIRECTORY.
+    """
+    backend = backend or getattr(config, "VECTOR_BACKEND", "chroma")
+    # Each backend is imported on demand, so the local store never pays for importing ChromaDB.
+    if backend == "chroma":
+        from .chroma_store import ChromaVectorStore
+        collection_name = f"{config.CHROMA_COLLECTION_NAME}_{collection}" if collection else None
+        return ChromaVectorStore(collection_name=collection_name, embedding_function=embedding_function)
+    if backend == "local":
+        from .local_store import LocalVectorStore, default_vector_store_directory
+        directory = os.path.join(default_vector_store_directory(), collection) if collection else None
+        return LocalVectorStore(directory=directory, space=space)
+    raise ValueError(f"Unknown VECTOR_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+
+__all__ = ["BACKENDS", "VectorStore", "create_vector_store"]
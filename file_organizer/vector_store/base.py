@@ -0,0 +1,75 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence
+
+
+class VectorStore(ABC):
+    """
+    The storage behind `RAGSystem`: chunk embeddings with their documents and metadata.
+
+    The interface is the subset of a ChromaDB collection's that the organizer
+    uses, and results are shaped like ChromaDB's, so backends are
+    interchangeable. Distances depend on the store's `space`, as in ChromaDB:
+    'l2' (squared L2 distance), 'cosine' (1 - cosine similarity) or 'ip'
+    (1 - inner product).
+
+    `where` filters use ChromaDB's syntax: `{"key": value}`,
+    `{"key": {"$in": [...]}}` (also `$eq`, `$ne`, `$nin`, `$gt`, `$gte`, `$lt`
+    and `$lte`), combined with `{"$and": [...]}` or `{"$or": [...]}`.
+    """
+    name = "base"
+    space = "l2"
+
+    @abstractmethod
+    def count(self) -> int:
+        """
+        Returns the number of stored chunks.
+        """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]], documents: List[str],
+               metadatas: List[dict]):
+        """
+        Adds chunks, replacing the stored chunks with the same ids.
+        """
+
+    @abstractmethod
+    def update(self, ids: List[str], metadatas: List[dict]):
+        """
+        Replaces the metadata of stored chunks (their embeddings are unchanged).
+        """
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """
+        Removes chunks by id. Unknown ids are ignored.
+        """
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Sequence[str] = ("metadatas", "documents")) -> dict:
+        """
+        Fetches stored chunks by id and/or metadata filter, in pages of `limit`.
+
+        Returns:
+            {"ids": [...], "embeddings": [...], "metadatas": [...], "documents": [...]},
+            where the lists not in `include` are None.
+        """
+
+    @abstractmethod
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10, where: Optional[dict] = None,
+              include: Sequence[str] = ("metadatas", "documents", "distances")) -> dict:
+        """
+        Finds the `n_results` nearest chunks to each query embedding.
+
+        Returns:
+            {"ids": [[...], ...], "distances": [[...], ...], "metadatas": [[...], ...],
+            "documents": [[...], ...]}, one list per query, closest first.
+        """
+
+    def persist(self):
+        """
+        Saves pending changes that are not written as they happen (such as a search index).
+        """
+
+    def close(self):
+        self.persist()
@@ -0,0 +1,104 @@
+import logging
+from typing import List, Optional, Sequence
+
+import chromadb
+from chromadb.utils import embedding_functions
+
+from .. import config
+from .base import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class LazySentenceTransformerFunction(embedding_functions.SentenceTransformerEmbeddingFunction):
+    """
+    ChromaDB's sentence-transformers embedding function (same name and
+    config, so collections created with either open with the other), but the
+    model is only loaded if ChromaDB ever embeds something itself. Embeddings
+    are always computed by `RAGSystem`'s `EmbeddingEngine`, so normally the
+    model (and PyTorch) is never loaded in this process.
+    """
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", device: str = "cpu",
+                 normalize_embeddings: bool = False, **kwargs):
+        self.model_name = model_name
+        self.device = device
+        self.normalize_embeddings = normalize_embeddings
+        self.kwargs = kwargs
+
+    @staticmethod
+    def build_from_config(config: dict) -> "LazySentenceTransformerFunction":
+        # ChromaDB also rebuilds the function from its config when opening a collection.
+        return LazySentenceTransformerFunction(
+            model_name=config.get("model_name"),
+            device=config.get("device", "cpu"),
+            normalize_embeddings=config.get("normalize_embeddings", False),
+            **config.get("kwargs", {}),
+        )
+
+    @property
+    def _model(self):
+        if self.model_name not in self.models:
+            from sentence_transformers import SentenceTransformer
+            self.models[self.model_name] = SentenceTransformer(
+                model_name_or_path=self.model_name, device=self.device, **self.kwargs
+            )
+        return self.models[self.model_name]
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Stores chunks in a persistent ChromaDB collection.
+    """
+    name = "chroma"
+
+    def __init__(self, path: Optional[str] = None, collection_name: Optional[str] = None, embedding_function=None):
+        """
+        Opens (or creates) the collection.
+
+        Args:
+            embedding_function: The collection's embedding function. Embeddings
+                are always computed by `RAGSystem`, but ChromaDB records it with
+                the collection.
+        """
+        self.path = path or config.CHROMA_PERSIST_DIRECTORY
+        self.collection_name = collection_name or config.CHROMA_COLLECTION_NAME
+        if embedding_function is None:
+            embedding_function = LazySentenceTransformerFunction(model_name=config.EMBEDDING_MODEL_NAME)
+        # This client saves data to the specified directory.
+        self.client = chromadb.PersistentClient(path=self.path)
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            embedding_function=embedding_function,
+        )
+        logger.info("ChromaDB collection '%s' loaded/created.", self.collection_name)
+
+    @property
+    def space(self) -> str:
+        """
+        The collection's distance function (ChromaDB picks the embedding function's default when creating it).
+        """
+        hnsw = (getattr(self.collection, "configuration", None) or {}).get("hnsw") or {}
+        return hnsw.get("space") or (self.collection.metadata or {}).get("hnsw:space", "l2")
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]], documents: List[str],
+               metadatas: List[dict]):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids: List[str], metadatas: List[dict]):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Sequence[str] = ("metadatas", "documents")) -> dict:
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10, where: Optional[dict] = None,
+              include: Sequence[str] = ("metadatas", "documents", "distances")) -> dict:
+        return self.collection.query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where, include=list(include)
+        )
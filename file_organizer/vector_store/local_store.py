@@ -0,0 +1,630 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .. import config
+from .base import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Storage dtypes of the vector matrix, with the suffix of its file.
+_DTYPES = {"float32": (np.float32, "f32"), "float16": (np.float16, "f16"), "int8": (np.int8, "i8")}
+_SPACES = ("l2", "cosine", "ip")
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def default_vector_store_directory() -> str:
+    """
+    Returns the local vector store's location, which lives next to the ChromaDB directory.
+    """
+    configured = getattr(config, "VECTOR_STORE_DIRECTORY", None)
+    if configured:
+        return configured
+    db_path = os.path.normpath(config.CHROMA_PERSIST_DIRECTORY)
+    return os.path.join(os.path.dirname(db_path), "vectors")
+
+
+def _where_sql(where: dict) -> Tuple[str, list]:
+    """
+    Translates a ChromaDB-style metadata filter into an SQL condition on the chunks table.
+    """
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(sub) for sub in condition]
+            if parts:
+                joiner = " AND " if key == "$and" else " OR "
+                clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+                params.extend(param for _, sub_params in parts for param in sub_params)
+            continue
+        # `source` has its own indexed column; other keys are read from the metadata JSON.
+        column, column_params = ("source", []) if key == "source" else ("json_extract(metadata, ?)", [f'$."{key}"'])
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                values = list(value)
+                if not values:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                negation = " NOT" if operator == "$nin" else ""
+                clauses.append(f"{column}{negation} IN ({','.join('?' * len(values))})")
+                params.extend(column_params + values)
+            elif operator in _COMPARISONS:
+                clauses.append(f"{column} {_COMPARISONS[operator]} ?")
+                params.extend(column_params + [value])
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+    return " AND ".join(clauses) or "1", params
+
+
+class LocalVectorStore(VectorStore):
+    """
+    An in-process vector store: embeddings in a memory-mapped matrix, documents
+    and metadata in SQLite.
+
+    Row i of the matrix (`vectors.f32`, `vectors.f16` or `vectors.i8`) holds
+    the embedding of the chunk whose `row` is i in `store.sqlite3`;
+    `norms.f32` holds each row's squared norm, or infinity for deleted rows,
+    whose rows are reused. Opening a store only maps the files, so it costs the
+    same for any number of chunks; pages are read as searches touch them.
+
+    Embeddings can be stored as float16 (half the size) or int8 (a quarter,
+    scaled per vector by `scales.f32`), which shrinks what a search has to
+    read. Searches compare the float32 query with the dequantized vectors, so
+    hits are ranked by their distances to those. A store can opt to also keep
+    a float32 copy (`exact.f32`, which makes it larger on disk than a float32
+    store): a search then scans the compact matrix for `rerank_candidates`
+    times as many hits as asked for and re-ranks those by their exact
+    distances, so only the candidates' rows of the copy are ever read.
+
+    Distances are measured in the store's `space` ('l2', 'cosine' or 'ip', as
+    in ChromaDB). Searches are exact (a blockwise brute-force scan) unless
+    `index` is 'hnsw' and hnswlib is installed, in which case unfiltered
+    searches use an approximate HNSW graph (`hnsw.bin`). The graph is loaded
+    (or built) on first use, kept up to date as chunks are written and saved by
+    `persist`.
+
+    One process writes at a time (the ingest writer); other processes may read
+    concurrently and see its commits.
+    """
+    _GROWTH_ROWS = 16384
+    _SEARCH_BLOCK_ROWS = 8192
+    name = "local"
+
+    def __init__(self, directory: Optional[str] = None, dtype: Optional[str] = None, index: Optional[str] = None,
+                 space: Optional[str] = None, rerank: Optional[bool] = None):
+        """
+        Opens (or creates) the store.
+
+        Args:
+            dtype: Storage dtype of new stores: 'float32', 'float16' or 'int8'.
+            index: 'flat' (exact search) or 'hnsw' (approximate search).
+            space: Distance function of new stores: 'l2', 'cosine' or 'ip'.
+            rerank: Whether a new float16/int8 store keeps a float32 copy to
+                re-rank search results with (default: EMBEDDING_KEEP_FLOAT32).
+
+        An existing store keeps the dtype, space and copy it was created with.
+        """
+        self.directory = directory or default_vector_store_directory()
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "store.sqlite3"), check_same_thread=False)
+        # Readers in other processes don't block the writer (and vice versa).
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                source TEXT,
+                document TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value);
+            """
+        )
+        self._conn.commit()
+
+        new_store = self._get_meta("dtype") is None
+        self.dtype_name = self._stored_setting(
+            "dtype", dtype or getattr(config, "EMBEDDING_STORAGE_DTYPE", "float32"), "EMBEDDING_STORAGE_DTYPE"
+        )
+        if self.dtype_name not in _DTYPES:
+            raise ValueError(
+                f"Unsupported EMBEDDING_STORAGE_DTYPE {self.dtype_name!r} (expected one of {', '.join(_DTYPES)})"
+            )
+        self.space = self._stored_setting(
+            "space", space or getattr(config, "VECTOR_STORE_SPACE", "cosine"), "VECTOR_STORE_SPACE"
+        )
+        if self.space not in _SPACES:
+            raise ValueError(f"Unsupported VECTOR_STORE_SPACE {self.space!r} (expected one of {', '.join(_SPACES)})")
+        self.rerank_candidates = max(1, getattr(config, "EMBEDDING_RERANK_CANDIDATES", 4))
+        if rerank is None:
+            rerank = (getattr(config, "EMBEDDING_KEEP_FLOAT32", False)
+                      and getattr(config, "EMBEDDING_RERANK_CANDIDATES", 4) > 0)
+        # Stores created before re-ranking existed have no copy.
+        rerank = bool(rerank) and self.dtype_name != "float32" and new_store
+        self.rerank = bool(self._stored_setting("rerank", int(rerank), "EMBEDDING_KEEP_FLOAT32"))
+        self.dtype, suffix = _DTYPES[self.dtype_name]
+
+        # The memory-mapped files: (attribute, file name, dtype, whether rows are vectors).
+        # The vector matrix comes last, since readers size every map from it.
+        self._layout = [("_norms", "norms.f32", np.float32, False)]
+        if self.dtype_name == "int8":
+            self._layout.append(("_scales", "scales.f32", np.float32, False))
+        if self.rerank:
+            self._layout.append(("_exact", "exact.f32", np.float32, True))
+        self._layout.append(("_vectors", f"vectors.{suffix}", self.dtype, True))
+        self._vectors_path = os.path.join(self.directory, f"vectors.{suffix}")
+        self._hnsw_path = os.path.join(self.directory, "hnsw.bin")
+
+        self.index = index or getattr(config, "VECTOR_STORE_INDEX", "flat")
+        self.hnsw_m = getattr(config, "HNSW_M", 16)
+        self.hnsw_ef_construction = getattr(config, "HNSW_EF_CONSTRUCTION", 200)
+        self.hnsw_ef_search = getattr(config, "HNSW_EF_SEARCH", 64)
+        self._hnsw = None
+        self._hnsw_version = None
+        self._hnsw_dirty = False
+
+        self.dim: Optional[int] = None
+        self._rows = 0  # Rows in use, including deleted rows awaiting reuse
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._norms: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._exact: Optional[np.memmap] = None
+        self._refresh()
+
+    # --- Metadata helpers ---
+
+    def _get_meta(self, name: str):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _stored_setting(self, name: str, requested, setting: str):
+        """
+        Returns a setting fixed when the store was created, or `requested` for a new store.
+        """
+        stored = self._get_meta(name)
+        if stored is None:
+            return requested
+        if stored != requested:
+            logger.info("The vector store at %s uses %s=%s; %s only applies to new stores.",
+                        self.directory, name, stored, setting)
+        return stored
+
+    def _bump_version(self) -> int:
+        """
+        Counts a change to the stored vectors, so that stale HNSW graphs are detected.
+        """
+        version = (self._get_meta("version") or 0) + 1
+        self._set_meta("version", version)
+        return version
+
+    def _rows_for_ids(self, ids: Sequence[str]) -> Dict[str, int]:
+        found = {}
+        # SQLite limits the number of bound parameters, so query in chunks.
+        for i in range(0, len(ids), 500):
+            chunk = list(ids[i:i + 500])
+            placeholders = ",".join("?" * len(chunk))
+            found.update(self._conn.execute(f"SELECT id, row FROM chunks WHERE id IN ({placeholders})", chunk))
+        return found
+
+    # --- Vector files ---
+
+    def _refresh(self):
+        """
+        Picks up the dimension, row count and file size (another process may have written since).
+        """
+        self.dim = self.dim or self._get_meta("dim")
+        self._rows = self._get_meta("rows") or 0
+        if not self.dim or not os.path.exists(self._vectors_path):
+            return
+        capacity = os.path.getsize(self._vectors_path) // (self.dim * np.dtype(self.dtype).itemsize)
+        if capacity != self._capacity:
+            self._map(capacity)
+
+    def _map(self, capacity: int):
+        for attribute, name, dtype, is_vector in self._layout:
+            shape = (capacity, self.dim) if is_vector else (capacity,)
+            setattr(self, attribute, np.memmap(os.path.join(self.directory, name), dtype=dtype, mode="r+", shape=shape))
+        self._capacity = capacity
+
+    def _flush(self):
+        for attribute, _, _, _ in self._layout:
+            getattr(self, attribute).flush()
+
+    def _grow(self, rows: int):
+        """
+        Grows the vector files to hold at least `rows` rows and re-maps them.
+        """
+        capacity = max(rows, self._capacity + max(self._GROWTH_ROWS, self._capacity // 4))
+        if self._vectors is not None:
+            self._flush()
+        for attribute, name, dtype, is_vector in self._layout:
+            setattr(self, attribute, None)
+            with open(os.path.join(self.directory, name), "ab") as f:
+                f.truncate(capacity * (self.dim if is_vector else 1) * np.dtype(dtype).itemsize)
+        self._map(capacity)
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+        """
+        Converts float32 vectors to the storage dtype.
+
+        Returns:
+            (stored vectors, per-vector scales for int8 storage (else None), the
+            float32 vectors they stand for).
+        """
+        if self.dtype_name != "int8":
+            stored = vectors.astype(self.dtype)
+            return stored, None, stored.astype(np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        stored = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return stored, scales.astype(np.float32), stored.astype(np.float32) * scales[:, None]
+
+    def _decode(self, stored: np.ndarray, rows) -> np.ndarray:
+        """
+        Converts stored vectors (the matrix's `rows`) back to float32.
+        """
+        vectors = np.asarray(stored, dtype=np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def _read_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the embeddings of some rows, exactly if the store keeps a float32 copy.
+        """
+        if self._exact is not None:
+            return np.asarray(self._exact[rows])
+        return self._decode(self._vectors[rows], rows)
+
+    # --- HNSW graph ---
+
+    def _hnsw_index(self):
+        """
+        Returns the HNSW graph, loading or (re)building it if it is missing or
+        stale; None if exact search is configured or hnswlib isn't installed.
+        """
+        if self.index != "hnsw" or not self.dim:
+            return None
+        version = self._get_meta("version") or 0
+        if self._hnsw is not None and self._hnsw_version == version:
+            return self._hnsw
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("VECTOR_STORE_INDEX is 'hnsw' but hnswlib is not installed; using exact search.")
+            self.index = "flat"
+            return None
+
+        graph = hnswlib.Index(space=self.space, dim=self.dim)
+        max_elements = max(self._capacity, 1)
+        if self._get_meta("hnsw_version") == version and os.path.exists(self._hnsw_path):
+            graph.load_index(self._hnsw_path, max_elements=max_elements)
+            self._hnsw_dirty = False
+        else:
+            logger.info("Building the HNSW graph of %d rows...", self._rows)
+            graph.init_index(max_elements=max_elements, ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+            for start in range(0, self._rows, self._SEARCH_BLOCK_ROWS):
+                rows = np.arange(start, min(start + self._SEARCH_BLOCK_ROWS, self._rows))
+                rows = rows[np.isfinite(self._norms[rows])]
+                if len(rows):
+                    graph.add_items(self._read_vectors(rows), rows)
+            self._hnsw_dirty = True
+        self._hnsw = graph
+        self._hnsw_version = version
+        return graph
+
+    def _hnsw_add(self, graph, rows: np.ndarray, vectors: np.ndarray):
+        if graph.get_max_elements() < self._capacity:
+            graph.resize_index(self._capacity)
+        graph.add_items(vectors, rows)
+
+    # --- Public API ---
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]], documents: List[str],
+               metadatas: List[dict]):
+        if not ids:
+            return
+        if len(set(ids)) < len(ids):
+            raise ValueError("Duplicate ids in upsert")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            if not self.dim:
+                self.dim = int(vectors.shape[1])
+                self._set_meta("dim", self.dim)
+                self._set_meta("dtype", self.dtype_name)
+                self._set_meta("space", self.space)
+                self._set_meta("rerank", int(self.rerank))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's ({self.dim})")
+            graph = self._hnsw_index()
+
+            # Replaced chunks keep their rows; new ones take freed rows, then fresh rows.
+            existing = self._rows_for_ids(ids)
+            new_count = len(ids) - len(existing)
+            free = [row for (row,) in self._conn.execute("SELECT row FROM free_rows LIMIT ?", (new_count,))]
+            available = iter(free + list(range(self._rows, self._rows + new_count - len(free))))
+            rows = np.array([existing[doc_id] if doc_id in existing else next(available) for doc_id in ids],
+                            dtype=np.int64)
+            self._rows = max(self._rows, int(rows.max()) + 1)
+            if self._rows > self._capacity:
+                self._grow(self._rows)
+
+            # The vectors are written before the rows are committed, so readers never see a row without its vector.
+            stored, scales, approximations = self._encode(vectors)
+            self._vectors[rows] = stored
+            if scales is not None:
+                self._scales[rows] = scales
+            if self._exact is not None:
+                self._exact[rows] = vectors
+            # Scans compare queries with the stored vectors, so the norms are theirs.
+            self._norms[rows] = np.einsum("ij,ij->i", approximations, approximations)
+            self._flush()
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, source, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (int(row), doc_id, (metadata or {}).get("source"), document, json.dumps(metadata or {}))
+                    for row, doc_id, document, metadata in zip(rows, ids, documents, metadatas)
+                ]
+            )
+            self._conn.executemany("DELETE FROM free_rows WHERE row = ?", [(row,) for row in free])
+            self._set_meta("rows", self._rows)
+            version = self._bump_version()
+            self._conn.commit()
+
+            if graph is not None:
+                self._hnsw_add(graph, rows, vectors if self._exact is not None else approximations)
+                self._hnsw_version = version
+                self._hnsw_dirty = True
+
+    def update(self, ids: List[str], metadatas: List[dict]):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET source = ?, metadata = ? WHERE id = ?",
+                [((metadata or {}).get("source"), json.dumps(metadata or {}), doc_id)
+                 for doc_id, metadata in zip(ids, metadatas)]
+            )
+            self._conn.commit()
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._refresh()
+            found = self._rows_for_ids(ids)
+            if not found:
+                return
+            graph = self._hnsw_index()
+            rows = sorted(found.values())
+            # The rows are committed as deleted first; until their norms are
+            # cleared, searches that reach them skip them as unknown rows.
+            self._conn.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self._conn.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", [(row,) for row in rows])
+            version = self._bump_version()
+            self._conn.commit()
+            self._norms[rows] = np.inf
+            self._norms.flush()
+
+            if graph is not None:
+                for row in rows:
+                    graph.mark_deleted(row)
+                self._hnsw_version = version
+                self._hnsw_dirty = True
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Sequence[str] = ("metadatas", "documents")) -> dict:
+        condition, params = _where_sql(where) if where else ("1", [])
+        select = "SELECT row, id, document, metadata FROM chunks"
+        with self._lock:
+            if ids is None:
+                records = self._conn.execute(
+                    f"{select} WHERE {condition} ORDER BY row LIMIT ? OFFSET ?",
+                    params + [-1 if limit is None else limit, offset or 0]
+                ).fetchall()
+            else:
+                records = []
+                ids = list(dict.fromkeys(ids))
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    records.extend(self._conn.execute(
+                        f"{select} WHERE id IN ({placeholders}) AND {condition}", chunk + params
+                    ))
+                records.sort()
+                records = records[offset or 0:]
+                if limit is not None:
+                    records = records[:limit]
+
+            embeddings = None
+            if "embeddings" in include:
+                self._refresh()
+                rows = np.array([record[0] for record in records], dtype=np.int64)
+                embeddings = self._read_vectors(rows) if len(rows) else np.empty((0, self.dim or 0), dtype=np.float32)
+        return {
+            "ids": [record[1] for record in records],
+            "embeddings": embeddings,
+            "documents": [record[2] for record in records] if "documents" in include else None,
+            "metadatas": [json.loads(record[3]) for record in records] if "metadatas" in include else None,
+            "included": list(include),
+        }
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10, where: Optional[dict] = None,
+              include: Sequence[str] = ("metadatas", "documents", "distances")) -> dict:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            self._refresh()
+            if not self.dim or not self._rows or n_results <= 0:
+                distances = np.empty((len(queries), 0), dtype=np.float32)
+                rows = np.empty((len(queries), 0), dtype=np.int64)
+            elif where:
+                condition, params = _where_sql(where)
+                candidates = np.fromiter(
+                    (row for (row,) in self._conn.execute(f"SELECT row FROM chunks WHERE {condition}", params)),
+                    dtype=np.int64
+                )
+                distances, rows = self._search_flat(queries, n_results, np.sort(candidates))
+            else:
+                distances, rows = self._search(queries, n_results)
+
+            # Map the rows back to chunks; rows deleted meanwhile are dropped.
+            unique_rows = sorted(set(rows[np.isfinite(distances)].tolist()))
+            records = {}
+            for i in range(0, len(unique_rows), 500):
+                chunk = unique_rows[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row, doc_id, document, metadata in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({placeholders})", chunk
+                ):
+                    records[row] = (doc_id, document, json.loads(metadata))
+
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        for query_distances, query_rows in zip(distances.tolist(), rows.tolist()):
+            hits = [(distance, records[row]) for distance, row in zip(query_distances, query_rows) if row in records]
+            result["ids"].append([record[0] for _, record in hits])
+            result["distances"].append([distance for distance, _ in hits])
+            result["documents"].append([record[1] for _, record in hits])
+            result["metadatas"].append([record[2] for _, record in hits])
+        for name in ("distances", "documents", "metadatas"):
+            if name not in include:
+                result[name] = None
+        result["embeddings"] = None
+        result["included"] = list(include)
+        return result
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        graph = self._hnsw_index()
+        if graph is None:
+            return self._search_flat(queries, k)
+        k = min(k, self.count())
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        graph.set_ef(max(self.hnsw_ef_search, k))
+        try:
+            rows, distances = graph.knn_query(queries, k=k)
+        except RuntimeError as e:
+            # Raised when the graph can't return k neighbours (e.g., most rows were deleted).
+            logger.debug("HNSW search failed (%s); using exact search.", e)
+            return self._search_flat(queries, k)
+        if self.space != "ip":
+            distances = np.maximum(distances, 0.0)
+        return distances.astype(np.float32), rows.astype(np.int64)
+
+    def _search_flat(self, queries: np.ndarray, k: int,
+                     candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k nearest rows to each query (among `candidates` if given):
+        exactly, or by scanning the compact matrix for more hits and re-ranking
+        them with the float32 copy.
+
+        Returns:
+            (distances, rows), each of shape (queries, <= k), closest first.
+        """
+        if self._exact is None:
+            return self._scan(queries, k, candidates)
+        distances, rows = self._scan(queries, k * self.rerank_candidates, candidates)
+        return self._rerank(queries, distances, rows, k)
+
+    def _distances(self, queries: np.ndarray, vectors: np.ndarray, norms: np.ndarray) -> np.ndarray:
+        """
+        Computes the distance of each query to each vector in the store's space,
+        given the vectors' squared norms: ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2
+        and cos(q, x) = q.x / (||q|| ||x||).
+        """
+        products = queries @ vectors.T
+        if self.space == "l2":
+            distances = norms[None, :] - 2.0 * products + np.einsum("ij,ij->i", queries, queries)[:, None]
+        elif self.space == "cosine":
+            query_norms = np.sqrt(np.maximum(np.einsum("ij,ij->i", queries, queries), 1e-12))
+            distances = 1.0 - products / (np.sqrt(np.maximum(norms, 1e-12))[None, :] * query_norms[:, None])
+        else:
+            distances = 1.0 - products
+        # Deleted rows have an infinite norm.
+        distances[:, np.isinf(norms)] = np.inf
+        return distances
+
+    def _scan(self, queries: np.ndarray, k: int,
+              candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k nearest rows to each query (among `candidates` if given) by a
+        blockwise brute-force scan of the stored vectors.
+        """
+        total = self._rows if candidates is None else len(candidates)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, self._SEARCH_BLOCK_ROWS):
+            end = min(start + self._SEARCH_BLOCK_ROWS, total)
+            rows = np.arange(start, end) if candidates is None else candidates[start:end]
+            # A contiguous slice of the map is read without copying.
+            stored = self._vectors[start:end] if candidates is None else self._vectors[rows]
+            distances = self._distances(queries, self._decode(stored, rows), self._norms[rows])
+            top = min(k, len(rows))
+            picks = np.argpartition(distances, top - 1, axis=1)[:, :top]
+            best_distances = np.concatenate([best_distances, np.take_along_axis(distances, picks, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, rows[picks]], axis=1)
+            if best_distances.shape[1] > k:
+                picks = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                best_distances = np.take_along_axis(best_distances, picks, axis=1)
+                best_rows = np.take_along_axis(best_rows, picks, axis=1)
+        return self._sorted(best_distances, best_rows)
+
+    def _rerank(self, queries: np.ndarray, distances: np.ndarray, rows: np.ndarray,
+                k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Replaces the distances of scanned hits by their exact distances
+        (computed from the float32 copy) and keeps the k closest.
+        """
+        if not rows.size:
+            return distances, rows
+        unique_rows = np.unique(rows)
+        vectors = np.asarray(self._exact[unique_rows])
+        exact = self._distances(queries, vectors, np.einsum("ij,ij->i", vectors, vectors))
+        exact = np.take_along_axis(exact, np.searchsorted(unique_rows, rows), axis=1)
+        exact[np.isinf(distances)] = np.inf
+        distances, rows = self._sorted(exact, rows)
+        return distances[:, :k], rows[:, :k]
+
+    def _sorted(self, distances: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(distances, axis=1, kind="stable")
+        distances = np.take_along_axis(distances, order, axis=1)
+        if self.space != "ip":
+            # Rounding can make the distance of a vector to itself slightly negative.
+            distances = np.maximum(distances, 0.0)
+        return distances, np.take_along_axis(rows, order, axis=1)
+
+    def persist(self):
+        """
+        Saves the HNSW graph if it has changes.
+        """
+        with self._lock:
+            if self._hnsw is None or not self._hnsw_dirty:
+                return
+            temp_path = self._hnsw_path + ".tmp"
+            self._hnsw.save_index(temp_path)
+            os.replace(temp_path, self._hnsw_path)
+            self._set_meta("hnsw_version", self._hnsw_version)
+            self._conn.commit()
+            self._hnsw_dirty = False
+
+    def close(self):
+        self.persist()
+        with self._lock:
+            self._vectors = self._norms = None
+            self._conn.close()
@@ -0,0 +1,72 @@
+"""
+Copies every chunk (and every file-level vector) from one vector store backend to another.
+
+Usage:
+    python -m file_organizer.vector_store.migrate [--source chroma] [--target local]
+
+Embeddings are copied as stored, so nothing is re-embedded, and chunk ids and
+metadata are unchanged, so the manifest, folder index and deduplication index
+stay valid. Set VECTOR_BACKEND to the target backend afterwards.
+"""
+import time
+import logging
+import argparse
+
+from . import BACKENDS, VectorStore, create_vector_store
+from .. import generations
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(source: VectorStore, target: VectorStore, page_size: int = 2000, progress=None) -> int:
+    """
+    Copies all chunks of `source` into `target`, a page at a time.
+
+    Returns:
+        The number of chunks copied.
+    """
+    if source.space != target.space:
+        logger.warning("Copying from a '%s' store to a '%s' store; retrieval distances will change.",
+                       source.space, target.space)
+    copied = 0
+    while True:
+        page = source.get(limit=page_size, offset=copied, include=["embeddings", "documents", "metadatas"])
+        if not page["ids"]:
+            break
+        target.upsert(
+            ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"], metadatas=page["metadatas"]
+        )
+        copied += len(page["ids"])
+        if progress is not None:
+            progress(copied)
+    target.persist()
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the knowledge base from one vector store backend to another.")
+    parser.add_argument('--source', choices=BACKENDS, default="chroma", help='Backend to copy from (default: chroma).')
+    parser.add_argument('--target', choices=BACKENDS, default="local", help='Backend to copy to (default: local).')
+    parser.add_argument('--page-size', type=int, default=2000, help='Chunks copied per batch.')
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("--source and --target must differ")
+
+    # Both stores belong to the live knowledge base generation.
+    generations.apply_live_generation()
+    start_time = time.perf_counter()
+    for collection, unit in ((None, "chunks"), ("files", "file vectors")):
+        source = create_vector_store(args.source, collection=collection)
+        # A new local store measures distances like the source, so distance thresholds keep their meaning.
+        target = create_vector_store(args.target, space=source.space, collection=collection)
+        total = source.count()
+        print(f"Copying {total} {unit} from '{args.source}' to '{args.target}'...")
+        copied = migrate(source, target, args.page_size, progress=lambda n: print(f"  {n}/{total}", end="\r"))
+        target.close()
+        print(f"\nCopied {copied} {unit}.")
+    print(f"Done in {time.perf_counter() - start_time:.2f}s. "
+          f"Set VECTOR_BACKEND = \"{args.target}\" in the config to use the copy.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from . import config
+from .metrics import increment, span
+
+logger = logging.getLogger(__name__)
+
+# Partially downloaded files are renamed when complete, so they are never organized.
+TEMPORARY_SUFFIXES = (".part", ".partial", ".crdownload", ".download", ".tmp", ".temp", ".opdownload")
+
+
+def is_temporary(file_name: str) -> bool:
+    return file_name.startswith((".", "~")) or file_name.lower().endswith(TEMPORARY_SUFFIXES)
+
+
+# --- Change sources ---
+
+class PollingSource:
+    """
+    Detects new and changed files by re-scanning the directory at an interval.
+    Works everywhere; used when inotify is unavailable.
+    """
+    def __init__(self, directory: str, interval: float = 2.0):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._next_scan = 0.0
+
+    def poll(self, timeout: float) -> List[str]:
+        """Returns the files that appeared or changed since the last scan."""
+        wait = self._next_scan - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if time.monotonic() < self._next_scan:
+                return []
+        self._next_scan = time.monotonic() + self.interval
+
+        changed = []
+        snapshot = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    signature = (stat.st_size, stat.st_mtime_ns)
+                    snapshot[entry.path] = signature
+                    if self._snapshot.get(entry.path) != signature:
+                        changed.append(entry.path)
+        except OSError as e:
+            logger.error("Could not scan %s: %s", self.directory, e)
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifySource:
+    """
+    Receives file events from the Linux kernel through inotify (via ctypes),
+    so nothing is re-scanned while the directory is quiet.
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory: str):
+        import ctypes
+        import ctypes.util
+
+        self.directory = directory
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_MODIFY
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        # Files already present are reported on the first poll.
+        self._initial = PollingSource(directory, interval=0.0)
+
+    def poll(self, timeout: float) -> List[str]:
+        """Returns the files that were created, written or moved in since the last call."""
+        if self._initial is not None:
+            changed, self._initial = self._initial.poll(0.0), None
+            return changed
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        changed: Set[str] = set()
+        try:
+            data = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            name = data[offset + self._EVENT.size:offset + self._EVENT.size + length].rstrip(b"\0")
+            offset += self._EVENT.size + length
+            if mask & self.IN_Q_OVERFLOW:
+                # The kernel dropped events; fall back to a full scan.
+                logger.warning("inotify queue overflowed; rescanning %s", self.directory)
+                changed.update(PollingSource(self.directory, interval=0.0).poll(0.0))
+                continue
+            if name and not mask & self.IN_ISDIR:
+                changed.add(os.path.join(self.directory, os.fsdecode(name)))
+        return sorted(changed)
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_source(directory: str, use_polling: bool = False, poll_interval: float = 2.0):
+    """
+    Returns an inotify source on Linux, or a polling source elsewhere (or if inotify fails).
+    """
+    if not use_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifySource(directory)
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify unavailable (%s); falling back to polling", e)
+    return PollingSource(directory, interval=poll_interval)
+
+
+# --- Debouncing ---
+
+class Debouncer:
+    """
+    Tracks files that are still being written and releases them once their
+    size and modification time have stopped changing for `settle_seconds`.
+
+    Files that were already handled are remembered with their signature, so
+    they are only offered again if they change.
+    """
+    def __init__(self, settle_seconds: float = 2.0):
+        self.settle_seconds = settle_seconds
+        # path -> (signature, time the signature was last seen to change)
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        self._handled: Dict[str, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def touch(self, paths: List[str]):
+        """Records activity on files."""
+        now = time.monotonic()
+        for path in paths:
+            if is_temporary(os.path.basename(path)):
+                continue
+            signature = self._signature(path)
+            if signature is None or not os.path.isfile(path):
+                self._pending.pop(path, None)
+                continue
+            if self._handled.get(path) == signature:
+                continue
+            previous = self._pending.get(path)
+            if previous is None or previous[0] != signature:
+                self._pending[path] = (signature, now)
+
+    def settled(self, limit: int) -> Iterator[str]:
+        """
+        Yields up to `limit` files whose size and mtime have been stable for the
+        settle time, oldest first. Only that many files are stat'ed, so a large
+        backlog costs nothing while the consumer is busy.
+        """
+        if limit <= 0:
+            return
+        now = time.monotonic()
+        released = 0
+        for path, (signature, changed_at) in sorted(self._pending.items(), key=lambda item: item[1][1]):
+            if now - changed_at < self.settle_seconds:
+                break
+            current = self._signature(path)
+            if current is None:
+                del self._pending[path]
+                continue
+            if current != signature or current[0] == 0:
+                # Still being written (or still empty); restart its settle time.
+                self._pending[path] = (current, now)
+                continue
+            del self._pending[path]
+            self._handled[path] = signature
+            released += 1
+            yield path
+            if released >= limit:
+                return
+
+    def forget(self, path: str):
+        """Forgets a handled file (e.g., after it was moved away)."""
+        self._handled.pop(path, None)
+
+
+# --- Watcher ---
+
+class InboxWatcher:
+    """
+    Watches an inbox directory and organizes files as they arrive.
+
+    A watcher thread turns file events into settled paths and feeds them into
+    a bounded queue; the calling thread drains it in batches through a single,
+    warm `FileOrganizer`. A burst of arrivals is held as cheap (path, stat)
+    records in the debouncer and released only as fast as batches are
+    processed, so throughput stays steady and no process is spawned per file.
+    Files that are moved are ingested into the knowledge base at their new
+    location, so later decisions learn from them.
+    """
+    def __init__(self, directory: str, organizer=None, settle_seconds: Optional[float] = None, batch_size: int = 32,
+                 max_queue: Optional[int] = None, batch_wait: float = 1.0, use_polling: bool = False,
+                 poll_interval: Optional[float] = None, execute: bool = True, index_moves: bool = True):
+        """
+        Args:
+            directory: The inbox to watch (not recursive).
+            organizer: A FileOrganizer; one is created if not given.
+            settle_seconds: How long a file's size and mtime must be unchanged before it is organized.
+                Defaults to WATCH_SETTLE_SECONDS in the config.
+            batch_size: Max files organized together.
+            max_queue: Max settled files waiting for the organizer. Defaults to WATCH_MAX_QUEUE.
+            batch_wait: How long to wait for a batch to fill once the first file is ready.
+            use_polling: Use the polling source even where inotify is available.
+            poll_interval: Seconds between scans for the polling source. Defaults to WATCH_POLL_INTERVAL.
+            execute: If False, plans are only logged (dry run).
+            index_moves: Ingest moved files into the knowledge base at their new location.
+        """
+        if settle_seconds is None:
+            settle_seconds = getattr(config, "WATCH_SETTLE_SECONDS", 2.0)
+        if max_queue is None:
+            max_queue = getattr(config, "WATCH_MAX_QUEUE", 256)
+        if poll_interval is None:
+            poll_interval = getattr(config, "WATCH_POLL_INTERVAL", 2.0)
+
+        self.directory = os.path.abspath(directory)
+        self.organizer = organizer
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.execute = execute
+        self.index_moves = index_moves
+        self.debouncer = Debouncer(settle_seconds)
+        self.source = create_source(self.directory, use_polling=use_polling, poll_interval=poll_interval)
+        self.stats = {"organized": 0, "moved": 0, "skipped": 0, "indexed": 0, "batches": 0}
+
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max(1, max_queue))
+        self._stopping = threading.Event()
+        self._manifest = None
+
+    def stop(self):
+        self._stopping.set()
+
+    def _watch_loop(self):
+        """
+        Watcher thread: collects events and releases settled files while the queue has room.
+        """
+        tick = min(0.5, max(0.05, self.debouncer.settle_seconds / 4))
+        while not self._stopping.is_set():
+            try:
+                self.debouncer.touch(self.source.poll(tick))
+                room = self._queue.maxsize - self._queue.qsize()
+                for path in self.debouncer.settled(room):
+                    self._queue.put(path)
+            except Exception as e:
+                logger.error("Watcher error: %s", e)
+                time.sleep(tick)
+
+    def _next_batch(self) -> List[str]:
+        """
+        Blocks for the first settled file, then briefly waits for the batch to fill.
+        """
+        batch = []
+        while not batch and not self._stopping.is_set():
+            try:
+                batch.append(self._queue.get(timeout=0.5))
+            except queue.Empty:
+                continue
+        deadline = time.monotonic() + self.batch_wait
+        while batch and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _process(self, batch: List[str]):
+        batch = [path for path in batch if os.path.isfile(path)]
+        if not batch:
+            return
+        if self.organizer.follow_live_generation() and self._manifest is not None:
+            # The manifest belongs to the previous generation.
+            self._manifest.close()
+            self._manifest = None
+        with span("watch_batch"):
+            plan = self.organizer.build_plan(batch, batch_size=self.batch_size)
+            moves = [entry for entry in plan if entry["action"] == "move"]
+            moved_to = []
+            if self.execute:
+                # Files already in the knowledge base are relocated in the index here...
+                for result in self.organizer.execute_moves(plan, self._get_manifest()):
+                    if result.moved:
+                        self.debouncer.forget(result.source)
+                        moved_to.append(result.destination)
+            if moved_to and self.index_moves:
+                # ...and new ones are ingested (relocated files are skipped as unchanged).
+                self._index(moved_to)
+            self.organizer.rag.persist()
+
+        self.stats["batches"] += 1
+        self.stats["organized"] += len(plan)
+        self.stats["moved"] += len(moved_to)
+        self.stats["skipped"] += len(plan) - len(moves)
+        increment("watch.files", len(plan))
+        increment("watch.moved", len(moved_to))
+        for entry in plan:
+            if entry["action"] == "move":
+                status = "moved to" if entry["destination"] in moved_to else "would move to"
+                logger.info("%s %s %s", entry["source"], status, entry["destination"])
+            else:
+                logger.info("%s skipped: %s", entry["source"], entry["reason"])
+        print(
+            f"Batch of {len(plan)}: {len(moved_to)} moved, {len(plan) - len(moves)} skipped "
+            f"({self._queue.qsize()} queued, {len(self.debouncer)} settling)"
+        )
+
+    def _index(self, paths: List[str]):
+        """
+        Ingests moved files at their new location so the knowledge base stays current.
+        """
+        from .ingest_pipeline import IngestPipeline
+
+        # Inline extraction: a batch is small, and a process pool per batch would cost more than it saves.
+        pipeline = IngestPipeline(self.organizer.rag, self.organizer.registry, self._get_manifest(), workers=0)
+        stats = pipeline.run_files(paths)
+        self.stats["indexed"] += stats["added"] + stats["updated"] + stats["relocated"]
+
+    def _get_manifest(self):
+        if self._manifest is None:
+            from .manifest import FileManifest
+            self._manifest = FileManifest()
+        return self._manifest
+
+    def run(self):
+        """
+        Watches and organizes until `stop()` is called or the process is interrupted.
+        """
+        if self.organizer is None:
+            from .organizer import FileOrganizer
+            self.organizer = FileOrganizer()
+        watcher = threading.Thread(target=self._watch_loop, name="inbox-watcher", daemon=True)
+        watcher.start()
+        print(f"--- Watching '{self.directory}' ({type(self.source).__name__}); press Ctrl+C to stop ---")
+        try:
+            while not self._stopping.is_set():
+                batch = self._next_batch()
+                if batch:
+                    try:
+                        self._process(batch)
+                    except Exception as e:
+                        logger.error("Error organizing a batch of %d file(s): %s", len(batch), e)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stopping.set()
+            watcher.join(timeout=2.0)
+            self.source.close()
+            if self._manifest is not None:
+                self._manifest.close()
+            print(
+                f"--- Stopped watching. Organized {self.stats['organized']} file(s): {self.stats['moved']} moved, "
+                f"{self.stats['skipped']} skipped, {self.stats['indexed']} indexed ---"
+            )
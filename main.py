@@ -1,97 +1,313 @@
 import os
+import json
 import argparse
-from file_organizer.rag_system import RAGSystem
-from file_organizer.llm_agent import LLMAgent
-from file_organizer.file_manager import FileManager
-from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry
+# Only lightweight modules are imported here. The heavy ones (chromadb, langchain,
+# ollama) are imported on demand so the daemon client starts instantly.
+from file_organizer.plan import collect_files, format_plan, plan_to_json
+from file_organizer import daemon_client
+from file_organizer.metrics import configure_logging, export_metrics, profiled
+from file_organizer.decision import format_decision_stats
 
-def run_organization_workflow(file_path: str, auto_confirm: bool = False):
+def run_organization_workflow(file_paths: list[str], auto_confirm: bool = False, recursive: bool = False,
+                              json_output: str = None, batch_size: int = 32):
     """
-    Runs the full organization workflow for a single, specified file.
+    Runs the full organization workflow in-process for one or more files, directories or globs.
     """
-    # 1. Initialize all modules
-    rag = RAGSystem()
-    llm = LLMAgent()
-    file_manager = FileManager()
-    embeddor_registry = EmbeddorRegistry()
-
-    # 2. Check if the file exists
-    if not file_manager.file_exists(file_path):
-        print(f"Error: The file '{file_path}' does not exist.")
+    from file_organizer.organizer import FileOrganizer
+
+    # 1. Expand the inputs into a list of files
+    files = collect_files(file_paths, recursive=recursive)
+    if not files:
+        print("Error: No files to organize.")
         return
 
-    # 3. Get the correct embeddor for the file and extract its content
-    embeddor = embeddor_registry.get_embeddor_for_file(file_path)
-    if not embeddor:
-        print(f"No suitable processor for '{file_path}'. Skipping.")
+    # 2. Initialize all modules once for the whole run
+    organizer = FileOrganizer()
+
+    # 3. Retrieve context and ask the LLM for a destination for every file
+    print(f"\n--- Planning moves for {len(files)} file(s) ---")
+    plan = organizer.build_plan(files, batch_size=batch_size)
+    print(format_decision_stats(organizer.decisions.stats))
+
+    # 4-5. Review and execute the plan
+    review_and_execute(plan, organizer.execute_plan, auto_confirm=auto_confirm, json_output=json_output)
+
+def run_via_daemon(file_paths: list[str], auto_confirm: bool = False, recursive: bool = False,
+                   json_output: str = None, batch_size: int = 32):
+    """
+    Sends the request to a running organizer daemon and streams back its decisions.
+    """
+    # The daemon has its own working directory, so send absolute paths.
+    paths = [os.path.abspath(os.path.expanduser(p)) for p in file_paths]
+    request = {"command": "plan", "paths": paths, "recursive": recursive, "batch_size": batch_size}
+
+    plan = None
+    for event in daemon_client.send_request(request):
+        kind = event.get("event")
+        if kind == "queued" and event.get("position"):
+            print(f"Waiting for {event['position']} queued request(s)...")
+        elif kind == "started":
+            print(f"\n--- Planning moves for {event['files']} file(s) (daemon) ---")
+        elif kind == "decision":
+            entry = event["entry"]
+            target = entry["destination"] if entry["action"] == "move" else f"skip: {entry['reason']}"
+            print(f"  {entry['source']} -> {target}")
+        elif kind == "plan":
+            plan = event["plan"]
+            decisions = event.get("decisions")
+            if decisions:
+                print(format_decision_stats(decisions))
+        elif kind == "error":
+            print(f"Error from daemon: {event['error']}")
+    if plan is None:
         return
-        
-    content = embeddor.extract_content(file_path)
-    
-    if not content:
-        print(f"Could not extract content from '{file_path}'. Skipping.")
+    if not plan:
+        print("Error: No files to organize.")
         return
 
-    # 4. Retrieve context from the RAG system based on the file's content
-    print("\n--- Retrieving Context for New File ---")
-    context = rag.retrieve_context(query=content, n_results=3)
-
-    # 5. Use the LLM to decide on a destination
-    print("\n--- Handing off to LLM Agent for Decision ---")
-    file_info = {"name": os.path.basename(file_path), "content": content[:500]}
-    llm_response = llm.decide_action(file_info=file_info, rag_context=context)
-    suggested_folder = llm_response.strip()
-    
-    print(f"\n--- LLM Suggested Destination Folder ---\n{suggested_folder}")
+    def execute(plan_to_run):
+        moved = 0
+        for event in daemon_client.send_request({"command": "execute", "plan": plan_to_run}):
+            if event.get("event") == "executed":
+                moved = event["moved"]
+            elif event.get("event") == "error":
+                print(f"Error from daemon: {event['error']}")
+        return moved
+
+    review_and_execute(plan, execute, auto_confirm=auto_confirm, json_output=json_output)
+
+def review_and_execute(plan: list[dict], execute, auto_confirm: bool = False, json_output: str = None):
+    """
+    Prints a plan, optionally writes it as JSON, and executes it after a single confirmation.
+    """
+    # 4. Show the plan (and optionally write it as JSON)
+    print(f"\n{format_plan(plan)}")
     print("------------------------------------")
+    if json_output == "-":
+        print(plan_to_json(plan))
+    elif json_output:
+        with open(json_output, 'w', encoding='utf-8') as f:
+            f.write(plan_to_json(plan))
+        print(f"Plan written to '{json_output}'.")
+
+    move_count = sum(1 for entry in plan if entry["action"] == "move")
+    if move_count == 0:
+        print("\n--- No valid moves proposed. No action taken. ---")
+        return
+
+    # 5. Execute the plan (after a single confirmation)
+    if auto_confirm:
+        user_confirmation = 'y'
+        print("Auto-confirm enabled: proceeding without user input.")
+    else:
+        user_confirmation = input(f"Proceed with {move_count} file move(s)? [Y/N]: ")
 
-    # 6. Validate and correct the LLM's response
-    _, file_extension = os.path.splitext(suggested_folder)
-    if file_extension:
-        print(f"Validation: LLM suggested a file path. Correcting to use its parent folder.")
-        suggested_folder = os.path.dirname(suggested_folder)
-        print(f"Corrected Folder: {suggested_folder}")
-
-    # 7. Move the file to the suggested folder (and ask for confirmation)
-    if suggested_folder and isinstance(suggested_folder, str) and ":" in suggested_folder:
-        # Construct the full source and destination paths
-        src_path = os.path.abspath(file_path)
-        dest_path = os.path.join(suggested_folder, os.path.basename(file_path))
-
-        # Get user confirmation before proceeding
-        print(f"\nProposed Action: Move \n'{src_path}' \nto \n'{dest_path}'")
-        if auto_confirm:
-            user_confirmation = 'y'
-            print("Auto-confirm enabled: proceeding without user input.")
-        else:
-            user_confirmation = input("Proceed with file move? [Y/N]: ")
-
-        if user_confirmation.lower().strip() == 'y':
-            print(f"\n--- Executing File Action ---")
-            file_manager.move_file(src_path, dest_path)
-        else:
-            print("--- Action aborted by user. ---")
+    if user_confirmation.lower().strip() == 'y':
+        print(f"\n--- Executing File Actions ---")
+        moved = execute(plan)
+        print(f"--- Moved {moved} of {move_count} file(s). ---")
     else:
-        print(f"\n--- Invalid destination format suggested ('{suggested_folder}'). No action taken. ---")
+        print("--- Action aborted by user. ---")
+
+def run_journal_command(undo: bool, journal_path: str = None):
+    """
+    Undoes or resumes a journaled batch of moves in-process and prints what happened to each file.
+    """
+    from file_organizer.organizer import FileOrganizer
+
+    organizer = FileOrganizer()
+    try:
+        results = organizer.undo_moves(journal_path) if undo else organizer.resume_moves(journal_path)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return
+    print(f"\n--- {'Undoing' if undo else 'Resuming'} moves from '{organizer.last_journal}' ---")
+    for result in results:
+        outcome = "" if result.moved else f"  (not moved: {result.error})"
+        print(f"  {result.source} -> {result.destination}{outcome}")
+    moved = sum(1 for result in results if result.moved)
+    print(f"--- Moved {moved} of {len(results)} file(s). ---")
 
 def main():
     """
     Main function to parse arguments and start the workflow.
     """
-    parser = argparse.ArgumentParser(description="Organize a single file using an intelligent agent.")
+    parser = argparse.ArgumentParser(description="Organize files using an intelligent agent.")
     parser.add_argument(
-        "file_path", 
-        metavar="FILE_PATH", 
+        "paths",
+        metavar="PATH",
         type=str,
-        help="The full path to the file to be organized."
+        nargs="*",
+        help="Files, directories or glob patterns to organize."
     )
     parser.add_argument(
         "--force", "-f",
         action="store_true",
-        help="Bypass user confirmation and automatically move the file."
+        help="Bypass user confirmation and automatically execute the plan."
+    )
+    parser.add_argument(
+        "--recursive", "-r",
+        action="store_true",
+        help="Include files in subdirectories of any directory given."
+    )
+    parser.add_argument(
+        "--json",
+        metavar="FILE",
+        dest="json_output",
+        help="Also write the plan as JSON to FILE ('-' for stdout)."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Number of files whose queries are embedded together."
+    )
+    # --- Daemon options ---
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run the resident organizer daemon in the foreground instead of organizing files."
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=1800.0,
+        help="Seconds without requests after which the daemon exits (used with --serve)."
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Print the running daemon's health and statistics."
+    )
+    parser.add_argument(
+        "--stop-daemon",
+        action="store_true",
+        help="Ask the running daemon to shut down."
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Always organize in this process, even if a daemon is running."
+    )
+    # --- Watch mode ---
+    parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="Keep running and organize files as they arrive in DIR (moves are executed without confirmation)."
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        help="Seconds a new file must stay unchanged before it is organized (used with --watch)."
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Detect new files by polling instead of inotify (used with --watch)."
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only log where watched files would be moved (used with --watch)."
+    )
+    # --- Undoing and resuming moves ---
+    parser.add_argument(
+        "--undo",
+        metavar="JOURNAL",
+        nargs="?",
+        const="",
+        help="Move the files of the last executed plan (or of JOURNAL) back where they came from."
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="JOURNAL",
+        nargs="?",
+        const="",
+        help="Finish the moves of an interrupted plan (the last one, or JOURNAL)."
+    )
+    # --- Diagnostics ---
+    parser.add_argument(
+        "--verbose", "-v",
+        action="count",
+        default=0,
+        help="Log more (-v for progress, -vv for debug output such as the full LLM prompts)."
+    )
+    parser.add_argument(
+        "--log-level",
+        help="Logging level (DEBUG, INFO, WARNING, ERROR). Defaults to LOG_LEVEL in the config."
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="FILE",
+        help="Write per-stage timings and counters as JSON to FILE ('-' for stdout) at exit."
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="FILE",
+        help="Write per-stage timings and counters as a Prometheus textfile at exit."
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Run under cProfile, save the stats to FILE and print the top functions."
     )
     args = parser.parse_args()
-    run_organization_workflow(args.file_path, auto_confirm=args.force)
+
+    # The daemon's and the watcher's progress messages are their only output, so show them by default.
+    configure_logging(args.log_level or ("INFO" if args.serve or args.watch else None), args.verbose)
+    with profiled(args.profile):
+        try:
+            run_command(parser, args)
+        finally:
+            export_metrics(args.metrics_json, args.metrics_prom)
+
+def run_command(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """
+    Runs the command selected by the parsed arguments.
+    """
+    if args.serve:
+        from file_organizer.daemon import OrganizerDaemon
+        try:
+            OrganizerDaemon(idle_timeout=args.idle_timeout).serve_forever()
+        except RuntimeError as e:
+            parser.exit(1, f"{e}\n")
+        return
+    if args.status or args.stop_daemon:
+        if not daemon_client.daemon_available():
+            print("No organizer daemon is running.")
+            return
+        request = {"command": "shutdown" if args.stop_daemon else "health"}
+        for event in daemon_client.send_request(request):
+            print(json.dumps(event, indent=2))
+        return
+    if args.watch:
+        if not os.path.isdir(args.watch):
+            parser.error(f"--watch: '{args.watch}' is not a directory")
+        from file_organizer.watcher import InboxWatcher
+        InboxWatcher(
+            args.watch,
+            settle_seconds=args.settle,
+            batch_size=args.batch_size,
+            use_polling=args.poll,
+            execute=not args.dry_run,
+        ).run()
+        return
+    if args.undo is not None or args.resume is not None:
+        run_journal_command(undo=args.undo is not None, journal_path=args.undo or args.resume or None)
+        return
+    if not args.paths:
+        parser.error("at least one PATH is required")
+
+    workflow = run_organization_workflow
+    if not args.no_daemon and daemon_client.daemon_available():
+        workflow = run_via_daemon
+    workflow(
+        args.paths,
+        auto_confirm=args.force,
+        recursive=args.recursive,
+        json_output=args.json_output,
+        batch_size=args.batch_size,
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -14,14 +14,172 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 CHROMA_PERSIST_DIRECTORY = os.path.join(PROJECT_ROOT, "..", "data", "chromadb")
 # This defines the name for the database collection. 
 CHROMA_COLLECTION_NAME = "file_organization_knowledge"
+# This stores the manifest (size, mtime, content hash and chunk ids of every ingested file) used for incremental rebuilds.
+MANIFEST_PATH = os.path.join(PROJECT_ROOT, "..", "data", "manifest.sqlite3")
+# A fresh build (build_knowledge_base.py --fresh-build) writes a complete new knowledge base (vector store, manifest and
+# indexes) into a directory here while the current one stays live, then switches over to it. Once a fresh build has
+# completed, the paths above are no longer used for these.
+GENERATIONS_DIRECTORY = os.path.join(PROJECT_ROOT, "..", "data", "generations")
+GENERATIONS_KEEP = 1  # Earlier generations kept after a switch, for processes still reading them
+
+# --- Vector Store Settings ---
+# Where chunk embeddings are stored: 'chroma' (the ChromaDB collection above) or 'local' (an in-process store of
+# memory-mapped vectors and SQLite metadata that opens instantly at any size).
+# Copy an existing knowledge base with: python -m file_organizer.vector_store.migrate --source chroma --target local
+VECTOR_BACKEND = "chroma"
+VECTOR_STORE_DIRECTORY = os.path.join(PROJECT_ROOT, "..", "data", "vectors")
+# Distance function of a new local store: 'cosine' (what ChromaDB uses for SentenceTransformer models), 'l2' or 'ip'.
+VECTOR_STORE_SPACE = "cosine"
+# 'flat' searches exactly; 'hnsw' searches an approximate HNSW graph (faster for large stores; needs hnswlib).
+VECTOR_STORE_INDEX = "flat"
+HNSW_M = 16  # Graph links per vector
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64  # Higher finds the true nearest neighbours more often, but searches slower.
+
+# --- Scanner Settings ---
+# Directories that are never entered when building the knowledge base (dependencies, caches, version control).
+SCAN_EXCLUDE_DIRS = [".git", ".hg", ".svn", "node_modules", "bower_components", "__pycache__", ".venv", "venv",
+                     "site-packages", ".tox", ".mypy_cache", ".pytest_cache", ".cache"]
+SCAN_SKIP_HIDDEN = True  # Don't enter directories whose names start with a dot.
+# Ignore files read in every scanned directory; their gitignore-style patterns apply below that directory.
+SCAN_IGNORE_FILES = [".gitignore", ".organizerignore"]
+# More gitignore-style patterns, relative to each scanned directory (e.g., ["*.min.js", "archive/", "/exports"]).
+SCAN_EXCLUDE = []
+SCAN_MAX_FILE_BYTES = 512 * 1024 * 1024  # Larger files are skipped; None for no limit.
+SCAN_MAX_DEPTH = None  # Directory levels entered below each scanned directory; None for no limit.
+SCAN_THREADS = 4  # Directories (e.g., DEFAULT_KNOWLEDGE_DIRECTORIES) scanned concurrently
 
 # --- Embedding Model Settings ---
 # This specifies the local model for creating vector embeddings. 
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Embedding runs in this many worker processes, each with its own copy of the model; 0 runs it in the main process.
+# On a CPU-only machine, a few workers with a few threads each (e.g., 8 x 4 on 32 cores) keep every core busy.
+EMBEDDING_WORKERS = 0
+EMBEDDING_THREADS_PER_WORKER = None  # Intra-op threads per worker; None divides the CPUs between the workers.
+EMBEDDING_BATCH_SIZE = 64  # Texts are sorted by length and embedded in batches of this size.
+# 'torch' runs the model on PyTorch; 'onnx' runs an ONNX Runtime export of it (needs optimum[onnxruntime]).
+EMBEDDING_BACKEND = "torch"
+# How the local vector store (VECTOR_BACKEND = "local") stores embeddings: 'float32', 'float16' (half the size) or
+# 'int8' (a quarter). Set it before the knowledge base is built; it applies to new stores only.
+EMBEDDING_STORAGE_DTYPE = "float32"
+# float16/int8 stores rank search hits by their distances to the dequantized vectors. True also keeps the float32
+# vectors on disk (more disk space than a float32 store): searches then scan the compact vectors for
+# EMBEDDING_RERANK_CANDIDATES times the hits they need and re-rank those by their exact distances.
+EMBEDDING_KEEP_FLOAT32 = False
+EMBEDDING_RERANK_CANDIDATES = 4
+# This caches embeddings by (model, chunk text hash) so unchanged chunks are never re-embedded, even after moves or a fresh build.
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIRECTORY = os.path.join(PROJECT_ROOT, "..", "data", "embedding_cache")
+EMBEDDING_CACHE_MAX_BYTES = 1024 ** 3  # Least recently used vectors are evicted beyond this size.
+
+# --- Folder Index Settings ---
+# A compact index of per-folder embedding centroids, used to rank candidate destination folders.
+FOLDER_INDEX_ENABLED = True
+FOLDER_INDEX_PATH = os.path.join(PROJECT_ROOT, "..", "data", "folder_index.npz")
+FOLDER_INDEX_PROTOTYPES = 1  # Prototype vectors per folder; more helps folders with mixed content.
+FOLDER_INDEX_MERGE_THRESHOLD = 0.75  # Similarity below which a chunk starts a new prototype (if room).
+# 'llm' passes the ranked folders to the LLM as extra context; 'direct' moves files to the top folder without the LLM when its score is at least FOLDER_INDEX_DIRECT_MIN_SCORE.
+FOLDER_INDEX_MODE = "llm"
+FOLDER_INDEX_DIRECT_MIN_SCORE = 0.85
+
+# --- Retrieval Settings ---
+# A file being organized is chunked like an ingested file; at most this many evenly spaced chunks are searched.
+QUERY_MAX_CHUNKS = 8
+# How the chunks' hits are combined per source file: 'rrf' (reciprocal rank fusion) or 'max' (closest chunk wins).
+QUERY_FUSION = "rrf"
+# 'two_stage' first finds the nearest files by their file-level vectors (the mean of their chunks), then searches only
+# those files' chunks; 'flat' searches all chunks.
+RETRIEVAL_MODE = "two_stage"
+RETRIEVAL_CANDIDATE_FILES = 20  # Files whose chunks are searched in the second stage
+# Only retrieve files of the same file type (extension) as the file being organized, if there are any.
+RETRIEVAL_SAME_FILE_TYPE = False
+
+# --- Decision Settings ---
+# The LLM is skipped when at least this share of the retrieved neighbours sit in the same folder
+# (and there are at least DECISION_BYPASS_MIN_NEIGHBOURS of them) ...
+DECISION_BYPASS_MIN_AGREEMENT = 1.0
+DECISION_BYPASS_MIN_NEIGHBOURS = 2
+# ... and all of that folder's neighbours are within this distance of the file (vector store distance; see VECTOR_STORE_SPACE).
+DECISION_BYPASS_MAX_DISTANCE = 0.5
+# LLM decisions are cached by content fingerprint, candidate folders and prompt template.
+DECISION_CACHE_ENABLED = True
+DECISION_CACHE_PATH = None  # None = next to the database directory
+DECISION_CACHE_MAX_ENTRIES = 100000  # checked every 256 decisions, so it can briefly run a little over
+
+# --- Deduplication Settings ---
+# Identical chunks are always stored once. With deduplication, chunks that are nearly identical to a stored chunk
+# (estimated Jaccard similarity of their word shingles at least DEDUP_NEAR_THRESHOLD) aren't stored either;
+# retrieval lists every file that contains them.
+DEDUP_ENABLED = True
+DEDUP_NEAR_THRESHOLD = 0.85
+DEDUP_SHINGLE_SIZE = 3  # Words per shingle
+DEDUP_NUM_PERM = 64  # MinHash signature length; must be divisible by DEDUP_BANDS
+DEDUP_BANDS = 8  # LSH bands; more bands compare more (and less similar) candidates
+DEDUP_INDEX_PATH = None  # None = next to the database directory
+
+# --- Text Extraction Settings ---
+# Text files are read incrementally. Files larger than this (in bytes) are reduced to a sample of their head and tail.
+TEXT_MAX_FILE_BYTES = 64 * 1024 * 1024
+# Only a head/tail sample of this size is read when organizing a text file.
+ORGANIZE_TEXT_MAX_BYTES = 256 * 1024
+
+# --- PDF Extraction Settings ---
+# Per-file budgets for ingesting PDFs. Extraction stops (keeping what it has) when one runs out. Use None for no limit.
+PDF_MAX_PAGES = 1000
+PDF_MAX_TEXT_BYTES = 20 * 1024 * 1024
+PDF_MAX_SECONDS = 120.0
+# Only the first pages of a PDF are extracted when organizing it.
+ORGANIZE_PDF_MAX_PAGES = 3
 
 # --- LLM Agent Settings ---
 OLLAMA_MODEL = 'your-ollama-model-name'  # This should math a model you have pulled in Ollama.
 OLLAMA_HOST = 'http://localhost:11434'  # Change if your Ollama server runs elsewhere
+# When organizing many files, up to this many requests are sent to Ollama in parallel.
+# Match it to the server's OLLAMA_NUM_PARALLEL setting.
+OLLAMA_MAX_CONCURRENCY = 4
+OLLAMA_REQUEST_TIMEOUT = 120.0  # Seconds per request
+OLLAMA_MAX_RETRIES = 2  # Retries for timeouts and server errors, with exponential backoff
+OLLAMA_RETRY_BACKOFF = 1.0  # Seconds before the first retry
+# How long Ollama keeps the model loaded after a request (e.g., "30m"; -1 keeps it loaded), so it isn't reloaded between files.
+OLLAMA_KEEP_ALIVE = "30m"
+# The answer is a single folder path, so generation is bounded: at most LLM_NUM_PREDICT tokens, stopping at LLM_STOP.
+# Set LLM_STOP = [] if your model starts its answers with a blank line.
+LLM_NUM_PREDICT = 128
+LLM_STOP = ["\\n"]
+# Stream answers and close the request as soon as the first line is complete.
+LLM_STREAM = True
+
+# --- Prompt Settings ---
+# Retrieved context is collapsed by folder (one short snippet per folder) and cut off at this many tokens (estimated at 4 characters per token).
+PROMPT_CONTEXT_TOKEN_BUDGET = 600
+PROMPT_SNIPPET_CHARS = 160
+
+# --- Logging and Metrics Settings ---
+# Default logging level for the command-line tools (DEBUG also logs every prompt sent to the LLM). Override with -v or --log-level.
+LOG_LEVEL = "WARNING"
+# Per-stage timings and counters are written here at exit (and by the daemon after each request). None disables a file.
+METRICS_JSON_PATH = None
+METRICS_PROMETHEUS_PATH = None  # e.g., a path in node_exporter's textfile collector directory
+
+# --- Organizer Daemon Settings ---
+# The Unix socket the resident daemon (python main.py --serve) listens on. None uses a per-user path in the temp directory.
+DAEMON_SOCKET_PATH = None
+
+# --- Watch Mode Settings ---
+# A file in a watched inbox (python main.py --watch DIR) is organized once its size and mtime have been unchanged this long (in seconds).
+WATCH_SETTLE_SECONDS = 2.0
+# At most this many settled files wait for the organizer; the rest of a burst waits as (path, size, mtime) records.
+WATCH_MAX_QUEUE = 256
+# Seconds between scans when inotify is unavailable (or --poll is given).
+WATCH_POLL_INTERVAL = 2.0
+
+# --- Move Settings ---
+# Every executed plan is journaled here, so it can be undone (python main.py --undo) or resumed after a crash (--resume).
+MOVE_JOURNAL_DIRECTORY = os.path.join(PROJECT_ROOT, "..", "data", "move_journals")
+# Files moved to another device are copied; this many are copied concurrently.
+MOVE_COPY_THREADS = 4
+# Compare the SHA-256 of each copy with its source before the source is removed.
+MOVE_VERIFY_COPIES = True
 
 # This is the template for the LLM agent's prompt. This can be customized as needed to include specific instructions about user organization preferences.
 AGENT_PROMPT_TEMPLATE = """
@@ -0,0 +1,145 @@
+import os
+import sys
+import types
+import hashlib
+import importlib.util
+
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# file_organizer/config.py is generated per user (setup/create_config_file.py);
+# without one, the tests run against the default template.
+if importlib.util.find_spec("file_organizer.config") is None:
+    spec = importlib.util.spec_from_file_location(
+        "create_config_file", os.path.join(REPO_ROOT, "setup", "create_config_file.py")
+    )
+    template = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(template)
+    config = types.ModuleType("file_organizer.config")
+    config.__file__ = os.path.join(REPO_ROOT, "file_organizer", "config.py")
+    exec(template.CONFIG_TEMPLATE, config.__dict__)
+    sys.modules["file_organizer.config"] = config
+
+
+
+def hash_embedding(texts):
+    """
+    Embeds texts as normalized bags of hashed words: deterministic, and similar texts get close vectors.
+    """
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[i, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % 64] += 1.0
+        vectors[i] /= np.linalg.norm(vectors[i]) or 1.0
+    return vectors
+
+
+class HashEmbedding:
+    """
+    Stands in for the `EmbeddingEngine` of a RAGSystem.
+    """
+    def __call__(self, texts):
+        return hash_embedding(list(texts))
+
+    def close(self):
+        pass
+
+
+class ParagraphSplitter:
+    """
+    Splits text into its paragraphs, so tests decide exactly which chunks files share.
+    """
+    def split_text(self, text):
+        return [paragraph.strip() for paragraph in text.split("\n\n") if paragraph.strip()]
+
+
+class KnowledgeBase:
+    """
+    A knowledge base in a temporary directory, built with the local vector
+    store, paragraph chunks and `hash_embedding` instead of the model.
+    """
+    def __init__(self, root, registry):
+        from file_organizer.rag_system import RAGSystem
+        from file_organizer.manifest import FileManifest
+        self.root = str(root)
+        self.registry = registry
+        self.rag = RAGSystem()
+        self.rag.embedding_function = HashEmbedding()
+        self.manifest = FileManifest()
+        self.dedup = None
+
+    def write(self, relative, *paragraphs):
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paragraphs))
+        return path
+
+    def pipeline(self, **kwargs):
+        from file_organizer.ingest_pipeline import IngestPipeline
+        pipeline = IngestPipeline(self.rag, self.registry, self.manifest, workers=0, **kwargs)
+        self.dedup = pipeline.dedup
+        return pipeline
+
+    def build(self, **kwargs):
+        return self.pipeline(**kwargs).run([self.root])
+
+    def stored(self):
+        """
+        Returns {chunk id: stored source} for every chunk in the store.
+        """
+        records = self.rag.store.get(include=["metadatas"])
+        return {chunk_id: (metadata or {}).get("source")
+                for chunk_id, metadata in zip(records["ids"], records["metadatas"])}
+
+    def close(self):
+        if self.dedup is not None:
+            self.dedup.close()
+        self.manifest.close()
+        self.rag.close()
+
+
+@pytest.fixture
+def knowledge_base(tmp_path, monkeypatch):
+    from file_organizer import config, ingest_pipeline
+    from file_organizer.dedup import MinHasher
+    from file_organizer.embeddors.embeddor_registry import EmbeddorRegistry
+    from file_organizer.embeddors.text_embeddor import TextFileEmbeddor
+
+    data = tmp_path / "data"
+    settings = {
+        "CHROMA_PERSIST_DIRECTORY": str(data / "chromadb"),
+        "VECTOR_STORE_DIRECTORY": str(data / "vectors"),
+        "MANIFEST_PATH": str(data / "manifest.sqlite3"),
+        "GENERATIONS_DIRECTORY": str(data / "generations"),
+        "EMBEDDING_CACHE_DIRECTORY": str(data / "embedding_cache"),
+        "FOLDER_INDEX_PATH": str(data / "folder_index.npz"),
+        "DECISION_CACHE_PATH": str(data / "decision_cache.sqlite3"),
+        "DEDUP_INDEX_PATH": str(data / "dedup_index.sqlite3"),
+        "MOVE_JOURNAL_DIRECTORY": str(data / "move_journals"),
+        "VECTOR_BACKEND": "local",
+        "EMBEDDING_STORAGE_DTYPE": "float32",
+        "DEDUP_ENABLED": True,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value, raising=False)
+
+    class ParagraphEmbeddor(TextFileEmbeddor):
+        def _get_text_splitter(self):
+            return ParagraphSplitter()
+
+    registry = EmbeddorRegistry()
+    registry.register(TextFileEmbeddor.SUPPORTED_EXTENSIONS, ParagraphEmbeddor())
+    # Extraction runs inline (workers=0) with the worker globals.
+    monkeypatch.setattr(ingest_pipeline, "_worker_registry", registry)
+    monkeypatch.setattr(ingest_pipeline, "_worker_hasher", MinHasher())
+
+    root = tmp_path / "library"
+    root.mkdir()
+    kb = KnowledgeBase(root, registry)
+    yield kb
+    kb.close()
@@ -0,0 +1,167 @@
+import os
+
+import pytest
+
+from file_organizer import bulk_mover
+from file_organizer.bulk_mover import BulkMover, MoveJournal
+
+
+def make_file(path, content=b"contents"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def mover(tmp_path):
+    return BulkMover(journal_directory=str(tmp_path / "journals"), copy_threads=2, verify=True)
+
+
+def pretend_cross_device(monkeypatch):
+    """
+    Makes every destination folder look like it is on another device, so moves are copied.
+    """
+    check = BulkMover._check
+
+    def check_other_device(source, destination, folder_devices):
+        error, devices = check(source, destination, folder_devices)
+        return error, devices and (devices[0], devices[1] + 1)
+
+    monkeypatch.setattr(BulkMover, "_check", staticmethod(check_other_device))
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    pretend_cross_device(monkeypatch)
+
+
+def test_same_device_moves_are_renames(tmp_path, mover):
+    sources = [make_file(tmp_path / "inbox" / f"file{i}.txt", f"file {i}".encode()) for i in range(5)]
+    os.makedirs(tmp_path / "sorted")
+    moves = [(source, str(tmp_path / "sorted" / os.path.basename(source))) for source in sources]
+
+    results = mover.move_many(moves)
+
+    assert [result.moved for result in results] == [True] * 5
+    for i, (source, destination) in enumerate(moves):
+        assert not os.path.exists(source)
+        assert read(destination) == f"file {i}".encode()
+    _, states = MoveJournal.read(mover.journal_path)
+    assert {states[("move", n)]["op"] for n in range(5)} == {"done"}
+
+
+def test_never_overwrites_or_creates_folders(tmp_path, mover):
+    source = make_file(tmp_path / "inbox" / "a.txt", b"new")
+    taken = make_file(tmp_path / "sorted" / "a.txt", b"existing")
+    other = make_file(tmp_path / "inbox" / "b.txt")
+
+    results = mover.move_many([
+        (source, taken),
+        (other, str(tmp_path / "missing" / "b.txt")),
+        (str(tmp_path / "inbox" / "gone.txt"), str(tmp_path / "sorted" / "gone.txt")),
+    ])
+
+    assert [result.moved for result in results] == [False, False, False]
+    assert "exists" in results[0].error
+    assert "does not exist" in results[1].error
+    assert "not found" in results[2].error
+    assert read(taken) == b"existing" and read(source) == b"new"
+    assert os.path.exists(other) and not os.path.exists(tmp_path / "missing")
+
+
+def test_cross_device_moves_are_verified_copies(tmp_path, mover, cross_device):
+    content = os.urandom(3 * 1024 * 1024)
+    source = make_file(tmp_path / "inbox" / "big.bin", content)
+    destination = str(tmp_path / "sorted" / "big.bin")
+    os.makedirs(tmp_path / "sorted")
+
+    result, = mover.move_many([(source, destination)])
+
+    assert result.moved
+    assert not os.path.exists(source)
+    assert read(destination) == content
+    assert os.listdir(tmp_path / "sorted") == ["big.bin"]  # no temporary file left behind
+    _, states = MoveJournal.read(mover.journal_path)
+    assert states[("move", 0)]["op"] == "done"
+    assert states[("move", 0)]["sha256"] == bulk_mover._sha256(destination)
+
+
+def test_failed_verification_keeps_the_source(tmp_path, mover, cross_device, monkeypatch):
+    source = make_file(tmp_path / "inbox" / "a.txt")
+    os.makedirs(tmp_path / "sorted")
+    digests = iter(["source digest", "corrupted copy digest"])
+    monkeypatch.setattr(bulk_mover, "_sha256", lambda path: next(digests))
+
+    result, = mover.move_many([(source, str(tmp_path / "sorted" / "a.txt"))])
+
+    assert not result.moved and "checksum" in result.error
+    assert read(source) == b"contents"
+    assert os.listdir(tmp_path / "sorted") == []
+
+
+@pytest.mark.parametrize("copy", [False, True])
+def test_undo_moves_files_back(tmp_path, mover, monkeypatch, copy):
+    if copy:
+        pretend_cross_device(monkeypatch)
+    sources = [make_file(tmp_path / "inbox" / f"file{i}.txt", f"file {i}".encode()) for i in range(3)]
+    os.makedirs(tmp_path / "sorted")
+    moves = [(source, str(tmp_path / "sorted" / os.path.basename(source))) for source in sources]
+    mover.move_many(moves)
+    # The original name of the last file has been taken since; it stays where it is.
+    make_file(sources[2], b"someone else's file")
+
+    results = mover.undo(mover.journal_path)
+
+    assert [result.moved for result in results] == [False, True, True]  # most recent move first
+    assert read(sources[0]) == b"file 0" and read(sources[1]) == b"file 1"
+    assert read(sources[2]) == b"someone else's file" and read(moves[2][1]) == b"file 2"
+    assert mover.undo(mover.journal_path) == [moves[2][::-1] + (False, "destination already exists")]
+
+
+def test_resume_settles_interrupted_moves(tmp_path, mover):
+    """
+    Recreates the states a crash can leave each kind of move in, then resumes the batch.
+    """
+    inbox, sorted_ = tmp_path / "inbox", tmp_path / "sorted"
+    os.makedirs(sorted_)
+    moves = [(str(inbox / f"file{i}.txt"), str(sorted_ / f"file{i}.txt")) for i in range(6)]
+    for i, (source, _) in enumerate(moves):
+        make_file(source, f"file {i}".encode())
+    os.makedirs(mover.journal_directory)
+    journal = MoveJournal.create(mover.journal_directory)
+    journal.write({"op": "batch", "moves": moves})
+    for n, method in enumerate(["rename", "rename", "copy", "copy", "copy"]):
+        journal.write({"op": "begin", "phase": "move", "n": n, "method": method})
+    journal.write({"op": "done", "phase": "move", "n": 0})
+    journal.close()
+
+    # 0: done before the crash (already renamed).
+    os.rename(*moves[0])
+    # 1: renamed, but the crash came before its done record.
+    os.rename(*moves[1])
+    # 2: a partial copy; the source is untouched.
+    partial = BulkMover._temp_path(journal.batch_id, "move", 2, moves[2][1])
+    make_file(partial, b"fi")
+    # 3: the verified copy was renamed into place, but the source not yet removed.
+    make_file(moves[3][1], b"file 3")
+    # 4: the destination name was taken by another file meanwhile.
+    make_file(moves[4][1], b"unrelated")
+    # 5: not started.
+
+    results = mover.resume(journal.path)
+
+    assert [result.source for result in results] == [source for source, _ in moves[1:]]
+    assert [result.moved for result in results] == [True, True, True, False, True]
+    for i in (0, 1, 2, 3, 5):
+        assert not os.path.exists(moves[i][0])
+        assert read(moves[i][1]) == f"file {i}".encode()
+    assert read(moves[4][0]) == b"file 4" and read(moves[4][1]) == b"unrelated"
+    assert not os.path.exists(partial)
+    # Everything is settled now.
+    assert mover.resume(journal.path) == []
@@ -0,0 +1,64 @@
+import itertools
+import types
+
+import pytest
+
+from file_organizer import decision
+from file_organizer.decision import DecisionEngine
+
+
+class ScriptedAgent:
+    """
+    Answers each request with the next scripted response.
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    def decide_action(self, file_info, rag_context):
+        self.requests += 1
+        return self.responses.pop(0)
+
+
+def request(content):
+    # One distant neighbour, so the bypass never applies.
+    context = {"metadatas": [[{"source": "/docs/a/file.txt"}]], "distances": [[2.0]]}
+    return {"name": "report.txt", "content": content}, context
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(decision.config, "DECISION_CACHE_ENABLED", True, raising=False)
+    return lambda agent: DecisionEngine(agent, cache_path=str(tmp_path / "decisions.sqlite3"))
+
+
+def test_folder_answers_are_cached(engine):
+    agent = ScriptedAgent(["/docs/a"])
+    decisions = engine(agent)
+    assert decisions.decide(*request("quarterly report")) == ("/docs/a", "llm")
+    assert decisions.decide(*request("quarterly report")) == ("/docs/a", "cache")
+    assert agent.requests == 1
+
+
+@pytest.mark.parametrize("response", [None, "", "I am not sure."])
+def test_failed_and_invalid_answers_are_not_cached(engine, response):
+    agent = ScriptedAgent([response, "/docs/a"])
+    decisions = engine(agent)
+    folder, decided_by = decisions.decide(*request("quarterly report"))
+    assert decided_by == "llm" and folder == (response.strip() if response is not None else None)
+    assert decisions.decide(*request("quarterly report")) == ("/docs/a", "llm")
+    assert agent.requests == 2
+
+
+def test_cache_is_trimmed_to_its_newest_entries(engine, monkeypatch):
+    monkeypatch.setattr(decision, "CACHE_TRIM_INTERVAL", 4)
+    clock = itertools.count()
+    monkeypatch.setattr(decision, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    agent = ScriptedAgent([f"/docs/{i}" for i in range(10)])
+    decisions = engine(agent)
+    decisions.max_cache_entries = 3
+    for i in range(10):
+        decisions.decide(*request(f"report {'x' * i}"))
+    # Trimmed after the 4th and 8th decisions; the last two are kept until the next check.
+    rows = decisions._conn.execute("SELECT response FROM decisions ORDER BY created").fetchall()
+    assert [row[0] for row in rows] == ["/docs/5", "/docs/6", "/docs/7", "/docs/8", "/docs/9"]
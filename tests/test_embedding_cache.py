@@ -0,0 +1,67 @@
+import hashlib
+import multiprocessing
+
+import numpy as np
+
+# Spawned writers import this module without pytest; conftest provides their config.
+import conftest  # noqa: F401
+from file_organizer.embedding_cache import EmbeddingCache
+
+
+def vector_for(text, dim=8):
+    # A distinct vector per text (the same in every process), so a row written for another key is noticed.
+    return np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest(), 16)).random(dim, dtype=np.float32)
+
+
+def put_texts(directory, prefix, count, batch):
+    cache = EmbeddingCache("model", directory=directory)
+    texts = [f"{prefix} {i}" for i in range(count)]
+    for i in range(0, count, batch):
+        cache.put_many(texts[i:i + batch], [vector_for(text) for text in texts[i:i + batch]])
+    cache.close()
+
+
+def test_an_open_cache_sees_rows_another_instance_added(tmp_path):
+    directory = str(tmp_path / "cache")
+    writer = EmbeddingCache("model", directory=directory)
+    writer.put_many(["first"], [vector_for("first")])
+    reader = EmbeddingCache("model", directory=directory)
+
+    texts = [f"text {i}" for i in range(5000)]
+    writer.put_many(texts, [vector_for(text) for text in texts])
+
+    found = reader.get_many(texts[-10:] + ["first"])
+    assert all(np.array_equal(vector, vector_for(text)) for vector, text in zip(found, texts[-10:] + ["first"]))
+    writer.close()
+    reader.close()
+
+
+def test_concurrent_writers_never_share_a_row(tmp_path):
+    directory = str(tmp_path / "cache")
+    EmbeddingCache("model", directory=directory).close()
+    context = multiprocessing.get_context("spawn")
+    writers = [context.Process(target=put_texts, args=(directory, f"writer {n}", 3000, 100)) for n in range(3)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join(120)
+        assert process.exitcode == 0
+
+    cache = EmbeddingCache("model", directory=directory)
+    texts = [f"writer {n} {i}" for n in range(3) for i in range(3000)]
+    found = cache.get_many(texts)
+    assert all(vector is not None and np.array_equal(vector, vector_for(text)) for vector, text in zip(found, texts))
+    slots = [slot for (slot,) in cache._conn.execute("SELECT slot FROM entries")]
+    assert len(slots) == len(set(slots)) == len(texts)
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EmbeddingCache("model", directory=str(tmp_path / "cache"), max_bytes=100 * 8 * 4)
+    cache.put_many([f"old {i}" for i in range(100)], [vector_for(f"old {i}") for i in range(100)])
+    cache.get_many(["old 0"])
+    cache.put_many(["new"], [vector_for("new")])
+    found = cache.get_many(["old 0", "old 1", "new"])
+    assert found[1] is None
+    assert np.array_equal(found[0], vector_for("old 0")) and np.array_equal(found[2], vector_for("new"))
+    cache.close()
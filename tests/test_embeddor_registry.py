@@ -0,0 +1,24 @@
+import importlib
+
+import pytest
+
+from file_organizer.embeddors.embeddor_registry import _BUILTIN_EMBEDDORS, EmbeddorRegistry
+
+
+def load_class(spec):
+    module_name, class_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+@pytest.mark.parametrize("spec", sorted(_BUILTIN_EMBEDDORS))
+def test_builtin_table_matches_supported_extensions(spec):
+    pytest.importorskip("pypdf")
+    assert set(_BUILTIN_EMBEDDORS[spec]) == load_class(spec).SUPPORTED_EXTENSIONS
+
+
+@pytest.mark.parametrize("spec", sorted(_BUILTIN_EMBEDDORS))
+def test_builtin_extensions_resolve_to_their_embeddor(spec):
+    pytest.importorskip("pypdf")
+    registry = EmbeddorRegistry()
+    for ext in _BUILTIN_EMBEDDORS[spec]:
+        assert type(registry.get_embeddor_for_file(f"file{ext.upper()}")) is load_class(spec)
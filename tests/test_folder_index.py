@@ -0,0 +1,71 @@
+import numpy as np
+
+from file_organizer.folder_index import FolderIndex
+
+
+def chunk(folder, *values):
+    return np.array(values, dtype=np.float32), {"source": f"{folder}/file.txt"}
+
+
+def add(index, *chunks):
+    index.add([vector for vector, _ in chunks], [metadata for _, metadata in chunks])
+
+
+def remove(index, *chunks):
+    index.remove([vector for vector, _ in chunks], [metadata for _, metadata in chunks])
+
+
+def prototypes(path):
+    index = FolderIndex(path)
+    return {folder: (index.sums[row].tolist(), int(index.counts[row])) for row, folder in enumerate(index.owners)}
+
+
+def test_saves_from_two_instances_are_merged(tmp_path):
+    path = str(tmp_path / "folder_index.npz")
+    base = FolderIndex(path)
+    add(base, chunk("/docs/a", 1, 0), chunk("/docs/a", 1, 0))
+    base.save()
+
+    build, watcher = FolderIndex(path), FolderIndex(path)
+    add(build, chunk("/docs/b", 0, 1))
+    remove(build, chunk("/docs/a", 1, 0))
+    build.save()
+    add(watcher, chunk("/docs/a", 0, 2), chunk("/docs/c", 3, 3))
+    watcher.save()
+
+    assert prototypes(path) == {
+        "/docs/a": ([1.0, 2.0], 2),
+        "/docs/b": ([0.0, 1.0], 1),
+        "/docs/c": ([3.0, 3.0], 1),
+    }
+    # The watcher's instance now reflects the build's updates too.
+    assert {folder for folder, _ in watcher.classify([0, 1], top_k=5)} == {"/docs/a", "/docs/b", "/docs/c"}
+
+
+def test_a_folder_emptied_elsewhere_is_dropped(tmp_path):
+    path = str(tmp_path / "folder_index.npz")
+    base = FolderIndex(path)
+    add(base, chunk("/docs/a", 1, 0))
+    base.save()
+
+    first, second = FolderIndex(path), FolderIndex(path)
+    remove(first, chunk("/docs/a", 1, 0))
+    first.save()
+    add(second, chunk("/docs/b", 0, 1))
+    second.save()
+
+    assert prototypes(path) == {"/docs/b": ([0.0, 1.0], 1)}
+
+
+def test_a_rebuild_replaces_the_index_on_disk(tmp_path):
+    path = str(tmp_path / "folder_index.npz")
+    stale = FolderIndex(path)
+    add(stale, chunk("/docs/old", 1, 0))
+    stale.save()
+
+    rebuilt = FolderIndex(path)
+    rebuilt.clear()
+    add(rebuilt, chunk("/docs/new", 0, 1))
+    rebuilt.save()
+
+    assert prototypes(path) == {"/docs/new": ([0.0, 1.0], 1)}
@@ -0,0 +1,192 @@
+import os
+import hashlib
+
+from file_organizer import scanner
+from file_organizer.ingest_pipeline import new_build_stats
+
+from conftest import hash_embedding
+
+
+def test_files_under_an_unreadable_directory_are_kept(knowledge_base, monkeypatch):
+    kb = knowledge_base
+    kept = kb.write("locked/report.txt", "quarterly revenue grew", "margins held steady")
+    kb.write("open/notes.txt", "meeting notes")
+    kb.build()
+    chunks = kb.manifest.get(kept)["chunk_ids"]
+
+    locked = os.path.dirname(kept)
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if os.path.abspath(path) == locked:
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    monkeypatch.setattr(scanner.os, "scandir", failing_scandir)
+    pipeline = kb.pipeline()
+    stats = pipeline.run([kb.root])
+
+    assert stats["removed"] == 0
+    assert pipeline.scanner.stats.failed_directories == [locked]
+    assert kb.manifest.get(kept)["chunk_ids"] == chunks
+    assert set(chunks) <= set(kb.stored())
+
+
+def test_deleted_and_newly_excluded_files_are_removed(knowledge_base):
+    kb = knowledge_base
+    deleted = kb.write("a/deleted.txt", "a file that goes away")
+    ignored = kb.write("b/ignored.txt", "a file an ignore rule will exclude")
+    kept = kb.write("b/kept.txt", "a file that stays")
+    kb.build()
+
+    os.remove(deleted)
+    kb.write("b/.organizerignore", "ignored.txt")
+    stats = kb.build()
+
+    assert stats["removed"] == 2
+    assert kb.manifest.paths() == [kept]
+    assert set(kb.stored().values()) == {kept}
+
+
+def test_files_the_scan_skipped_without_a_rule_are_kept(knowledge_base, monkeypatch):
+    kb = knowledge_base
+    path = kb.write("a/notes.txt", "notes that can't be stat'ed this time")
+    kb.build()
+
+    walk = scanner.DirectoryScanner._walk
+
+    def walk_without(self, root, stats):
+        # As if stat'ing the file failed: the scan skips it with an error.
+        return (scanned for scanned in walk(self, root, stats) if scanned.path != path)
+
+    monkeypatch.setattr(scanner.DirectoryScanner, "_walk", walk_without)
+    assert kb.build()["removed"] == 0
+    assert kb.manifest.get(path) is not None
+
+
+def chunk_id(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def test_unchanged_files_are_skipped_and_changed_files_replace_their_chunks(knowledge_base):
+    kb = knowledge_base
+    path = kb.write("a/report.txt", "first draft", "appendix")
+    other = kb.write("b/notes.txt", "meeting notes")
+    assert kb.build() == dict(new_build_stats(), added=2)
+    assert kb.manifest.get(path)["chunk_ids"] == [chunk_id("first draft"), chunk_id("appendix")]
+
+    assert kb.build() == dict(new_build_stats(), skipped=2)
+
+    # Touched but not modified: skipped, with the new mtime recorded.
+    os.utime(path, (1_000_000, 1_000_000))
+    assert kb.build() == dict(new_build_stats(), skipped=2)
+    assert kb.manifest.get(path)["mtime"] == 1_000_000
+
+    kb.write("a/report.txt", "final draft", "appendix")
+    assert kb.build() == dict(new_build_stats(), updated=1, skipped=1)
+    assert kb.manifest.get(path)["chunk_ids"] == [chunk_id("final draft"), chunk_id("appendix")]
+    assert kb.stored() == {chunk_id("final draft"): path, chunk_id("appendix"): path,
+                           chunk_id("meeting notes"): other}
+
+
+def test_files_whose_chunks_fail_to_store_are_retried(knowledge_base, monkeypatch):
+    kb = knowledge_base
+    path = kb.write("a/report.txt", "quarterly revenue")
+    upsert = kb.rag.store.upsert
+
+    def failing_upsert(**kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(kb.rag.store, "upsert", failing_upsert)
+    assert kb.build() == dict(new_build_stats(), failed=1)
+    assert kb.manifest.get(path) is None
+
+    monkeypatch.setattr(kb.rag.store, "upsert", upsert)
+    assert kb.build() == dict(new_build_stats(), added=1)
+    assert kb.stored() == {chunk_id("quarterly revenue"): path}
+
+
+def test_moved_files_are_relocated_without_re_embedding(knowledge_base, monkeypatch):
+    kb = knowledge_base
+    old = kb.write("inbox/report.txt", "quarterly revenue grew", "margins held steady")
+    kb.build()
+    new = os.path.join(kb.root, "finance", "report.txt")
+    os.makedirs(os.path.dirname(new))
+    os.rename(old, new)
+
+    embedded = []
+    monkeypatch.setattr(kb.rag, "embed", lambda texts, **kwargs: embedded.extend(texts))
+    assert kb.build() == dict(new_build_stats(), relocated=1)
+    assert embedded == []
+    assert kb.manifest.paths() == [new]
+    assert set(kb.stored().values()) == {new}
+    assert kb.rag.file_store.get(include=[])["ids"] == [new]
+    assert [folder for folder, _ in kb.rag.classify_folders(hash_embedding(["quarterly revenue"])[0])] == [
+        os.path.dirname(new)
+    ]
+
+
+def test_shared_chunks_stay_stored_while_a_file_references_them(knowledge_base):
+    kb = knowledge_base
+    first = kb.write("a/first.txt", "shared boilerplate paragraph", "only in the first file")
+    second = kb.write("b/second.txt", "shared boilerplate paragraph", "only in the second file")
+    kb.build()
+    shared = chunk_id("shared boilerplate paragraph")
+    holder = kb.stored()[shared]
+    other = second if holder == first else first
+
+    os.remove(holder)
+    assert kb.build()["removed"] == 1
+    # The chunk is now stored under the file that still has it.
+    assert kb.stored()[shared] == other
+    assert kb.manifest.referrers([shared]) == {shared: other}
+    assert set(kb.stored().values()) == {other}
+
+    os.remove(other)
+    assert kb.build()["removed"] == 1
+    assert kb.stored() == {}
+
+
+def test_moving_a_file_keeps_the_chunks_it_shares(knowledge_base):
+    kb = knowledge_base
+    first = kb.write("a/first.txt", "shared boilerplate paragraph", "only in the first file")
+    second = kb.write("b/second.txt", "shared boilerplate paragraph", "only in the second file")
+    kb.build()
+    shared = chunk_id("shared boilerplate paragraph")
+    holder = kb.stored()[shared]
+    other = second if holder == first else first
+
+    moved = os.path.join(kb.root, "c", os.path.basename(holder))
+    os.makedirs(os.path.dirname(moved))
+    os.rename(holder, moved)
+    kb.rag.relocate_source(holder, moved, manifest=kb.manifest)
+    assert kb.stored()[shared] == moved
+    assert kb.manifest.sources([shared]) == {shared: sorted([moved, other])}
+
+    os.remove(other)
+    kb.build()
+    assert kb.stored()[shared] == moved
+
+
+def test_chunks_that_fail_to_store_leave_the_dedup_index(knowledge_base, monkeypatch):
+    kb = knowledge_base
+    text = "the quarterly revenue report for the northern region shows that sales grew by twelve percent"
+    first = kb.write("a/report.txt", text)
+    second = kb.write("b/report.txt", text + " again")
+    upsert = kb.rag.store.upsert
+
+    def failing_upsert(**kwargs):
+        raise OSError("disk full")
+
+    # The second file references the first one's chunk as a near duplicate, so both fail.
+    monkeypatch.setattr(kb.rag.store, "upsert", failing_upsert)
+    assert kb.build() == dict(new_build_stats(), failed=2)
+    assert kb.dedup.stats["near"] == 1
+    assert len(kb.dedup) == 0
+
+    monkeypatch.setattr(kb.rag.store, "upsert", upsert)
+    assert kb.build() == dict(new_build_stats(), added=2)
+    stored = kb.stored()
+    assert len(stored) == 1 and set(stored.values()) <= {first, second}
+    (canonical,) = stored
+    assert kb.manifest.sources([canonical]) == {canonical: [first, second]}
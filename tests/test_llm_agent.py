@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from benchmarks.stub_ollama import StubOllamaServer
+from file_organizer import llm_agent
+from file_organizer.llm_agent import AsyncLLMAgent
+
+
+def request(folder, name="report.txt"):
+    # The stub answers with the first folder of the context.
+    context = {"documents": [["quarterly figures"]], "metadatas": [[{"source": f"{folder}/old.txt"}]],
+               "distances": [[0.2]]}
+    return {"name": name, "content": "quarterly report"}, context
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    servers = []
+
+    def stub(stream=True, **kwargs):
+        server = StubOllamaServer(**kwargs).start()
+        servers.append(server)
+        monkeypatch.setattr(llm_agent.config, "OLLAMA_HOST", server.url)
+        monkeypatch.setattr(llm_agent.config, "LLM_STREAM", stream, raising=False)
+        monkeypatch.setattr(llm_agent.config, "LLM_STOP", ["\n"], raising=False)
+        return server
+
+    yield stub
+    for server in servers:
+        server.stop()
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_requests_are_bounded_by_max_concurrency(stub, stream):
+    server = stub(stream=stream, delay=0.1)
+    agent = AsyncLLMAgent(max_concurrency=3)
+    answers = agent.decide_many([request(f"/docs/{i}", f"{i}.txt") for i in range(9)])
+    assert answers == [f"/docs/{i}" for i in range(9)]
+    stats = server.get_stats()
+    assert stats["requests"] == 9
+    assert stats["max_in_flight"] == 3
+
+
+def test_identical_prompts_are_sent_once(stub):
+    server = stub(delay=0.1)
+    agent = AsyncLLMAgent(max_concurrency=4)
+    answers = agent.decide_many([request("/docs/a"), request("/docs/b"), request("/docs/a"), request("/docs/a")])
+    assert answers == ["/docs/a", "/docs/b", "/docs/a", "/docs/a"]
+    assert server.get_stats()["requests"] == 2
+
+
+def test_server_errors_are_retried(stub):
+    server = stub(fail_rate=1.0)
+    agent = AsyncLLMAgent(max_retries=2, retry_backoff=0.01)
+    assert agent.decide_many([request("/docs/a")]) == [None]
+    assert server.get_stats()["requests"] == 3
+
+    server.fail_rate = 0.0
+    assert agent.decide_many([request("/docs/a")]) == ["/docs/a"]
+
+
+def test_client_errors_are_not_retried(stub):
+    server = stub(fail_rate=1.0, fail_status=400)
+    agent = AsyncLLMAgent(max_retries=2, retry_backoff=0.01)
+    assert agent.decide_many([request("/docs/a")]) == [None]
+    assert server.get_stats()["requests"] == 1
+
+
+def test_timed_out_requests_are_retried(stub):
+    server = stub(delay=0.5)
+    agent = AsyncLLMAgent(timeout=0.1, max_retries=1, retry_backoff=0.01)
+    started = time.monotonic()
+    assert agent.decide_many([request("/docs/a")]) == [None]
+    assert time.monotonic() - started < 0.5
+    # The server counts a request once it has read it; the retry may still be on its way.
+    deadline = time.monotonic() + 1.0
+    while server.get_stats()["requests"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.get_stats()["requests"] == 2
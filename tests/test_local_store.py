@@ -0,0 +1,190 @@
+import numpy as np
+import pytest
+
+from file_organizer.vector_store import local_store
+from file_organizer.vector_store.local_store import LocalVectorStore
+
+
+def random_vectors(count, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+
+def add(store, ids, vectors, sources=None, **metadata):
+    sources = sources or [f"/docs/{doc_id}.txt" for doc_id in ids]
+    store.upsert(
+        ids=list(ids), embeddings=vectors, documents=[f"text of {doc_id}" for doc_id in ids],
+        metadatas=[dict(metadata, source=source) for source in sources]
+    )
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    stores = []
+
+    def open_store(**kwargs):
+        kwargs.setdefault("dtype", "float32")
+        kwargs.setdefault("index", "flat")
+        kwargs.setdefault("directory", str(tmp_path / "vectors"))
+        stores.append(LocalVectorStore(**kwargs))
+        return stores[-1]
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def test_queries_return_the_nearest_chunks_closest_first(open_store):
+    store = open_store(space="l2")
+    vectors = random_vectors(50)
+    add(store, [f"c{i}" for i in range(50)], vectors)
+
+    result = store.query(vectors[[7, 30]], n_results=5)
+    assert [ids[0] for ids in result["ids"]] == ["c7", "c30"]
+    assert result["documents"][0][0] == "text of c7"
+    assert result["metadatas"][1][0] == {"source": "/docs/c30.txt"}
+    for query, ids, distances in zip(vectors[[7, 30]], result["ids"], result["distances"]):
+        expected = sorted(float(np.sum((query - vector) ** 2)) for vector in vectors)[:5]
+        assert distances == pytest.approx(expected, abs=1e-4)
+        assert [int(doc_id[1:]) for doc_id in ids] == [
+            int(i) for i in np.argsort(np.sum((vectors - query) ** 2, axis=1))[:5]
+        ]
+
+
+def test_upserts_replace_chunks_in_place_and_deleted_rows_are_reused(open_store):
+    store = open_store()
+    vectors = random_vectors(4)
+    add(store, ["a", "b", "c"], vectors[:3])
+    rows = store._rows_for_ids(["a", "b", "c"])
+
+    add(store, ["b"], vectors[3:], sources=["/docs/moved.txt"])
+    assert store._rows_for_ids(["b"]) == {"b": rows["b"]}
+    assert store.get(["b"])["metadatas"] == [{"source": "/docs/moved.txt"}]
+    assert store.query(vectors[3:], n_results=1)["ids"] == [["b"]]
+
+    store.delete(["a", "missing"])
+    assert store.count() == 2
+    assert store.get(["a"])["ids"] == []
+    assert "a" not in store.query(vectors[:1], n_results=3)["ids"][0]
+    add(store, ["d"], vectors[:1])
+    assert store._rows_for_ids(["d"]) == {"d": rows["a"]}
+    assert store.query(vectors[:1], n_results=1)["ids"] == [["d"]]
+
+
+def test_where_filters_select_chunks_by_source_and_metadata(open_store):
+    store = open_store()
+    vectors = random_vectors(6)
+    for i in range(6):
+        add(store, [f"c{i}"], vectors[i:i + 1], sources=[f"/docs/{i % 2}.txt"], page=i)
+
+    def ids(where):
+        return store.get(where=where, include=[])["ids"]
+
+    assert ids({"source": "/docs/1.txt"}) == ["c1", "c3", "c5"]
+    assert ids({"source": {"$in": ["/docs/0.txt"]}, "page": {"$gte": 2}}) == ["c2", "c4"]
+    assert ids({"$or": [{"page": {"$lt": 1}}, {"page": 5}]}) == ["c0", "c5"]
+    assert ids({"page": {"$nin": [0, 1, 2]}}) == ["c3", "c4", "c5"]
+    assert ids({"source": {"$in": []}}) == []
+    with pytest.raises(ValueError):
+        ids({"page": {"$like": 1}})
+
+    # A filtered query only ranks the matching chunks.
+    result = store.query(vectors[:1], n_results=2, where={"source": "/docs/1.txt"})
+    assert len(result["ids"][0]) == 2 and set(result["ids"][0]) <= {"c1", "c3", "c5"}
+
+
+def test_an_open_store_sees_chunks_another_instance_added(open_store, monkeypatch):
+    monkeypatch.setattr(LocalVectorStore, "_GROWTH_ROWS", 4)
+    writer = open_store(space="cosine")
+    vectors = random_vectors(40)
+    add(writer, ["first"], vectors[:1])
+    reader = open_store(space="l2", dtype="int8")
+    assert (reader.space, reader.dtype_name) == ("cosine", "float32")
+
+    # The writer grows the vector files past the reader's mapping.
+    add(writer, [f"c{i}" for i in range(1, 40)], vectors[1:])
+    assert reader.count() == 40
+    assert reader.query(vectors[39:], n_results=1)["ids"] == [["c39"]]
+    assert np.allclose(reader.get(["c25"], include=["embeddings"])["embeddings"], vectors[25:26])
+
+
+def test_invalid_upserts_are_rejected(open_store):
+    store = open_store()
+    with pytest.raises(ValueError):
+        add(store, ["a", "a"], random_vectors(2))
+    add(store, ["a"], random_vectors(1))
+    with pytest.raises(ValueError):
+        add(store, ["b"], random_vectors(1, dim=8))
+    assert store.count() == 1
+
+
+def exact_neighbours(queries, vectors, k):
+    # Cosine distances by brute force in float32.
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    distances = 1.0 - (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    rows = np.argsort(distances, axis=1)[:, :k]
+    return np.take_along_axis(distances, rows, axis=1), rows
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_stores_rank_by_their_stored_vectors(open_store, tmp_path, dtype):
+    store = open_store(dtype=dtype, space="cosine", rerank=False)
+    vectors = random_vectors(500, dim=64)
+    add(store, [f"c{i}" for i in range(500)], vectors)
+    assert not (tmp_path / "vectors" / "exact.f32").exists()
+
+    queries = random_vectors(20, dim=64, seed=1)
+    result = store.query(queries, n_results=10)
+    _, expected = exact_neighbours(queries, vectors, 10)
+    found = [{int(doc_id[1:]) for doc_id in ids} for ids in result["ids"]]
+    recall = np.mean([len(rows & set(exact_rows.tolist())) / 10 for rows, exact_rows in zip(found, expected)])
+    assert recall >= 0.9
+
+    # Distances are those to the dequantized vectors, which `get` returns.
+    stored = store.get(result["ids"][0], include=["embeddings"])
+    dequantized = dict(zip(stored["ids"], stored["embeddings"]))
+    originals = vectors[[int(doc_id[1:]) for doc_id in stored["ids"]]]
+    assert not np.array_equal(stored["embeddings"], originals)
+    assert np.allclose(stored["embeddings"], originals, atol=0.05 if dtype == "int8" else 0.005)
+    for doc_id, distance in zip(result["ids"][0], result["distances"][0]):
+        vector = dequantized[doc_id]
+        expected_distance = 1.0 - queries[0] @ vector / (np.linalg.norm(queries[0]) * np.linalg.norm(vector))
+        assert distance == pytest.approx(expected_distance, abs=1e-4)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_stores_with_a_float32_copy_rerank_by_exact_distances(open_store, tmp_path, dtype):
+    store = open_store(dtype=dtype, space="cosine", rerank=True)
+    vectors = random_vectors(500, dim=64)
+    add(store, [f"c{i}" for i in range(500)], vectors)
+    assert (tmp_path / "vectors" / "exact.f32").exists()
+
+    queries = random_vectors(20, dim=64, seed=1)
+    result = store.query(queries, n_results=10)
+    distances, rows = exact_neighbours(queries, vectors, 10)
+    assert [[int(doc_id[1:]) for doc_id in ids] for ids in result["ids"]] == rows.tolist()
+    assert np.allclose(result["distances"], distances, atol=1e-5)
+    assert np.array_equal(store.get(["c3"], include=["embeddings"])["embeddings"], vectors[3:4])
+
+    # Filtered queries re-rank too.
+    result = store.query(queries[:1], n_results=3, where={"source": {"$in": [f"/docs/c{i}.txt" for i in range(250)]}})
+    distances, rows = exact_neighbours(queries[:1], vectors[:250], 3)
+    assert [int(doc_id[1:]) for doc_id in result["ids"][0]] == rows[0].tolist()
+    assert np.allclose(result["distances"][0], distances[0], atol=1e-5)
+
+
+def test_the_float32_copy_is_opt_in_and_fixed_when_a_store_is_created(open_store, tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store.config, "EMBEDDING_KEEP_FLOAT32", True, raising=False)
+    monkeypatch.setattr(local_store.config, "EMBEDDING_RERANK_CANDIDATES", 4, raising=False)
+    assert not open_store(directory=str(tmp_path / "float32")).rerank
+    compact = open_store(directory=str(tmp_path / "int8"), dtype="int8")
+    add(compact, ["a"], random_vectors(1))
+    assert compact.rerank
+
+    monkeypatch.setattr(local_store.config, "EMBEDDING_KEEP_FLOAT32", False)
+    store = open_store(dtype="float16")
+    add(store, ["a"], random_vectors(1))
+    assert not store.rerank
+    # A store's settings are fixed by its first write.
+    assert not open_store(dtype="float16", rerank=True).rerank
+    assert open_store(directory=str(tmp_path / "int8")).rerank
+    assert not (tmp_path / "vectors" / "exact.f32").exists()